@@ -0,0 +1,126 @@
+# *** GENERATED PIPELINE ***
+
+# LOAD DATA
+import pandas as pd
+train_dataset = pd.read_pickle(r"/root/package/outputs/training.pkl")
+
+# TRAIN-TEST SPLIT
+from sklearn.model_selection import train_test_split
+def split_dataset(dataset, train_size=0.75, random_state=17):
+    train_dataset, test_dataset = train_test_split(dataset, train_size=train_size, random_state=random_state)
+    return train_dataset, test_dataset	
+train_dataset, test_dataset = split_dataset(train_dataset)
+train_dataset, validation_dataset = split_dataset(train_dataset)
+
+# SUBSAMPLE
+# If the number of rows of train_dataset is larger than sample_size, sample rows to sample_size for speedup.
+from lib.sample_dataset import sample_dataset
+train_dataset = sample_dataset(
+    dataframe=train_dataset,
+    sample_size=100000,
+    target_columns=['target_number'],
+    task_type='regression'
+)
+
+test_dataset = validation_dataset
+
+
+# PREPROCESSING-1
+# Component: Preprocess:OrdinalEncoder
+# Efficient Cause: Preprocess:OrdinalEncoder is required in this pipeline since the dataset has ['feature:str_category_presence', 'feature:str_category_small_presence', 'feature:str_category_binary_presence']. The relevant features are: ['explanatory_multi_category_nonnum'].
+# Purpose: Encode categorical features as an integer array
+# Form:
+#   Input: list of arrays
+#   Key hyperparameters used: 
+#		 "handle_unknown: {'error', 'use_encoded_value'}, default='error'" :: When set to ‘error’ an error will be raised in case an unknown categorical feature is present during transform. When set to ‘use_encoded_value’, the encoded value of unknown categories will be set to the value given for the parameter unknown_value. In inverse_transform, an unknown category will be denoted as None.
+#		 "unknown_value: int or np.nan, default=None" :: When the parameter handle_unknown is set to ‘use_encoded_value’, this parameter is required and will set the encoded value of unknown categories. It has to be distinct from the values used to encode any of the categories in fit. If set to np.nan, the dtype parameter must be a float dtype.
+# Alternatives: Although [Preprocess:OneHotEncoder] can also be used for this dataset, Preprocess:OrdinalEncoder is used because it has more feature:str_category_small_presence than feature:str_category_binary_presence.
+# Order: Preprocess:OrdinalEncoder should be applied  
+from sklearn.preprocessing import OrdinalEncoder
+CATEGORICAL_COLS = ['explanatory_multi_category_nonnum']
+ordinal_encoder = OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1)
+train_dataset[CATEGORICAL_COLS] = ordinal_encoder.fit_transform(train_dataset[CATEGORICAL_COLS])
+test_dataset[CATEGORICAL_COLS] = ordinal_encoder.transform(test_dataset[CATEGORICAL_COLS])
+
+# DETACH TARGET
+TARGET_COLUMNS = ['target_number']
+feature_train = train_dataset.drop(TARGET_COLUMNS, axis=1)
+target_train = train_dataset[TARGET_COLUMNS].copy()
+feature_test = test_dataset.drop(TARGET_COLUMNS, axis=1)
+target_test = test_dataset[TARGET_COLUMNS].copy()
+
+# HYPERPARAMETER OPTIMIZATION
+import optuna
+from sklearn.ensemble import AdaBoostRegressor
+# NEED CV: ex.) optuna.integration.OptunaSearchCV()
+class Objective(object):
+    def __init__(self, feature_train, target_train, feature_test, target_test, __random_state):
+        self.feature_train = feature_train
+        self.target_train = target_train
+        self.feature_test = feature_test
+        self.target_test = target_test 
+        self.__random_state = __random_state
+    def __call__(self, trial):
+        def set_hyperparameters(trial):
+            params = {}
+            params['n_estimators'] =  trial.suggest_int('n_estimators', 10, 1000, log=True) # 100
+            params['loss'] =  trial.suggest_categorical('loss', ['linear', 'square', 'exponential']) # linear 
+            return params
+        
+        # SET DATA
+        import numpy as np
+    
+        if isinstance(self.feature_train, pd.DataFrame):
+            feature_train = self.feature_train
+        elif isinstance(self.feature_train, np.ndarray):
+            feature_train = pd.DataFrame(self.feature_train)
+        else:
+            feature_train = pd.DataFrame(self.feature_train.toarray())
+    
+        if isinstance(self.target_train, pd.DataFrame):
+            target_train = self.target_train
+        elif isinstance(self.target_train, np.ndarray):
+            target_train = pd.DataFrame(self.target_train)
+        else:
+            target_train = pd.DataFrame(self.target_train.toarray())
+    
+        if isinstance(self.feature_test, pd.DataFrame):
+            feature_test = self.feature_test
+        elif isinstance(self.feature_test, np.ndarray):
+            feature_test = pd.DataFrame(self.feature_test)
+        else:
+            feature_test = pd.DataFrame(self.feature_test.toarray())
+    
+        if isinstance(self.target_test, pd.DataFrame):
+            target_test = self.target_test
+        elif isinstance(self.target_test, np.ndarray):
+            target_test = pd.DataFrame(self.target_test)
+        else:
+            target_test = pd.DataFrame(self.target_test.toarray())
+        # MODEL 
+        params = set_hyperparameters(trial)
+        model = AdaBoostRegressor(random_state=self.__random_state, **params)
+        model.fit(feature_train, target_train.values.ravel())
+        y_pred = model.predict(feature_test)
+        
+        from sklearn import metrics
+        score = metrics.r2_score(target_test, y_pred)
+        
+        return score
+    
+n_trials = 1
+timeout = 120 
+random_state = 1023 
+random_state_model = 42 
+direction = 'maximize' 
+    
+study = optuna.create_study(direction=direction,
+                sampler=optuna.samplers.TPESampler(seed=random_state)) 
+default_hyperparameters = {'loss': 'linear', 'n_estimators': 50}
+study.enqueue_trial(default_hyperparameters)
+study.optimize(Objective(feature_train, target_train, feature_test, target_test, random_state_model), 
+                n_trials=n_trials, 
+                timeout=timeout)
+best_params = study.best_params
+print("best params:", best_params)
+print("RESULT: r2: " + str(study.best_value))
@@ -0,0 +1,62 @@
+# *** GENERATED PIPELINE ***
+
+# LOAD DATA
+import pandas as pd
+train_dataset = pd.read_pickle(r"/root/package/outputs/training.pkl")
+
+# TRAIN-TEST SPLIT
+from sklearn.model_selection import train_test_split
+def split_dataset(dataset, train_size=0.75, random_state=17):
+    train_dataset, test_dataset = train_test_split(dataset, train_size=train_size, random_state=random_state)
+    return train_dataset, test_dataset	
+train_dataset, test_dataset = split_dataset(train_dataset)
+train_dataset, validation_dataset = split_dataset(train_dataset)
+
+# SUBSAMPLE
+# If the number of rows of train_dataset is larger than sample_size, sample rows to sample_size for speedup.
+from lib.sample_dataset import sample_dataset
+train_dataset = sample_dataset(
+    dataframe=train_dataset,
+    sample_size=100000,
+    target_columns=['target_category_binary_num'],
+    task_type='classification'
+)
+
+test_dataset = validation_dataset
+
+
+# PREPROCESSING-1
+# Component: Preprocess:OrdinalEncoder
+# Efficient Cause: Preprocess:OrdinalEncoder is required in this pipeline since the dataset has ['feature:str_category_presence', 'feature:str_category_small_presence', 'feature:str_category_binary_presence']. The relevant features are: ['explanatory_multi_category_nonnum'].
+# Purpose: Encode categorical features as an integer array
+# Form:
+#   Input: list of arrays
+#   Key hyperparameters used: 
+#		 "handle_unknown: {'error', 'use_encoded_value'}, default='error'" :: When set to ‘error’ an error will be raised in case an unknown categorical feature is present during transform. When set to ‘use_encoded_value’, the encoded value of unknown categories will be set to the value given for the parameter unknown_value. In inverse_transform, an unknown category will be denoted as None.
+#		 "unknown_value: int or np.nan, default=None" :: When the parameter handle_unknown is set to ‘use_encoded_value’, this parameter is required and will set the encoded value of unknown categories. It has to be distinct from the values used to encode any of the categories in fit. If set to np.nan, the dtype parameter must be a float dtype.
+# Alternatives: Although [Preprocess:OneHotEncoder] can also be used for this dataset, Preprocess:OrdinalEncoder is used because it has more feature:str_category_small_presence than feature:str_category_binary_presence.
+# Order: Preprocess:OrdinalEncoder should be applied  
+from sklearn.preprocessing import OrdinalEncoder
+CATEGORICAL_COLS = ['explanatory_multi_category_nonnum']
+ordinal_encoder = OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1)
+train_dataset[CATEGORICAL_COLS] = ordinal_encoder.fit_transform(train_dataset[CATEGORICAL_COLS])
+test_dataset[CATEGORICAL_COLS] = ordinal_encoder.transform(test_dataset[CATEGORICAL_COLS])
+
+# DETACH TARGET
+TARGET_COLUMNS = ['target_category_binary_num']
+feature_train = train_dataset.drop(TARGET_COLUMNS, axis=1)
+target_train = train_dataset[TARGET_COLUMNS].copy()
+feature_test = test_dataset.drop(TARGET_COLUMNS, axis=1)
+target_test = test_dataset[TARGET_COLUMNS].copy()
+
+# MODEL
+import numpy as np
+from sklearn.naive_bayes import BernoulliNB
+model = BernoulliNB()
+model.fit(feature_train, target_train.values.ravel())
+y_pred = model.predict(feature_test)
+
+#EVALUATION
+from sklearn import metrics
+f1 = metrics.f1_score(target_test, y_pred, average='macro')
+print('RESULT: F1 Score: ' + str(f1))
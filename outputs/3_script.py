@@ -0,0 +1,116 @@
+# *** GENERATED PIPELINE ***
+
+# LOAD DATA
+import pandas as pd
+train_dataset = pd.read_pickle(r"/root/package/outputs/training.pkl")
+validation_dataset = pd.read_pickle(r"/root/package/outputs/validation.pkl")
+
+
+
+# SUBSAMPLE
+# If the number of rows of train_dataset is larger than sample_size, sample rows to sample_size for speedup.
+from lib.sample_dataset import sample_dataset
+train_dataset = sample_dataset(
+    dataframe=train_dataset,
+    sample_size=100000,
+    target_columns=['target_category_multi_num'],
+    task_type='classification'
+)
+
+test_dataset = validation_dataset
+
+
+# PREPROCESSING-1
+# Component: Preprocess:SimpleImputer
+# Efficient Cause: Preprocess:SimpleImputer is required in this pipeline since the dataset has ['feature:missing_values_presence']. The relevant features are: ['explanatory_list'].
+# Purpose: Imputation transformer for completing missing values
+# Form:
+#   Input: array of shape (n_features,)
+#   Key hyperparameters used: 
+#		 "missing_values: int, float, str, np.nan or None, default=np.nan" :: The placeholder for the missing values. All occurrences of missing_values will be imputed. For pandas’ dataframes with nullable integer dtypes with missing values, missing_values should be set to np.nan, since pd.NA will be converted to np.nan.
+#		 "strategy: str, default='mean'" :: The imputation strategy. If "mean", then replace missing values using the mean along each column. Can only be used with numeric data. If "most_frequent", then replace missing using the most frequent value along each column. Can be used with strings or numeric data. If there is more than one such value, only the smallest is returned.
+# Alternatives: Although  can also be used for this dataset, Preprocess:SimpleImputer is used because it has more  than .
+# Order: Preprocess:SimpleImputer should be applied  
+import numpy as np
+from sklearn.impute import SimpleImputer
+STRING_COLS_WITH_MISSING_VALUES = ['explanatory_list']
+simple_imputer = SimpleImputer(missing_values=np.nan, strategy='most_frequent')
+train_dataset[STRING_COLS_WITH_MISSING_VALUES] = simple_imputer.fit_transform(train_dataset[STRING_COLS_WITH_MISSING_VALUES])
+test_dataset[STRING_COLS_WITH_MISSING_VALUES] = simple_imputer.transform(test_dataset[STRING_COLS_WITH_MISSING_VALUES])
+
+# PREPROCESSING-2
+# Component: Preprocess:TextPreprocessing
+# Efficient Cause: Preprocess:TextPreprocessing is required in this pipeline since the dataset has ['feature:str_text_presence']. The relevant features are: ['explanatory_list'].
+# Purpose: Preprocess and normalize text.
+# Form:
+#   Input: array of strings
+#   Key hyperparameters used: None
+# Alternatives: Although  can also be used for this dataset, Preprocess:TextPreprocessing is used because it has more  than .
+# Order: Preprocess:TextPreprocessing should be applied  
+import re
+import string
+import nltk
+TEXT_COLUMNS = ['explanatory_list']
+def process_text(__dataset):
+    for _col in TEXT_COLUMNS:
+        process_text = [t.lower() for t in __dataset[_col]]
+        # strip all punctuation
+        table = str.maketrans('', '', string.punctuation)
+        process_text = [t.translate(table) for t in process_text]
+        # convert all numbers in text to 'num'
+        process_text = [re.sub(r'\d+', 'num', t) for t in process_text]
+        __dataset[_col] = process_text
+    return __dataset
+train_dataset = process_text(train_dataset)
+test_dataset = process_text(test_dataset)
+
+# DETACH TARGET
+TARGET_COLUMNS = ['target_category_multi_num']
+feature_train = train_dataset.drop(TARGET_COLUMNS, axis=1)
+target_train = train_dataset[TARGET_COLUMNS].copy()
+feature_test = test_dataset.drop(TARGET_COLUMNS, axis=1)
+target_test = test_dataset[TARGET_COLUMNS].copy()
+
+# PREPROCESSING-3
+# Component: Preprocess:TfidfVectorizer
+# Efficient Cause: Preprocess:TfidfVectorizer is required in this pipeline since the dataset has ['feature:str_text_presence']. The relevant features are: ['explanatory_list'].
+# Purpose: Convert a collection of raw documents to a matrix of TF-IDF features.
+# Form:
+#   Input: raw_documents
+#   Key hyperparameters used: 
+#		 "max_features: int, default=None" :: If not None, build a vocabulary that only consider the top max_features ordered by term frequency across the corpus. This parameter is ignored if vocabulary is not None.
+# Alternatives: Although  can also be used for this dataset, Preprocess:TfidfVectorizer is used because it has more  than .
+# Order: Preprocess:TfidfVectorizer should be applied  
+from sklearn.feature_extraction.text import TfidfVectorizer
+TEXT_COLUMNS = ['explanatory_list']
+temp_train_data = feature_train[TEXT_COLUMNS]
+temp_test_data = feature_test[TEXT_COLUMNS]
+# Make the entire dataframe sparse to avoid it converting into a dense matrix.
+feature_train = feature_train.drop(TEXT_COLUMNS, axis=1).astype(pd.SparseDtype('float64', 0))
+feature_test = feature_test.drop(TEXT_COLUMNS, axis=1).astype(pd.SparseDtype('float64', 0))
+for _col in TEXT_COLUMNS:
+    tfidfvectorizer = TfidfVectorizer(max_features=3000)
+    vector_train = tfidfvectorizer.fit_transform(temp_train_data[_col])
+    feature_names = ['_'.join([_col, name]) for name in tfidfvectorizer.get_feature_names_out()]
+    vector_train = pd.DataFrame.sparse.from_spmatrix(vector_train, columns=feature_names, index=temp_train_data.index)
+    feature_train = pd.concat([feature_train, vector_train], axis=1)
+    vector_test = tfidfvectorizer.transform(temp_test_data[_col])
+    vector_test = pd.DataFrame.sparse.from_spmatrix(vector_test, columns=feature_names, index=temp_test_data.index)
+    feature_test = pd.concat([feature_test, vector_test], axis=1)
+
+# MODEL
+import numpy as np
+from xgboost import XGBClassifier
+random_state_model = 42
+model = XGBClassifier(random_state=random_state_model, )
+from sklearn.preprocessing import LabelEncoder
+label_encoder = LabelEncoder()
+target_train = pd.DataFrame(label_encoder.fit_transform(target_train), columns=TARGET_COLUMNS)
+model.fit(feature_train, target_train.values.ravel())
+y_pred = model.predict(feature_test)
+y_pred = label_encoder.inverse_transform(y_pred).reshape(-1, 1)
+
+#EVALUATION
+from sklearn import metrics
+f1 = metrics.f1_score(target_test, y_pred, average='macro')
+print('RESULT: F1 Score: ' + str(f1))
@@ -0,0 +1,65 @@
+# *** GENERATED PIPELINE ***
+
+# LOAD DATA
+import pandas as pd
+train_dataset = pd.read_pickle("./training.pkl")
+
+import pickle
+
+
+# PREPROCESSING-1
+import numpy as np
+from sklearn.impute import SimpleImputer
+STRING_COLS_WITH_MISSING_VALUES = ['explanatory_list']
+simple_imputer = SimpleImputer(missing_values=np.nan, strategy='most_frequent')
+train_dataset[STRING_COLS_WITH_MISSING_VALUES] = simple_imputer.fit_transform(train_dataset[STRING_COLS_WITH_MISSING_VALUES])
+with open('simpleimputer-string.pkl', 'wb') as f:
+    pickle.dump(simple_imputer, f)
+
+# PREPROCESSING-2
+import re
+import string
+import nltk
+TEXT_COLUMNS = ['explanatory_list']
+def process_text(__dataset):
+    for _col in TEXT_COLUMNS:
+        process_text = [t.lower() for t in __dataset[_col]]
+        # strip all punctuation
+        table = str.maketrans('', '', string.punctuation)
+        process_text = [t.translate(table) for t in process_text]
+        # convert all numbers in text to 'num'
+        process_text = [re.sub(r'\d+', 'num', t) for t in process_text]
+        __dataset[_col] = process_text
+    return __dataset
+train_dataset = process_text(train_dataset)
+
+# DETACH TARGET
+TARGET_COLUMNS = ['target_category_multi_num']
+feature_train = train_dataset.drop(TARGET_COLUMNS, axis=1)
+target_train = train_dataset[TARGET_COLUMNS].copy()
+
+# PREPROCESSING-3
+from sklearn.feature_extraction.text import TfidfVectorizer
+TEXT_COLUMNS = ['explanatory_list']
+temp_train_data = feature_train[TEXT_COLUMNS]
+# Make the entire dataframe sparse to avoid it converting into a dense matrix.
+feature_train = feature_train.drop(TEXT_COLUMNS, axis=1).astype(pd.SparseDtype('float64', 0))
+vectorizers = {}
+for _col in TEXT_COLUMNS:
+    tfidfvectorizer = TfidfVectorizer(max_features=3000)
+    vector_train = tfidfvectorizer.fit_transform(temp_train_data[_col])
+    feature_names = ['_'.join([_col, name]) for name in tfidfvectorizer.get_feature_names_out()]
+    vector_train = pd.DataFrame.sparse.from_spmatrix(vector_train, columns=feature_names, index=temp_train_data.index)
+    feature_train = pd.concat([feature_train, vector_train], axis=1)
+    vectorizers[_col] = tfidfvectorizer
+with open('tfidfVectorizer.pkl', 'wb') as f:
+    pickle.dump(vectorizers, f)
+
+# MODEL
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+random_state_model = 42
+model = RandomForestClassifier(random_state=random_state_model, )
+model.fit(feature_train, target_train.values.ravel())
+with open('model.pkl', 'wb') as f:
+    pickle.dump(model, f)
@@ -0,0 +1,158 @@
+# Copyright 2023-2024 The SapientML Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import zipfile
+from collections.abc import Mapping
+from os import PathLike
+from pathlib import Path
+from typing import Iterator, Union
+
+BUNDLE_FORMAT_VERSION = 1
+
+_INDEX_NAME = "index.json"
+_STATE_NAME = "state.pkl"
+_FILES_PREFIX = "files/"
+# Signature and field lengths of the local file header of zip
+_LOCAL_HEADER = struct.Struct("<4s22xHH")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+
+def is_bundle(path: Union[str, PathLike]) -> bool:
+    """Returns whether the file is a model bundle written by `write_bundle()`."""
+    try:
+        if not zipfile.is_zipfile(path):
+            return False
+        with zipfile.ZipFile(path) as z:
+            return _INDEX_NAME in z.NameToInfo
+    except OSError:
+        return False
+
+
+def write_bundle(path: Union[str, PathLike], files: Mapping[str, bytes], digests: dict[str, str], state: dict):
+    """Writes the files and the state of a model to a single file.
+
+    The file is an uncompressed zip archive, so that each file can be read directly from the memory-mapped archive.
+    It also contains the index of the files with their sizes and digests, and the pickled state of the model.
+
+    Parameters
+    ----------
+    path : str or PathLike
+        Path of the bundle. It is replaced atomically.
+    files : Mapping[str, bytes]
+        Contents of the files keyed by relative path.
+    digests : dict[str, str]
+        Digests of the contents keyed by relative path, e.g., computed by `hash_bytes()`.
+    state : dict
+        Picklable state of the model other than the files.
+    """
+    path = Path(path)
+    index = {
+        "version": BUNDLE_FORMAT_VERSION,
+        "files": {name: {"size": len(files[name]), "digest": digests[name]} for name in files},
+    }
+    fd, temp_path = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w", compression=zipfile.ZIP_STORED) as z:
+            z.writestr(_INDEX_NAME, json.dumps(index))
+            z.writestr(_STATE_NAME, pickle.dumps(state))
+            for name in files:
+                z.writestr(_FILES_PREFIX + name, files[name])
+        os.replace(temp_path, path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+
+
+class ModelBundle(Mapping):
+    """Read-only mapping of the files in a model bundle, read lazily from the memory-mapped bundle.
+
+    Opening a bundle reads only the index and the state of the model, regardless of the size of the files.
+    The content of a file is read when it is looked up, and is not kept in memory by this object.
+    A pickled ModelBundle becomes a dict holding all the files.
+
+    Parameters
+    ----------
+    path : str or PathLike
+        Path of the bundle written by `write_bundle()`.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a model bundle.
+
+    """
+
+    def __init__(self, path: Union[str, PathLike]):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            with zipfile.ZipFile(self._file) as z:
+                if _INDEX_NAME not in z.NameToInfo:
+                    raise ValueError(f"{self.path} is not a model bundle")
+                index = json.loads(z.read(_INDEX_NAME))
+                if index.get("version") != BUNDLE_FORMAT_VERSION:
+                    raise ValueError(f"Unsupported version of model bundle: {index.get('version')}")
+                self.state = pickle.loads(z.read(_STATE_NAME))
+                infos = {name: z.getinfo(_FILES_PREFIX + name) for name in index["files"]}
+        except (zipfile.BadZipFile, KeyError) as e:
+            self.close()
+            raise ValueError(f"{self.path} is not a model bundle") from e
+        except BaseException:
+            self.close()
+            raise
+        for name, info in infos.items():
+            if info.compress_type != zipfile.ZIP_STORED:
+                self.close()
+                raise ValueError(f"{name} is compressed in {self.path}")
+        self.digests: dict[str, str] = {name: entry["digest"] for name, entry in index["files"].items()}
+        self._infos = infos
+        self._offsets: dict[str, int] = {}
+
+    def _get_offset(self, name: str) -> int:
+        if name not in self._offsets:
+            info = self._infos[name]
+            header = self._mmap[info.header_offset : info.header_offset + _LOCAL_HEADER.size]
+            signature, filename_length, extra_length = _LOCAL_HEADER.unpack(header)
+            if signature != _LOCAL_HEADER_SIGNATURE:
+                raise ValueError(f"{name} is broken in {self.path}")
+            self._offsets[name] = info.header_offset + _LOCAL_HEADER.size + filename_length + extra_length
+        return self._offsets[name]
+
+    def __getitem__(self, name: str) -> bytes:
+        info = self._infos[name]
+        offset = self._get_offset(name)
+        return self._mmap[offset : offset + info.file_size]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._infos)
+
+    def __len__(self) -> int:
+        return len(self._infos)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+    def close(self):
+        """Closes the bundle. The files cannot be read after this."""
+        if getattr(self, "_mmap", None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
@@ -0,0 +1,347 @@
+# Copyright 2023-2024 The SapientML Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import hashlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from importlib.metadata import distributions
+from os import PathLike
+from pathlib import Path
+from typing import Iterable, Mapping, Optional, Union
+
+from .params import RunningResult
+from .util.logging import setup_logger
+
+logger = setup_logger()
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sapientml")
+DEFAULT_RESULT_CACHE_SIZE = 2 * 1024**3
+DEFAULT_EXTRACTION_CACHE_SIZE = 4 * 1024**3
+
+_HASH_CHUNK_SIZE = 2**20
+_DATA_FILE_PATTERN = re.compile(r"""["']([^"'\n]+\.(?:pkl|pickle|csv|tsv|parquet|feather|arrow))["']""")
+
+# Hashes of the data files keyed by their path, inode, size and modification time, the most recently used last
+_data_file_hashes: "OrderedDict[tuple[str, int, int, int], str]" = OrderedDict()
+_MAX_DATA_FILE_HASHES = 256
+_data_file_hashes_lock = threading.Lock()
+
+
+def get_cache_dir() -> Path:
+    """Returns the root directory of the caches, which can be changed by SAPIENTML_CACHE_DIR."""
+    return Path(os.environ.get("SAPIENTML_CACHE_DIR", DEFAULT_CACHE_DIR))
+
+
+def hash_file(path: Union[str, PathLike]) -> str:
+    """Returns the hex digest of the content of the file."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_data_file(path: Union[str, PathLike]) -> str:
+    """Returns the hex digest of the content of the data file, which is hashed once for each version of the file.
+
+    The digests are kept for the latest `_MAX_DATA_FILE_HASHES` files and told apart by their path, inode, size
+    and modification time, so that all the candidate scripts reading the file written by a fit share one hash.
+    """
+    stat = os.stat(path)
+    file_id = (str(Path(path).resolve()), stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    # The lock is held while hashing, so that the scripts looked up at the same time wait for one hash.
+    with _data_file_hashes_lock:
+        digest = _data_file_hashes.get(file_id)
+        if digest is None:
+            digest = hash_file(path)
+            _data_file_hashes[file_id] = digest
+            while len(_data_file_hashes) > _MAX_DATA_FILE_HASHES:
+                _data_file_hashes.popitem(last=False)
+        else:
+            _data_file_hashes.move_to_end(file_id)
+    return digest
+
+
+def hash_bytes(content: bytes) -> str:
+    """Returns the hex digest of the content, the same as `hash_file()` of a file containing it."""
+    return hashlib.blake2b(content, digest_size=20).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _get_environment_fingerprint() -> str:
+    packages = sorted(f"{dist.metadata['Name']}=={dist.version}" for dist in distributions())
+    h = hashlib.blake2b(digest_size=20)
+    h.update(sys.version.encode())
+    for package in packages:
+        h.update(package.encode())
+    return h.hexdigest()
+
+
+def _get_directory_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+class _DiskCache:
+    """Content-addressed directory cache with size-based LRU eviction.
+
+    Each entry is a directory named after its key. The modification time of the entry
+    is updated when it is used, and the least recently used entries are removed
+    when the total size exceeds `max_size` bytes.
+    """
+
+    def __init__(self, cache_dir: Union[str, PathLike], max_size: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def _lookup(self, key: str) -> Optional[Path]:
+        path = self._entry_path(key)
+        if not path.is_dir():
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def _store(self, key: str, populate) -> Path:
+        """Creates the entry by calling `populate` with a temporary directory, and then publishes it atomically."""
+        path = self._entry_path(key)
+        if path.is_dir():
+            os.utime(path)
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_dir = Path(tempfile.mkdtemp(prefix=f".{key}.", dir=path.parent))
+        try:
+            populate(temp_dir)
+            os.replace(temp_dir, path)
+        except OSError:
+            # Another process has published the same entry.
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            if not path.is_dir():
+                raise
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        self.evict()
+        return path
+
+    def entries(self) -> list[Path]:
+        if not self.cache_dir.is_dir():
+            return []
+        return [p for p in self.cache_dir.glob("*/*") if p.is_dir() and not p.name.startswith(".")]
+
+    def evict(self, max_size: Optional[int] = None):
+        """Removes the least recently used entries until the total size is at most `max_size` bytes."""
+        max_size = self.max_size if max_size is None else max_size
+        entries = []
+        for path in self.entries():
+            try:
+                entries.append((path.stat().st_mtime, _get_directory_size(path), path))
+            except OSError:
+                continue
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda x: x[0]):
+            if total_size <= max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+
+    def clear(self):
+        """Removes all the entries."""
+        self.evict(0)
+
+
+class ResultCache(_DiskCache):
+    """On-disk cache of the results of candidate scripts.
+
+    Results are keyed by the text of the script, the fingerprints of the data files it refers to,
+    the files in `lib/` and the versions of the installed packages.
+    Only the results of successful runs are stored, together with the files the script created.
+
+    The data files are hashed entirely by `hash_data_file()`, once for each version of the file,
+    so that any change of the data is noticed.
+
+    Parameters
+    ----------
+    cache_dir : str or PathLike, optional
+        Directory to store the results.
+        When None, `results` directory under `get_cache_dir()` is used.
+    max_size : int
+        Maximum total size of the cache in bytes.
+        The least recently used results are removed when it is exceeded.
+
+    """
+
+    def __init__(self, cache_dir: Optional[Union[str, PathLike]] = None, max_size: int = DEFAULT_RESULT_CACHE_SIZE):
+        super().__init__(cache_dir or get_cache_dir() / "results", max_size)
+
+    def get_key(self, script: str, cwd: Union[str, PathLike]) -> str:
+        """Returns the key of the script executed in `cwd`.
+
+        Parameters
+        ----------
+        script : str
+            Text of the script.
+        cwd : str or PathLike
+            Working directory of the script.
+
+        Returns
+        -------
+        key : str
+        """
+        cwd = Path(cwd)
+        h = hashlib.blake2b(digest_size=20)
+        h.update(script.encode())
+        h.update(_get_environment_fingerprint().encode())
+        for name in sorted(set(_DATA_FILE_PATTERN.findall(script))):
+            path = cwd / name
+            if path.is_file():
+                h.update(name.encode())
+                h.update(hash_data_file(path).encode())
+        for path in sorted((cwd / "lib").glob("*.py")):
+            h.update(path.name.encode())
+            h.update(hash_file(path).encode())
+        return h.hexdigest()
+
+    def get(self, key: str, output_dir: Union[str, PathLike]) -> Optional[RunningResult]:
+        """Returns the cached result and restores its artifacts into `output_dir`, or returns None."""
+        path = self._lookup(key)
+        if path is None:
+            return None
+        try:
+            result = RunningResult.model_validate_json((path / "result.json").read_text(encoding="utf-8"))
+            artifacts_dir = path / "artifacts"
+            if artifacts_dir.is_dir():
+                shutil.copytree(artifacts_dir, output_dir, dirs_exist_ok=True)
+        except (OSError, ValueError):
+            logger.warning(f"Ignoring a broken result cache entry: {path}")
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        return result
+
+    def put(
+        self,
+        key: str,
+        result: RunningResult,
+        output_dir: Union[str, PathLike],
+        artifacts: Iterable[str] = (),
+    ):
+        """Stores the result and the artifacts, given as paths relative to `output_dir`."""
+        output_dir = Path(output_dir)
+
+        def _populate(entry_dir: Path):
+            for artifact in artifacts:
+                destination = entry_dir / "artifacts" / artifact
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(output_dir / artifact, destination)
+            (entry_dir / "result.json").write_text(result.model_dump_json(), encoding="utf-8")
+
+        try:
+            self._store(key, _populate)
+        except OSError as e:
+            logger.warning(f"Failed to store the result in the cache: {e}")
+
+
+class ExtractionCache(_DiskCache):
+    """On-disk cache of the files of GeneratedModel extracted for prediction.
+
+    The files are keyed by their names and contents, written once, and reused by later calls
+    instead of being written to a new temporary directory every time.
+
+    Parameters
+    ----------
+    cache_dir : str or PathLike, optional
+        Directory to store the files.
+        When None, `models` directory under `get_cache_dir()` is used.
+    max_size : int
+        Maximum total size of the cache in bytes.
+        The least recently used models are removed when it is exceeded,
+        and models larger than this are not cached.
+
+    """
+
+    def __init__(self, cache_dir: Optional[Union[str, PathLike]] = None, max_size: int = DEFAULT_EXTRACTION_CACHE_SIZE):
+        super().__init__(cache_dir or get_cache_dir() / "models", max_size)
+
+    @staticmethod
+    def get_key(digests: dict[str, str]) -> str:
+        """Returns the key of the files given as the digests of their contents keyed by relative path."""
+        h = hashlib.blake2b(digest_size=20)
+        for name, digest in sorted(digests.items()):
+            h.update(name.encode())
+            h.update(b"\0")
+            h.update(digest.encode())
+        return h.hexdigest()
+
+    def extract(self, files: Mapping[str, bytes], digests: dict[str, str]) -> Optional[Path]:
+        """Returns the directory containing the files, extracting them if they are not cached yet.
+
+        Parameters
+        ----------
+        files : Mapping[str, bytes]
+            Contents of the files keyed by relative path.
+            They are looked up only when the files are not cached.
+        digests : dict[str, str]
+            Digests of the contents of the files to extract keyed by relative path, e.g., computed by `hash_bytes()`.
+
+        Returns
+        -------
+        path : Path, optional
+            The directory, or None if the files are too large to be cached or cannot be written.
+        """
+        key = self.get_key(digests)
+        path = self._lookup(key)
+        if path is not None:
+            return path
+        if sum(len(files[name]) for name in digests) > self.max_size:
+            return None
+
+        def _populate(entry_dir: Path):
+            for name in digests:
+                destination = entry_dir / name
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                destination.write_bytes(files[name])
+
+        try:
+            return self._store(key, _populate)
+        except OSError as e:
+            logger.warning(f"Failed to extract the model to the cache: {e}")
+            return None
+
+
+def snapshot_files(directory: Union[str, PathLike], exclude: Iterable[str] = ()) -> dict[str, tuple[int, int]]:
+    """Returns the size and modification time of the files in the directory, keyed by relative path."""
+    directory = Path(directory)
+    exclude = set(exclude)
+    snapshot = {}
+    for path in directory.rglob("*"):
+        relative_path = path.relative_to(directory)
+        if relative_path.parts[0] in exclude or "__pycache__" in relative_path.parts:
+            continue
+        try:
+            if path.is_file():
+                stat = path.stat()
+                snapshot[relative_path.as_posix()] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            continue
+    return snapshot
@@ -12,149 +12,1103 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import ast
 import asyncio
+import contextlib
+import functools
+import json
+import math
 import os
 import platform
+import re
+import shutil
+import signal
+import subprocess
 import sys
+import tempfile
+import threading
 import time
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Optional
+from typing import Coroutine, Optional, Sequence, Union
 
 import nest_asyncio
 
-from .params import CancellationToken, Code, RunningResult
+from .cache import ResultCache, snapshot_files
+from .params import CancellationToken, Code, RungResult, RunningResult, TimeoutReport, rewrite_datasets_loading
 from .util.logging import setup_logger
 
 logger = setup_logger()
 
+_READ_CHUNK_SIZE = 2**16
 
-def run(
-    file_path: str, timeout: int, cancel: Optional[CancellationToken] = None, cwd: Optional[str] = None
-) -> RunningResult:
-    """Executing run() function based on operating system.
+DEFAULT_PRELOAD_MODULES = ["numpy", "pandas", "sklearn"]
 
-    Parameters
-    ----------
-    filepath : str
-        Path of the file executed.
-    timeout : int
-        Timeout for the execution.
-    cancel : CancellationToken, optional
-        Object for cancellation.
-    cwd : str, optional
-        Working directory.
+# Default arguments of PipelineExecutor set by executor_options()
+_executor_options: ContextVar[Optional[dict]] = ContextVar("executor_options", default=None)
 
-    Returns
-    -------
-    result : RunningResult
 
+def _get_executor_options() -> dict:
+    return _executor_options.get() or {}
+
+
+@contextlib.contextmanager
+def executor_options(**options):
+    """Sets the default arguments of PipelineExecutor instantiated in this context.
+
+    PipelineExecutor is instantiated by the pipeline generators of plugins,
+    so this is the way to configure it from the caller of the generator.
+    Only the options given to this function, e.g., `deadline`, are overridden.
+    """
+    token = _executor_options.set({**_get_executor_options(), **options})
+    try:
+        yield
+    finally:
+        _executor_options.reset(token)
+
+
+def _get_rss(pid: int) -> int:
+    """Returns the resident set size of the process in bytes, or 0 if it cannot be measured."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def _get_available_memory() -> Optional[int]:
+    """Returns the physical memory available for new processes in bytes, or None if it cannot be measured.
+
+    The limit of the cgroup of this process is also taken into account, e.g., in a container.
+    """
+    available = None
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    available = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError, IndexError):
+        return None
+    try:
+        with open("/sys/fs/cgroup/memory.max", encoding="utf-8") as f:
+            cgroup_max = f.read().strip()
+        with open("/sys/fs/cgroup/memory.current", encoding="utf-8") as f:
+            cgroup_current = int(f.read())
+        if cgroup_max != "max":
+            cgroup_available = max(int(cgroup_max) - cgroup_current, 0)
+            available = cgroup_available if available is None else min(available, cgroup_available)
+    except (OSError, ValueError):
+        pass
+    return available
+
+
+class _MemorySlot:
+    """Memory reserved for a script before it is started."""
+
+    def __init__(self):
+        self.pid: Optional[int] = None
+        self.peak = 0
+
+    def rss(self) -> int:
+        """Returns the current resident set size of the script, recording the largest one in `peak`."""
+        if self.pid is None:
+            return 0
+        rss = _get_rss(self.pid)
+        self.peak = max(self.peak, rss)
+        return rss
+
+
+class _MemoryBudget:
+    """Memory budget shared by the scripts running concurrently.
+
+    A slot is reserved by `acquire()` before a script is started, and is charged the larger of
+    the resident set size of the script and the estimated peak of a script, which is the largest peak
+    of the finished scripts, or the whole `limit` until one of them has finished.
+    A new script is not started until its estimate fits in the budget left by the reserved slots,
+    which is checked again every second since the memory of the running scripts grows.
+    One script is always allowed to run so that the execution makes progress.
+    Memory usage can be measured only on platforms providing /proc.
     """
 
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.slots: list[_MemorySlot] = []
+        self.peak: Optional[int] = None
+        self._released = asyncio.Event()
+
+    def estimate(self) -> int:
+        return self.limit if self.peak is None else self.peak
+
+    def usage(self) -> int:
+        estimate = self.estimate()
+        return sum(max(slot.rss(), estimate) for slot in self.slots)
+
+    async def acquire(self) -> _MemorySlot:
+        while self.slots and self.usage() + self.estimate() > self.limit:
+            self._released.clear()
+            try:
+                await asyncio.wait_for(self._released.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+        slot = _MemorySlot()
+        self.slots.append(slot)
+        return slot
+
+    def release(self, slot: _MemorySlot):
+        self.slots.remove(slot)
+        if slot.pid is not None and slot.peak > 0:
+            self.peak = max(self.peak or 0, slot.peak)
+        self._released.set()
+
+    @contextlib.asynccontextmanager
+    async def reserve(self):
+        """Reserves a slot for a script while the context is active."""
+        slot = await self.acquire()
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+
+def _run_until_complete(coro: Coroutine):
     if platform.system() == "Windows":
-        encoding = "cp932"  # noqa
-        replace_newline = "\r"  # noqa
         loop = asyncio.ProactorEventLoop()  # noqa
     else:
-        encoding = "utf-8"
-        replace_newline = ""
         loop = asyncio.new_event_loop()
 
     asyncio.set_event_loop(loop)
     nest_asyncio.apply(loop)
 
-    async def _run() -> RunningResult:
-        start_time = time.time()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
 
+def _in_thread(func, *args) -> asyncio.Future:
+    """Calls the blocking function in a dedicated thread so that it never waits for a free thread in the executor."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def _set_result(result, exception):
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def _notify(result, exception):
+        try:
+            loop.call_soon_threadsafe(_set_result, result, exception)
+        except RuntimeError:
+            # The event loop is already closed.
+            pass
+
+    def _target():
+        try:
+            result = func(*args)
+        except Exception as e:
+            _notify(None, e)
+        except BaseException as e:
+            # e.g., SystemExit, which ends the thread after the waiter is notified.
+            _notify(None, e)
+            raise
+        else:
+            _notify(result, None)
+
+    threading.Thread(target=_target, daemon=True).start()
+    return future
+
+
+def rusage_to_dict(rusage) -> dict:
+    """Converts the resource usage returned by os.wait4() or resource.getrusage() to a dict."""
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+    max_rss_unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "user_time": rusage.ru_utime,
+        "system_time": rusage.ru_stime,
+        "max_rss": rusage.ru_maxrss * max_rss_unit,
+    }
+
+
+class _SubprocessJob:
+    """Script executed in a fresh interpreter."""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.pid = process.pid
+        self.resource_usage: dict = {}
+
+    @classmethod
+    async def start(cls, file_path: str, cwd: str):
+        if hasattr(os, "wait4"):
+            return await _PosixSubprocessJob.start(file_path, cwd)
         process = await asyncio.create_subprocess_exec(
             sys.executable,
             file_path,
-            cwd=cwd or os.path.dirname(file_path),
+            cwd=cwd,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
         )
+        return cls(process)
 
-        endtime = time.time() + timeout if timeout > 0 else None
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.process.returncode
 
-        async def _read_stream(stream, encoding, replace_newline):
-            lines = []
-            while True:
-                line = await stream.readline()
-                if line:
-                    lines.append(line.decode(encoding).replace(replace_newline, ""))
-                if stream.at_eof():
-                    break
-                await asyncio.sleep(0.1)
-            return lines
+    @staticmethod
+    async def _read_stream(stream) -> bytes:
+        chunks = []
+        while True:
+            chunk = await stream.read(_READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
 
-        async def _wait_timeout_or_cancel(proc, endtime, cancel):
-            interrupted_reason = None
-            returncode = None
+    async def communicate(self) -> tuple[bytes, bytes]:
+        stdout, stderr = await asyncio.gather(
+            self._read_stream(self.process.stdout), self._read_stream(self.process.stderr)
+        )
+        await self.process.wait()
+        return stdout, stderr
 
-            while True:
-                if proc.stdout.at_eof() and proc.stderr.at_eof():
-                    break
+    def kill(self):
+        if self.process.returncode is None:
+            self.process.kill()
 
-                if endtime is not None and time.time() > endtime:
-                    returncode = -9
-                    interrupted_reason = "Timeout"
-                    print("Terminating due to timeout")
-                    proc.kill()
-                    break
-                if cancel is not None and cancel.is_triggered:
-                    returncode = -9  # noqa
-                    interrupted_reason = "Cancelled by user"  # noqa
-                    print("Terminating due to cancellation")  # noqa
-                    proc.kill()  # noqa
-                    break  # noqa
-                await asyncio.sleep(1)
-            return returncode, interrupted_reason
-
-        results = await asyncio.gather(
-            _read_stream(process.stdout, encoding, replace_newline),
-            _read_stream(process.stderr, encoding, replace_newline),
-            _wait_timeout_or_cancel(process, endtime, cancel),
+    def close(self):
+        pass
+
+
+class _PosixSubprocessJob(_SubprocessJob):
+    """Script executed in a fresh interpreter, which is reaped by os.wait4() to get its resource usage."""
+
+    def __init__(self, process: subprocess.Popen, stdout: asyncio.StreamReader, stderr: asyncio.StreamReader):
+        self.process = process
+        self.pid = process.pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.resource_usage = {}
+
+    @classmethod
+    async def start(cls, file_path: str, cwd: str):
+        loop = asyncio.get_running_loop()
+        process = subprocess.Popen(
+            [sys.executable, file_path],
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        readers = []
+        for pipe in (process.stdout, process.stderr):
+            reader = asyncio.StreamReader(limit=_READ_CHUNK_SIZE)
+            await loop.connect_read_pipe(functools.partial(asyncio.StreamReaderProtocol, reader), pipe)
+            readers.append(reader)
+        return cls(process, *readers)
+
+    async def communicate(self) -> tuple[bytes, bytes]:
+        stdout, stderr = await asyncio.gather(self._read_stream(self.stdout), self._read_stream(self.stderr))
+        _, status, rusage = await _in_thread(os.wait4, self.pid, 0)
+        self.process.returncode = os.waitstatus_to_exitcode(status)
+        self.resource_usage = rusage_to_dict(rusage)
+        return stdout, stderr
+
+    def kill(self):
+        # Popen.kill() may reap the process by polling, which must be done only by os.wait4().
+        if self.process.returncode is None:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
+class _Worker:
+    """Pre-warmed interpreter running sapientml.worker."""
+
+    def __init__(self, preload: list[str]):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "sapientml.worker", *preload],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
         )
+        self.ready = False
+
+    def receive(self) -> dict:
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("Worker process exited unexpectedly")
+        return json.loads(line)
+
+    def send(self, request: dict):
+        self.process.stdin.write((json.dumps(request) + "\n").encode())
+        self.process.stdin.flush()
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
 
-        await process.wait()
+    def terminate(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
 
-        stdout_lines = results[0]
-        stderr_lines = results[1]
-        returncode, interrupted_reason = results[2]
 
-        if not returncode:
-            returncode = process.returncode
+class _WorkerJob:
+    """Script executed in a child forked from a pre-warmed interpreter."""
 
-        if interrupted_reason is not None:
-            output = ""
-            error = interrupted_reason
+    def __init__(self, pool: "WorkerPool", worker: _Worker, temp_dir: str, pid: int):
+        self.pool = pool
+        self.worker = worker
+        self.temp_dir = temp_dir
+        self.pid = pid
+        self.returncode: Optional[int] = None
+        self.resource_usage: dict = {}
+
+    @classmethod
+    async def start(cls, pool: "WorkerPool", file_path: str, cwd: str):
+        worker = pool._acquire()
+        temp_dir = tempfile.mkdtemp(prefix="sapientml_worker_")
+        try:
+            if not worker.ready:
+                await _in_thread(worker.receive)
+                worker.ready = True
+            worker.send(
+                {
+                    "file_path": os.path.abspath(file_path),
+                    "cwd": os.path.abspath(cwd),
+                    "stdout": os.path.join(temp_dir, "stdout"),
+                    "stderr": os.path.join(temp_dir, "stderr"),
+                }
+            )
+            message = await _in_thread(worker.receive)
+        except BaseException:
+            worker.terminate()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        return cls(pool, worker, temp_dir, message["pid"])
+
+    def _read_outputs(self) -> tuple[bytes, bytes]:
+        outputs = []
+        for name in ("stdout", "stderr"):
+            try:
+                with open(os.path.join(self.temp_dir, name), "rb") as f:
+                    outputs.append(f.read())
+            except FileNotFoundError:
+                # The child was killed before it redirected the output.
+                outputs.append(b"")
+        stdout, stderr = outputs
+        return stdout, stderr
+
+    async def communicate(self) -> tuple[bytes, bytes]:
+        message = await _in_thread(self.worker.receive)
+        self.returncode = message["returncode"]
+        self.resource_usage = message.get("resource_usage", {})
+        return self._read_outputs()
+
+    def kill(self):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def close(self):
+        if self.returncode is None:
+            # The worker is still waiting for the child, so it cannot be reused.
+            self.worker.terminate()
         else:
-            output = "".join(stdout_lines)
-            error = "".join(stderr_lines)
-
-        result = RunningResult(
-            output=output,
-            error=error,
-            returncode=returncode,
-            time=int(round(time.time() - start_time)),
+            self.pool._release(self.worker)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+def _common_prefix(scripts: list[str]) -> str:
+    """Returns the longest sequence of top-level statements common to all the scripts."""
+    prefix_length = len(os.path.commonprefix(scripts))
+    boundaries = None
+    for script in scripts:
+        try:
+            body = ast.parse(script).body
+        except SyntaxError:
+            return ""
+        # Offsets just after the lines where top-level statements end
+        line_offsets = [0]
+        for line in script.splitlines(keepends=True):
+            line_offsets.append(line_offsets[-1] + len(line))
+        ends = {line_offsets[stmt.end_lineno] for stmt in body}
+        boundaries = ends if boundaries is None else boundaries & ends
+    candidates = [offset for offset in boundaries or () if offset <= prefix_length]
+    return scripts[0][: max(candidates)] if candidates else ""
+
+
+class _ForkServer:
+    """Process which runs the prefix common to the scripts once and forks a child to run the rest of each script.
+
+    The children share the data loaded by the prefix copy-on-write.
+    """
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self._next_id = 0
+        self._started: dict[int, asyncio.Future] = {}
+        self._finished: dict[int, asyncio.Future] = {}
+        self._dispatcher: Optional[asyncio.Future] = None
+
+    @classmethod
+    async def start(cls, prefix: str, file_path: str, cwd: str, timeout: float) -> Optional["_ForkServer"]:
+        """Starts the server, or returns None if the prefix fails."""
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "sapientml.worker",
+            "--fork-server",
+            *DEFAULT_PRELOAD_MODULES,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=2**20,
         )
-        return result
+        server = cls(process)
+        server._send({"prefix": prefix, "file_path": file_path, "cwd": cwd})
+        try:
+            line = await asyncio.wait_for(process.stdout.readline(), timeout if timeout > 0 else None)
+            message = json.loads(line) if line else {"ready": False, "error": "The process exited unexpectedly"}
+        except asyncio.TimeoutError:
+            message = {"ready": False, "error": "Timeout"}
+        if not message["ready"]:
+            logger.warning(f"Failed to run the common part of the pipelines in the fork server: {message['error']}")
+            await server.close()
+            return None
+        server._dispatcher = asyncio.ensure_future(server._dispatch())
+        return server
+
+    def _send(self, message: dict):
+        self.process.stdin.write((json.dumps(message) + "\n").encode())
+
+    async def _dispatch(self):
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            futures = self._started if "pid" in message else self._finished
+            future = futures.pop(message["id"], None)
+            if future is not None and not future.done():
+                future.set_result(message)
+        for future in [*self._started.values(), *self._finished.values()]:
+            if not future.done():
+                future.set_exception(RuntimeError("Fork server exited unexpectedly"))
+        self._started.clear()
+        self._finished.clear()
+
+    async def fork(self, request: dict) -> tuple[int, asyncio.Future]:
+        """Runs the script in a new child, and returns its pid and the future of the exit message."""
+        if self._dispatcher is None or self._dispatcher.done():
+            raise RuntimeError("Fork server is not running")
+        loop = asyncio.get_running_loop()
+        request_id = self._next_id
+        self._next_id += 1
+        started = self._started[request_id] = loop.create_future()
+        finished = self._finished[request_id] = loop.create_future()
+        self._send({"id": request_id, **request})
+        message = await started
+        return message["pid"], finished
+
+    async def close(self):
+        if self.process.returncode is None:
+            self.process.kill()
+        await self.process.wait()
+        if self._dispatcher is not None:
+            await self._dispatcher
+
+
+class _ForkServerJob(_WorkerJob):
+    """Script executed in a child forked from the fork server."""
+
+    def __init__(self, finished: asyncio.Future, temp_dir: str, pid: int):
+        self.finished = finished
+        self.temp_dir = temp_dir
+        self.pid = pid
+        self.returncode: Optional[int] = None
+        self.resource_usage: dict = {}
+
+    @classmethod
+    async def start(cls, server: _ForkServer, file_path: str, cwd: str):
+        temp_dir = tempfile.mkdtemp(prefix="sapientml_fork_")
+        try:
+            pid, finished = await server.fork(
+                {
+                    "file_path": os.path.abspath(file_path),
+                    "cwd": os.path.abspath(cwd),
+                    "stdout": os.path.join(temp_dir, "stdout"),
+                    "stderr": os.path.join(temp_dir, "stderr"),
+                }
+            )
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        return cls(finished, temp_dir, pid)
+
+    async def communicate(self) -> tuple[bytes, bytes]:
+        try:
+            message = await self.finished
+        except RuntimeError as e:
+            self.returncode = 1
+            stdout, stderr = self._read_outputs()
+            return stdout, stderr + str(e).encode()
+        self.returncode = message["returncode"]
+        self.resource_usage = message.get("resource_usage", {})
+        return self._read_outputs()
+
+    def close(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+class WorkerPool:
+    """Pool of pre-warmed Python interpreters to execute scripts.
+
+    Each worker imports the heavy modules once and then forks a child per script,
+    so that a script does not pay for the imports but still starts from a clean namespace.
+    Pass the pool to `run()`, `PipelineExecutor` or `GeneratedModel` to use it.
+    Only available on platforms supporting `os.fork()`.
 
+    Parameters
+    ----------
+    size : int, optional
+        Number of idle workers kept warm.
+        More workers are started on demand when more scripts run at the same time.
+        When None, the number of CPU cores is used.
+    preload : list[str], optional
+        Names of the modules imported by the workers in advance.
+        Modules which cannot be imported are ignored.
+
+    """
+
+    def __init__(self, size: Optional[int] = None, preload: Optional[list[str]] = None):
+        if not hasattr(os, "fork"):
+            raise RuntimeError("WorkerPool is not supported on this platform")
+        self.size = size or os.cpu_count() or 1
+        self.preload = DEFAULT_PRELOAD_MODULES if preload is None else list(preload)
+        self._lock = threading.Lock()
+        self._idle: list[_Worker] = []
+        self._closed = False
+        self._fill()
+
+    def _fill(self):
+        while len(self._idle) < self.size:
+            self._idle.append(_Worker(self.preload))
+
+    def _acquire(self) -> _Worker:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("WorkerPool is already closed")
+            self._idle = [worker for worker in self._idle if worker.is_alive()]
+            worker = self._idle.pop(0) if self._idle else _Worker(self.preload)
+            # Start warming up a replacement while the script is running.
+            self._fill()
+        return worker
+
+    def _release(self, worker: _Worker):
+        with self._lock:
+            if not self._closed and worker.is_alive() and len(self._idle) < self.size:
+                self._idle.append(worker)
+                return
+        worker.terminate()
+
+    def close(self):
+        """Terminates all the idle workers."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+async def _run(
+    file_path: str,
+    timeout: int,
+    cancel: Optional[CancellationToken] = None,
+    cwd: Optional[str] = None,
+    memory_slot: Optional[_MemorySlot] = None,
+    worker_pool: Optional[WorkerPool] = None,
+    fork_server: Optional[_ForkServer] = None,
+) -> RunningResult:
+    if platform.system() == "Windows":
+        encoding = "cp932"  # noqa
+        replace_newline = "\r"  # noqa
+    else:
+        encoding = "utf-8"
+        replace_newline = ""
+
+    start_time = time.perf_counter()
+
+    cwd = cwd or os.path.dirname(file_path)
+    if fork_server is not None:
+        job = await _ForkServerJob.start(fork_server, file_path, cwd)
+    elif worker_pool is not None:
+        job = await _WorkerJob.start(worker_pool, file_path, cwd)
+    else:
+        job = await _SubprocessJob.start(file_path, cwd)
+    if memory_slot is not None:
+        memory_slot.pid = job.pid
+
+    loop = asyncio.get_running_loop()
+    cancelled = loop.create_future()
+
+    def _on_cancel():
+        def _set_cancelled():
+            if not cancelled.done():
+                cancelled.set_result(None)
+
+        loop.call_soon_threadsafe(_set_cancelled)
+
+    if cancel is not None:
+        cancel.add_callback(_on_cancel)
+        if cancel.is_triggered:
+            cancelled.set_result(None)
+
+    interrupted_reason = None
+    returncode = None
+    completion = asyncio.ensure_future(job.communicate())
     try:
-        result = loop.run_until_complete(_run())
+        # Wake up on whichever comes first: exit of the script, cancellation, or the deadline.
+        done, _ = await asyncio.wait(
+            {completion, cancelled}, timeout=timeout if timeout > 0 else None, return_when=asyncio.FIRST_COMPLETED
+        )
+        if completion not in done:
+            returncode = -9
+            if cancelled in done:
+                interrupted_reason = "Cancelled by user"
+                print("Terminating due to cancellation")
+            else:
+                interrupted_reason = "Timeout"
+                print("Terminating due to timeout")
+            job.kill()
+
+        stdout, stderr = await completion
     finally:
-        loop.close()
-        asyncio.set_event_loop(asyncio.new_event_loop())
+        if job.returncode is None:
+            # The caller stopped waiting, e.g., by cancelling this coroutine.
+            job.kill()
+        completion.cancel()
+        job.close()
+        if cancel is not None:
+            cancel.remove_callback(_on_cancel)
+        cancelled.cancel()
+        if memory_slot is not None:
+            memory_slot.peak = max(memory_slot.peak, job.resource_usage.get("max_rss") or 0)
 
+    if not returncode:
+        returncode = job.returncode
+
+    if interrupted_reason is not None:
+        output = ""
+        error = interrupted_reason
+    else:
+        output = stdout.decode(encoding, errors="replace").replace(replace_newline, "")
+        error = stderr.decode(encoding, errors="replace").replace(replace_newline, "")
+
+    result = RunningResult(
+        output=output,
+        error=error,
+        returncode=returncode,
+        time=time.perf_counter() - start_time,
+        user_time=job.resource_usage.get("user_time"),
+        system_time=job.resource_usage.get("system_time"),
+        max_rss=job.resource_usage.get("max_rss"),
+        output_bytes=len(stdout),
+        error_bytes=len(stderr),
+    )
     return result
 
 
+def run(
+    file_path: str,
+    timeout: int,
+    cancel: Optional[CancellationToken] = None,
+    cwd: Optional[str] = None,
+    worker_pool: Optional[WorkerPool] = None,
+) -> RunningResult:
+    """Executing run() function based on operating system.
+
+    Parameters
+    ----------
+    filepath : str
+        Path of the file executed.
+    timeout : int
+        Timeout for the execution.
+    cancel : CancellationToken, optional
+        Object for cancellation.
+    cwd : str, optional
+        Working directory.
+    worker_pool : WorkerPool, optional
+        Pool of pre-warmed interpreters to execute the file.
+        When None, the file is executed in a new interpreter.
+
+    Returns
+    -------
+    result : RunningResult
+
+    """
+    return _run_until_complete(_run(file_path, timeout, cancel, cwd, worker_pool=worker_pool))
+
+
+async def run_async(
+    file_path: str,
+    timeout: int,
+    cancel: Optional[CancellationToken] = None,
+    cwd: Optional[str] = None,
+    worker_pool: Optional[WorkerPool] = None,
+) -> RunningResult:
+    """Coroutine version of `run()`.
+
+    It runs on the caller's event loop and does not change the event loop of the current thread,
+    so that many scripts can be executed concurrently.
+
+    Parameters
+    ----------
+    filepath : str
+        Path of the file executed.
+    timeout : int
+        Timeout for the execution.
+    cancel : CancellationToken, optional
+        Object for cancellation.
+    cwd : str, optional
+        Working directory.
+    worker_pool : WorkerPool, optional
+        Pool of pre-warmed interpreters to execute the file.
+        When None, the file is executed in a new interpreter.
+
+    Returns
+    -------
+    result : RunningResult
+
+    """
+    return await _run(file_path, timeout, cancel, cwd, worker_pool=worker_pool)
+
+
+def _format_resource_usage(running_results: list[RunningResult]) -> str:
+    def _format(value, fmt):
+        return "-" if value is None else format(value, fmt)
+
+    header = ("script", "returncode", "wall[s]", "user[s]", "sys[s]", "peak_rss[MiB]", "stdout[B]", "stderr[B]")
+    rows = [header]
+    for index, result in enumerate(running_results, start=1):
+        rows.append(
+            (
+                f"{index}_script.py",
+                str(result.returncode),
+                _format(result.time, ".3f"),
+                _format(result.user_time, ".3f"),
+                _format(result.system_time, ".3f"),
+                _format(None if result.max_rss is None else result.max_rss / 1024**2, ".1f"),
+                str(result.output_bytes),
+                str(result.error_bytes),
+            )
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return "\n".join(
+        "  ".join(
+            cell.ljust(width) if i == 0 else cell.rjust(width) for i, (cell, width) in enumerate(zip(row, widths))
+        )
+        for row in rows
+    )
+
+
+class AdaptiveTimeout:
+    """Timeout policy sharing a time budget among the candidate scripts.
+
+    The timeout of a candidate is the larger of its fair share of the remaining budget
+    and `slack` times the median runtime of the candidates completed so far,
+    but never more than the remaining budget nor `max_timeout`.
+    Fast candidates thus leave their unused share to the later ones,
+    while a hung candidate cannot consume the time of the others.
+
+    Parameters
+    ----------
+    time_budget : float
+        Time budget in seconds for executing all the candidates.
+    max_timeout : float
+        Upper limit of the timeout of each candidate in seconds. 0 means no limit.
+    slack : float
+        Multiplier applied to the median runtime of the completed candidates.
+    min_timeout : float
+        Lower limit of the timeout in seconds as long as the budget remains.
+
+    """
+
+    def __init__(self, time_budget: float, max_timeout: float = 0, slack: float = 3.0, min_timeout: float = 1.0):
+        self.time_budget = time_budget
+        self.max_timeout = max_timeout
+        self.slack = slack
+        self.min_timeout = min_timeout
+        self.runtimes: list[float] = []
+        self._start_time = time.perf_counter()
+        self._pending = 0
+        self._lanes = 1
+
+    def start(self, num_candidates: int, num_lanes: int):
+        """Starts the clock for `num_candidates` candidates running on at most `num_lanes` lanes at a time."""
+        self.runtimes = []
+        self._start_time = time.perf_counter()
+        self._pending = num_candidates
+        self._lanes = max(num_lanes, 1)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start_time
+
+    def remaining(self) -> float:
+        return max(self.time_budget - self.elapsed(), 0.0)
+
+    def next_timeout(self) -> float:
+        """Returns the timeout of the candidate starting now, or 0 if the budget has run out."""
+        pending = max(self._pending, 1)
+        self._pending = pending - 1
+        remaining = self.remaining()
+        if remaining <= 0:
+            return 0.0
+        timeout = remaining * min(self._lanes, pending) / pending
+        if self.runtimes:
+            runtimes = sorted(self.runtimes)
+            median = runtimes[len(runtimes) // 2]
+            timeout = max(timeout, self.slack * median)
+        timeout = max(timeout, self.min_timeout)
+        if self.max_timeout > 0:
+            timeout = min(timeout, self.max_timeout)
+        return min(timeout, remaining)
+
+    def skip(self):
+        """Tells that a candidate is done without being executed."""
+        self._pending = max(self._pending - 1, 0)
+
+    def record(self, result: RunningResult):
+        """Tells the runtime of a completed candidate."""
+        if result.returncode == 0:
+            self.runtimes.append(result.time)
+
+
+def parse_score(output: str) -> Optional[float]:
+    """Returns the score in the last `RESULT: <metric>: <score>` line of the output of a script, or None."""
+    score = None
+    for line in output.splitlines():
+        if line.startswith("RESULT: "):
+            try:
+                score = float(line.split(":")[-1].strip())
+            except ValueError:
+                continue
+    return score
+
+
+class SuccessiveHalving:
+    """Racing of the candidate scripts by successive halving on subsamples of the training data.
+
+    All the candidates are first run on a small stratified subsample of the training split.
+    Only the top `keep` of them are promoted to the next, larger fraction,
+    and only the survivors of the last rung are run on the full data.
+    The subsample is taken by the SUBSAMPLE block of the scripts, i.e., `lib/sample_dataset.py`,
+    and candidates without the block are run on the full data only.
+
+    Parameters
+    ----------
+    fractions : list[float]
+        Fractions of the training rows for the rungs before the full data, in ascending order.
+    keep : float
+        Fraction of the candidates promoted to the next rung. At least one candidate is promoted.
+    min_rows : int
+        Minimum number of training rows of a subsample.
+    lower_is_better : bool, optional
+        Whether a lower score is better.
+        When None, it is decided from `adaptation_metric` by SapientML.fit, and otherwise a higher score is better.
+
+    """
+
+    _SUBSAMPLE_PATTERN = re.compile(r"(sample_dataset\(\s*dataframe=train_dataset,\s*sample_size=)(\d+)")
+
+    def __init__(
+        self,
+        fractions: Sequence[float] = (0.1, 0.3),
+        keep: float = 0.5,
+        min_rows: int = 100,
+        lower_is_better: Optional[bool] = None,
+    ):
+        if not all(0 < fraction < 1 for fraction in fractions) or list(fractions) != sorted(fractions):
+            raise ValueError("fractions must be in ascending order and between 0 and 1.")
+        if not 0 < keep <= 1:
+            raise ValueError("keep must be in (0, 1].")
+        self.fractions = list(fractions)
+        self.keep = keep
+        self.min_rows = min_rows
+        self.lower_is_better = lower_is_better
+
+    def can_subsample(self, script: str) -> bool:
+        """Returns whether the script has the SUBSAMPLE block."""
+        return self._SUBSAMPLE_PATTERN.search(script) is not None
+
+    def subsample(self, script: str, fraction: float) -> str:
+        """Returns the script trained on `fraction` of the training rows."""
+
+        def _replace(match: re.Match) -> str:
+            # sample_dataset() returns the data as it is when sample_size exceeds the number of rows.
+            return (
+                f"{match.group(1)}min({match.group(2)}, len(train_dataset) + 1, "
+                f"max({self.min_rows}, int(len(train_dataset) * {fraction})))"
+            )
+
+        return self._SUBSAMPLE_PATTERN.sub(_replace, script, count=1)
+
+    def select(self, scores: dict[int, float]) -> list[int]:
+        """Returns the keys of the candidates promoted to the next rung."""
+        ranked = sorted(scores, key=lambda key: scores[key], reverse=not self.lower_is_better)
+        return ranked[: max(1, math.ceil(len(ranked) * self.keep))]
+
+
+def _format_timeout_report(report: TimeoutReport) -> str:
+    lines = [
+        f"Time budget: {report.time_budget:.1f}s, elapsed: {report.elapsed:.1f}s, saved: {report.saved:.1f}s",
+    ]
+    if report.cut_off:
+        cut_off = ", ".join(
+            f"{index}_script.py"
+            + ("" if report.timeouts[index - 1] is None else f" ({report.timeouts[index - 1]:.1f}s)")
+            for index in report.cut_off
+        )
+        lines.append(f"Cut off: {cut_off}")
+    else:
+        lines.append("Cut off: none")
+    return "\n".join(lines)
+
+
 class PipelineExecutor:
-    """PipelineExecutor class for executing the generated pipelines."""
+    """PipelineExecutor class for executing the generated pipelines.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        Maximum number of pipelines executed at the same time.
+        When None, the value set by `executor_options()` is used, and the number of CPU cores if it is not set either.
+    memory_limit : int, optional
+        Memory budget in bytes shared by all the pipelines running at the same time.
+        A new pipeline is started only when its estimated memory, the largest peak of the finished pipelines,
+        fits in the budget left by the running ones, so only one pipeline runs until the first one finishes.
+        When None, the value set by `executor_options()` is used, and the physical memory available
+        when the execution starts if it is not set either. 0 means memory usage is not limited,
+        which is also the case when the available memory cannot be measured.
+    worker_pool : WorkerPool, optional
+        Pool of pre-warmed interpreters to execute the pipelines.
+        When None, the value set by `executor_options()` is used,
+        and each pipeline is executed in a new interpreter if it is not set either.
+    result_cache : ResultCache or bool
+        Cache of the results of the pipelines.
+        A pipeline whose script, data files and libraries are the same as a cached one is not executed.
+        While the results are cached, each pipeline runs in its own working directory under `output_dir`,
+        so that the files it creates are cached with its result, and they are moved to `output_dir` after it exits.
+        The data files must be referred to by absolute paths, as the generated pipelines do.
+        When True, the default ResultCache under `sapientml.cache.get_cache_dir()` is used
+        unless the environment variable SAPIENTML_DISABLE_RESULT_CACHE is set to a non-empty value.
+        When False, the results are not cached.
+        When None, the value set by `executor_options()` is used, and True if it is not set either.
+    time_budget : float, optional
+        Time budget in seconds for executing all the pipelines.
+        When specified, the timeout of each pipeline is decided by AdaptiveTimeout from the remaining budget
+        and the runtimes of the completed pipelines, and `initial_timeout` of `execute()` is its upper limit.
+        Pipelines not started before the budget runs out are skipped.
+        When None, every pipeline gets `initial_timeout`.
+    deadline : float, optional
+        Value of time.monotonic() by which all the pipelines must finish.
+        The time left until the deadline is used as `time_budget` when it is shorter.
+        When None, the value set by `executor_options()` is used.
+    racing : SuccessiveHalving, optional
+        Racing of the pipelines on subsamples of the training data before running them on the full data.
+        The results of the rungs are recorded in `rungs` of RunningResult,
+        and the pipelines eliminated by racing have `eliminated` set to True.
+        When None, the value set by `executor_options()` is used, and all the pipelines run on the full data
+        if it is not set either.
+    fork_server : bool, optional
+        Whether to run the pipelines in the fork server, which is supported only on platforms with `os.fork()`.
+        The fork server runs the top-level statements common to all the pipelines, e.g., loading and splitting
+        the dataset, only once, and forks a child to run the rest of each pipeline.
+        The children share the loaded data copy-on-write instead of loading it from the disk.
+        If the common part fails, the pipelines are executed separately.
+        When None, the value set by `executor_options()` is used, and False if it is not set either.
+    save_datasets_format : 'csv', 'pickle', 'feather' or 'parquet', optional
+        Data format of the datasets read by the pipelines.
+        The copies of the pipelines reading feather files are rewritten to read them by memory-mapping,
+        so that the pipelines running at the same time share the pages of the files,
+        and those reading parquet files are rewritten to read them by read_parquet.
+        The final scripts are rewritten to read the training and test data in this format.
+        See `rewrite_datasets_loading()`.
+        When None, the value set by `executor_options()` is used.
+    csv_dtypes : dict[str, str], optional
+        dtypes of the columns passed to read_csv of csv files in the pipelines, e.g., `Dataset.csv_dtypes`.
+        When None, the value set by `executor_options()` is used.
+    csv_encoding : str, optional
+        Encoding of the csv files read by the final scripts rewritten to read csv files.
+        When None, the value set by `executor_options()` is used, and 'UTF-8' if it is not set either.
+    csv_delimiter : str, optional
+        Delimiter of the csv files read by the final scripts rewritten to read csv files.
+        When None, the value set by `executor_options()` is used, and ',' if it is not set either.
+
+    Attributes
+    ----------
+    timeout_report : TimeoutReport, optional
+        Report of the last execution with `time_budget` or `deadline`, telling which pipelines were cut off
+        and how much of the budget was saved.
+
+    """
 
     def __init__(
         self,
+        max_workers: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        worker_pool: Optional[WorkerPool] = None,
+        result_cache: Optional[Union[ResultCache, bool]] = None,
+        time_budget: Optional[float] = None,
+        deadline: Optional[float] = None,
+        racing: Optional[SuccessiveHalving] = None,
+        fork_server: Optional[bool] = None,
+        save_datasets_format: Optional[str] = None,
+        csv_dtypes: Optional[dict[str, str]] = None,
+        csv_encoding: Optional[str] = None,
+        csv_delimiter: Optional[str] = None,
     ):
-        pass
+        options = _get_executor_options()
+        self.max_workers = options.get("max_workers") if max_workers is None else max_workers
+        self.memory_limit = options.get("memory_limit") if memory_limit is None else memory_limit
+        self.worker_pool = options.get("worker_pool") if worker_pool is None else worker_pool
+        if result_cache is None:
+            result_cache = options.get("result_cache", True)
+        if result_cache is True:
+            result_cache = None if os.environ.get("SAPIENTML_DISABLE_RESULT_CACHE") else ResultCache()
+        self.result_cache = result_cache or None
+        self.time_budget = time_budget
+        self.deadline = options.get("deadline") if deadline is None else deadline
+        self.racing = options.get("racing") if racing is None else racing
+        if fork_server is None:
+            fork_server = options.get("fork_server", False)
+        if fork_server and not hasattr(os, "fork"):
+            raise RuntimeError("Fork server is not supported on this platform")
+        self.fork_server = fork_server
+        if save_datasets_format is None:
+            save_datasets_format = options.get("save_datasets_format")
+        self.save_datasets_format = save_datasets_format
+        self.csv_dtypes = options.get("csv_dtypes") if csv_dtypes is None else csv_dtypes
+        self.csv_encoding = options.get("csv_encoding", "UTF-8") if csv_encoding is None else csv_encoding
+        self.csv_delimiter = options.get("csv_delimiter", ",") if csv_delimiter is None else csv_delimiter
+        self.timeout_report: Optional[TimeoutReport] = None
 
     def execute(
         self,
@@ -179,22 +1133,94 @@ class PipelineExecutor:
         -------
         candidate_scripts: list[tuple[Code, RunningResult]]
             It stores both the results and the code in list of tuples format.
+            The order is the same as `pipeline_list`.
 
         """
-        candidate_scripts: list[tuple[Code, RunningResult]] = []
+        return _run_until_complete(self.execute_async(pipeline_list, initial_timeout, output_dir, cancel))
 
+    async def execute_async(
+        self,
+        pipeline_list: list[Code],
+        initial_timeout: int,
+        output_dir: Path,
+        cancel: Optional[CancellationToken],
+    ) -> list[tuple[Code, RunningResult]]:
+        """Coroutine version of `execute()`, which runs on the caller's event loop.
+
+        Parameters
+        ----------
+        pipeline_list: list[Code]
+            List of generated pipeline code.
+        initial_timeout: int
+            Timeout for the execution.
+        output_dir: Path
+            Output directory to store the results.
+        cancel : CancellationToken, optional
+            Object for cancellation.
+        Returns
+        -------
+        candidate_scripts: list[tuple[Code, RunningResult]]
+            It stores both the results and the code in list of tuples format.
+            The code is the copy of the pipeline rewritten by `rewrite_datasets_loading()`.
+            The order is the same as `pipeline_list`.
+
+        """
+        # The copies of the code are rewritten and returned, so that the final scripts saved from them
+        # read the datasets in the same way, while the given code is kept as it is.
+        pipeline_list = [
+            pipeline.model_copy(
+                update={
+                    field: rewrite_datasets_loading(
+                        getattr(pipeline, field),
+                        self.save_datasets_format,
+                        self.csv_dtypes,
+                        self.csv_encoding,
+                        self.csv_delimiter,
+                    )
+                    for field in ("validation", "test", "train", "predict")
+                }
+            )
+            for pipeline in pipeline_list
+        ]
+
+        script_paths = []
         for index, pipeline in enumerate(pipeline_list, start=1):
             script_name = f"{index}_script.py"
             script_path = (output_dir / script_name).absolute().as_posix()
             with open(script_path, "w", encoding="utf-8") as f:
                 f.write(pipeline.validation)
+            script_paths.append(script_path)
+
+        deadline = self.deadline
+        if self.time_budget is not None:
+            budget_deadline = time.monotonic() + self.time_budget
+            deadline = budget_deadline if deadline is None else min(deadline, budget_deadline)
 
-            logger.info(f"Running script ({index}/{len(pipeline_list)})...")
-            running_result = run(script_path, initial_timeout, cancel)
+        if self.racing is None:
+            running_results = await self._execute(
+                list(range(1, len(pipeline_list) + 1)),
+                len(pipeline_list),
+                [pipeline.validation for pipeline in pipeline_list],
+                script_paths,
+                initial_timeout,
+                output_dir,
+                cancel,
+                deadline,
+            )
+        else:
+            running_results = await self._race(
+                pipeline_list, script_paths, initial_timeout, output_dir, cancel, deadline
+            )
+
+        candidate_scripts: list[tuple[Code, RunningResult]] = []
+        for index, (pipeline, running_result) in enumerate(zip(pipeline_list, running_results), start=1):
+            script_name = f"{index}_script.py"
             candidate_scripts.append((pipeline, running_result))
             reason = ""
             error_message = running_result.error.strip().split("\n")
-            if running_result.returncode != 0:
+            if running_result.eliminated:
+                logger.info(f"Pipeline '{script_name}' was eliminated by racing.")
+            elif running_result.returncode != 0:
                 if running_result.returncode == 124:
                     # Status code 124 means timeout on linux timeout command
                     reason = "Timeout"
@@ -206,4 +1232,237 @@ class PipelineExecutor:
                     reason = f"Status code: {running_result.returncode}"
                 logger.warning(f"Failed to run a pipeline '{script_name}': {reason}")
 
+        logger.info("Resource usage of the pipelines:\n" + _format_resource_usage(running_results))
+        if self.timeout_report is not None:
+            logger.info("Adaptive timeout of the pipelines:\n" + _format_timeout_report(self.timeout_report))
+
         return candidate_scripts
+
+    async def _execute(
+        self,
+        indices: list[int],
+        num_candidates: int,
+        scripts: list[str],
+        script_paths: list[str],
+        initial_timeout: int,
+        output_dir: Path,
+        cancel: Optional[CancellationToken],
+        deadline: Optional[float],
+    ) -> list[RunningResult]:
+        """Runs the scripts of the candidates numbered `indices` out of `num_candidates`, starting from 1."""
+        max_workers = self.max_workers or os.cpu_count() or 1
+        semaphore = asyncio.Semaphore(max_workers)
+        memory_limit = _get_available_memory() if self.memory_limit is None else self.memory_limit
+        memory_budget = _MemoryBudget(memory_limit) if memory_limit else None
+
+        self.timeout_report = None
+        timeout_policy = None
+        timeouts: list[Optional[float]] = [None] * num_candidates
+        if deadline is not None:
+            timeout_policy = AdaptiveTimeout(max(deadline - time.monotonic(), 0.0), max_timeout=initial_timeout)
+            timeout_policy.start(len(script_paths), max_workers)
+
+        fork_server_lock = asyncio.Lock()
+        fork_server: list[Optional[_ForkServer]] = []
+
+        async def _get_fork_server() -> Optional[_ForkServer]:
+            """Starts the fork server when the first script is run."""
+            if not self.fork_server or len(scripts) < 2:
+                return None
+            async with fork_server_lock:
+                if not fork_server:
+                    prefix = _common_prefix(scripts)
+                    server = None
+                    if prefix.strip():
+                        server = await _ForkServer.start(prefix, script_paths[0], str(output_dir), initial_timeout)
+                    fork_server.append(server)
+            return fork_server[0]
+
+        async def _lookup_cache(script: str) -> tuple[Optional[str], Optional[RunningResult]]:
+            """Returns the key of the script in the result cache and the result cached for it if any."""
+            if self.result_cache is None:
+                return None, None
+            cache_key = await asyncio.to_thread(self.result_cache.get_key, script, output_dir)
+            return cache_key, await asyncio.to_thread(self.result_cache.get, cache_key, output_dir)
+
+        async def _execute_script(
+            index: int, script_path: str, cache_key: Optional[str], running_result: Optional[RunningResult]
+        ) -> RunningResult:
+            if running_result is not None and (initial_timeout <= 0 or running_result.time <= initial_timeout):
+                logger.info(f"Using the cached result of script ({index}/{num_candidates}).")
+                if timeout_policy is not None:
+                    timeout_policy.skip()
+                    timeout_policy.record(running_result)
+                return running_result
+
+            reservation = memory_budget.reserve() if memory_budget is not None else contextlib.nullcontext()
+            async with semaphore, reservation as memory_slot:
+                if cancel is not None and cancel.is_triggered:
+                    return RunningResult(output="", error="Cancelled by user", returncode=-9, time=0)
+                timeout = initial_timeout
+                if timeout_policy is not None:
+                    timeout = timeout_policy.next_timeout()
+                    timeouts[index - 1] = timeout
+                    if timeout <= 0:
+                        logger.info(f"Skipping script ({index}/{num_candidates}) as the time budget has run out.")
+                        return RunningResult(output="", error="Timeout", returncode=-9, time=0)
+                logger.info(f"Running script ({index}/{num_candidates})...")
+                work_dir = None
+                if cache_key is not None:
+                    # The script runs in its own working directory, so that the files it creates are told apart
+                    # from those of the scripts running at the same time.
+                    work_dir = tempfile.mkdtemp(prefix=f".{index}_script.", dir=output_dir)
+                try:
+                    running_result = await _run(
+                        script_path,
+                        timeout,
+                        cancel,
+                        work_dir,
+                        memory_slot=memory_slot,
+                        worker_pool=self.worker_pool,
+                        fork_server=await _get_fork_server(),
+                    )
+                    if work_dir is not None:
+                        await asyncio.to_thread(self._store_result, cache_key, running_result, work_dir, output_dir)
+                finally:
+                    if work_dir is not None:
+                        shutil.rmtree(work_dir, ignore_errors=True)
+                if timeout_policy is not None:
+                    timeout_policy.record(running_result)
+
+            return running_result
+
+        # The results are looked up for all the scripts beforehand, so that the scripts not cached wait for the workers
+        # in the order of the candidates instead of that of the lookups completed.
+        cached_results = await asyncio.gather(*[_lookup_cache(script) for script in scripts])
+        try:
+            running_results = await asyncio.gather(
+                *[
+                    _execute_script(index, script_path, cache_key, running_result)
+                    for index, script_path, (cache_key, running_result) in zip(indices, script_paths, cached_results)
+                ]
+            )
+        finally:
+            if fork_server and fork_server[0] is not None:
+                await fork_server[0].close()
+
+        if timeout_policy is not None:
+            elapsed = timeout_policy.elapsed()
+            self.timeout_report = TimeoutReport(
+                time_budget=timeout_policy.time_budget,
+                elapsed=elapsed,
+                saved=max(timeout_policy.time_budget - elapsed, 0.0),
+                timeouts=timeouts,
+                cut_off=[
+                    index
+                    for index, result in zip(indices, running_results)
+                    if result.returncode == -9 and result.error == "Timeout"
+                ],
+            )
+        return running_results
+
+    def _store_result(self, key: str, result: RunningResult, work_dir: str, output_dir: Path):
+        """Caches the result of a successful script with the files it created in `work_dir`.
+
+        The files are moved to `output_dir` afterwards whether the script succeeded or not.
+        """
+        artifacts = list(snapshot_files(work_dir))
+        if result.returncode == 0:
+            self.result_cache.put(key, result, work_dir, artifacts)
+        for artifact in artifacts:
+            destination = output_dir / artifact
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(os.path.join(work_dir, artifact), destination)
+
+    async def _race(
+        self,
+        pipeline_list: list[Code],
+        script_paths: list[str],
+        initial_timeout: int,
+        output_dir: Path,
+        cancel: Optional[CancellationToken],
+        deadline: Optional[float],
+    ) -> list[RunningResult]:
+        """Runs the pipelines by successive halving, and only the survivors on the full data."""
+        racing = self.racing
+        rungs: list[list[RungResult]] = [[] for _ in pipeline_list]
+        eliminated: dict[int, RunningResult] = {}
+        # Candidates whose training data cannot be subsampled skip the racing.
+        survivors = [i for i, pipeline in enumerate(pipeline_list) if racing.can_subsample(pipeline.validation)]
+
+        rung_paths: list[Path] = []
+        try:
+            for rung, fraction in enumerate(racing.fractions, start=1):
+                if len(survivors) <= 1:
+                    break
+                logger.info(
+                    f"Racing rung {rung}: running {len(survivors)} pipelines on {fraction:.0%} of the training data..."
+                )
+                scripts = [racing.subsample(pipeline_list[i].validation, fraction) for i in survivors]
+                paths = []
+                for i, script in zip(survivors, scripts):
+                    path = output_dir / f"{i + 1}_script_rung{rung}.py"
+                    path.write_text(script, encoding="utf-8")
+                    rung_paths.append(path)
+                    paths.append(path.absolute().as_posix())
+                results = await self._execute(
+                    [i + 1 for i in survivors],
+                    len(pipeline_list),
+                    scripts,
+                    paths,
+                    initial_timeout,
+                    output_dir,
+                    cancel,
+                    deadline,
+                )
+
+                scores = {}
+                failed = {}
+                for i, result in zip(survivors, results):
+                    score = parse_score(result.output) if result.returncode == 0 else None
+                    rungs[i].append(
+                        RungResult(fraction=fraction, score=score, returncode=result.returncode, time=result.time)
+                    )
+                    if score is not None:
+                        scores[i] = score
+                    else:
+                        failed[i] = result
+                if not scores:
+                    # Nothing can be compared, e.g., the subsample is too small for all the pipelines.
+                    break
+                eliminated.update(failed)
+                promoted = racing.select(scores)
+                for i in scores:
+                    if i not in promoted:
+                        eliminated[i] = RunningResult(
+                            output="",
+                            error=f"Eliminated by racing at rung {rung}",
+                            returncode=-9,
+                            time=0,
+                            eliminated=True,
+                        )
+                survivors = [i for i in survivors if i not in eliminated]
+        finally:
+            for path in rung_paths:
+                path.unlink(missing_ok=True)
+
+        finalists = [i for i in range(len(pipeline_list)) if i not in eliminated]
+        results = await self._execute(
+            [i + 1 for i in finalists],
+            len(pipeline_list),
+            [pipeline_list[i].validation for i in finalists],
+            [script_paths[i] for i in finalists],
+            initial_timeout,
+            output_dir,
+            cancel,
+            deadline,
+        )
+        final_results = dict(zip(finalists, results))
+
+        running_results = []
+        for i in range(len(pipeline_list)):
+            result = final_results.get(i) or eliminated[i]
+            if i in eliminated:
+                result = result.model_copy(update={"time": sum(r.time for r in rungs[i])})
+            running_results.append(result.model_copy(update={"rungs": rungs[i]}))
+        return running_results
@@ -12,21 +12,30 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import contextlib
+import copy
 import glob
 import pickle
 import sys
+import threading
+import time
 
 # from msilib.schema import Error
+from os import PathLike
 from pathlib import Path
 from shutil import copyfile
-from typing import Literal, Optional, Union
+from typing import Iterable, Iterator, Literal, Optional, Union
 
 import pandas as pd
+from sapientml.bundle import is_bundle
+from sapientml.cache import ResultCache
+from sapientml.executor import SuccessiveHalving, WorkerPool, executor_options
 from sapientml.model import GeneratedModel
 from sapientml.suggestion import SapientMLSuggestion
 
-from .macros import Metric
-from .params import Dataset, Task
+from .macros import Metric, metric_lower_is_better
+from .params import CancellationToken, Dataset, Task, _get_datasets_format
 from .util.logging import setup_logger
 
 if sys.version_info.minor <= 9:
@@ -37,6 +46,15 @@ else:
 logger = setup_logger()
 
 DEFAULT_OUTPUT_DIR = "./outputs"
+# Ratio of the time budget of fit() left for the final training
+FINAL_TRAINING_BUDGET_RATIO = 0.2
+
+
+def _concat_dataframes(training_dataframe: pd.DataFrame, validation_dataframe: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """Returns the data for the final training, which is a new dataframe only when validation data is given."""
+    if validation_dataframe is None:
+        return training_dataframe
+    return pd.concat([training_dataframe, validation_dataframe])
 
 
 def _check_stratification(
@@ -172,12 +190,14 @@ class SapientML:
         """
         The factory method of SapientML from a pretrained model built by source code previously generated by SapientML.
 
-        `model` must be either pickle filename, pickle bytes-like object, or deserialized object
+        `model` must be either pickle filename, pickle bytes-like object, deserialized object,
+        or filename of a bundle written by `GeneratedModel.save_bundle()`.
+        A bundle is opened without reading the trained pipeline objects, which are read when they are used.
 
 
         Parameters
         ----------
-        model: str, bytes-like object, or GeneratedModel
+        model: str, PathLike, bytes-like object, or GeneratedModel
             A pretrained model built by source code previously generated by SapientML.
 
         Returns
@@ -188,8 +208,10 @@ class SapientML:
         try:
             if isinstance(model, GeneratedModel):
                 pass
+            elif isinstance(model, (str, PathLike)) and is_bundle(model):
+                model = GeneratedModel.load_bundle(model)
             else:
-                if isinstance(model, str):
+                if isinstance(model, (str, PathLike)):
                     with open(model, "rb") as f:
                         model = pickle.load(f)
                 else:
@@ -198,7 +220,7 @@ class SapientML:
                     raise RuntimeError("model is not an instance of GeneratedModel")
         except Exception as e:
             raise ValueError(
-                "model must be either pickle filename, pickle bytes-like object, or deserialized object"
+                "model must be either pickle or bundle filename, pickle bytes-like object, or deserialized object"
             ) from e
         sml = SapientML(**model.params)
         sml.model = model
@@ -209,12 +231,22 @@ class SapientML:
         training_data: Union[pd.DataFrame, str],
         validation_data: Optional[Union[pd.DataFrame, str]] = None,
         test_data: Optional[Union[pd.DataFrame, str]] = None,
-        save_datasets_format: Literal["csv", "pickle"] = "pickle",
+        save_datasets_format: Optional[Literal["csv", "pickle", "feather", "parquet"]] = None,
         csv_encoding: Literal["UTF-8", "SJIS"] = "UTF-8",
         csv_delimiter: str = ",",
         ignore_columns: Optional[list[str]] = None,
         output_dir: str = DEFAULT_OUTPUT_DIR,
         codegen_only: bool = False,
+        time_budget: Optional[float] = None,
+        racing: Union[bool, SuccessiveHalving] = False,
+        copy_data: bool = True,
+        compact_dtypes: bool = False,
+        validation_level: Literal["sampled", "exhaustive"] = "sampled",
+        result_cache: Union[bool, ResultCache] = True,
+        max_workers: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        worker_pool: Optional[WorkerPool] = None,
+        fork_server: bool = False,
     ):
         """
         Generate ML scripts for input data.
@@ -232,9 +264,12 @@ class SapientML:
             Test dataframes.
             When str, they are regarded as file paths.
             When None, test data is extracted from training data by split.
-        save_datasets_format: 'csv' or 'pickle'
-            Data format when the input dataframes are written to files.
-            Ignored when all inputs are specified as file path.
+        save_datasets_format: 'csv', 'pickle', 'feather', 'parquet' or None
+            Data format when the input dataframes are written to files,
+            which is also the format of the training and test data read by the final scripts.
+            'feather' writes uncompressed Arrow IPC files, which the generated scripts read by memory-mapping.
+            'feather' and 'parquet' require pyarrow.
+            When None, the format of `training_data` is used if it is a file path, and 'pickle' otherwise.
         csv_encoding: 'UTF-8' or 'SJIS'
             Encoding method when csv files are involved.
             Ignored when only pickle files are involved.
@@ -246,15 +281,356 @@ class SapientML:
             Output directory.
         codegen_only: bool
             Do not conduct fit() of GeneratedModel if True.
+        time_budget: float, optional
+            Time budget in seconds for the whole fit, i.e., generating and evaluating the candidate scripts
+            and the final training.
+            The timeouts of the candidates are decided from the remaining budget,
+            and the candidates not started before the budget runs out are skipped.
+            The best candidate completed in time is used for the final training,
+            for which `FINAL_TRAINING_BUDGET_RATIO` of the budget is reserved.
+            The final training is still run if the budget has run out before it,
+            and if it is cut off at the end of the budget, the generated scripts are kept with a warning.
+            When None, the time is not limited except for the timeouts of each script.
+        racing: bool or SuccessiveHalving
+            Race the candidate scripts on stratified subsamples of the training data by successive halving,
+            so that only the promising ones are run on the full data.
+            When True, SuccessiveHalving with the default settings is used.
+            The scores and the time of each rung are recorded in `rungs` of the results of the candidates.
+        copy_data: bool
+            Copy the input dataframes if True.
+            If False, the input dataframes are used without being copied and must not be modified during the fit.
+            Their columns are used as read-only views unless copy-on-write of pandas is enabled.
+        compact_dtypes: bool
+            Read the csv files specified as file path by chunks into compact dtypes if True.
+            The numeric columns are downcast as long as the values are kept, e.g., to int8 and float32,
+            and the candidate scripts read the files in the same dtypes.
+        validation_level: 'sampled' or 'exhaustive'
+            How thoroughly the values of the input data are validated.
+            When 'sampled', the types of the values are inspected in the rows sampled at random,
+            and only the columns found suspicious in them are inspected in all the rows.
+            When 'exhaustive', all the rows are inspected for every column.
+        result_cache: bool or ResultCache
+            Cache of the results of the candidate scripts.
+            A candidate whose script, data files and libraries are the same as in a previous fit is not executed again.
+            When True, the default ResultCache under `sapientml.cache.get_cache_dir()` is used
+            unless the environment variable SAPIENTML_DISABLE_RESULT_CACHE is set to a non-empty value.
+            When False, the results are not cached.
+        max_workers: int, optional
+            Maximum number of candidate scripts executed at the same time.
+            When None, the number of CPU cores is used.
+        memory_limit: int, optional
+            Memory budget in bytes shared by the candidate scripts running at the same time.
+            A candidate is started only when its memory estimated from the finished ones fits in the budget.
+            When None, the physical memory available when the candidates start is used.
+            0 means memory usage is not limited.
+        worker_pool: WorkerPool, optional
+            Pool of pre-warmed interpreters to execute the candidate scripts and the scripts of the model,
+            which is supported only on platforms with `os.fork()`.
+            The pool is not closed by this method.
+            When None, each script is executed in a new interpreter.
+        fork_server: bool
+            Run the candidate scripts in the fork server if True, which is supported only on platforms with `os.fork()`.
+            The statements common to all the candidates, e.g., loading the dataset, are run only once,
+            and each candidate runs the rest of its script in a forked child sharing the loaded data.
 
         Returns
         -------
         self: SapientML
             SapientML object itself.
+
+        Notes
+        -----
+        The peak memory of each stage in addition to the input dataframes of the size D is as follows,
+        excluding the candidate scripts and the final training script, which run in other processes.
+
+        1. Loading: D for copying the input dataframes, or almost none if `copy_data` is False.
+           They are written to files without copying the whole dataframes.
+        2. Generating the scripts: D for the preprocessed dataframe created by the generator.
+           The input dataframes are restored after the generation without reading the files.
+        3. Final training: D for concatenating training and validation dataframes if `validation_data` is given,
+           or none otherwise, until the data is written to a file for the script.
+        """
+        deadline, execution_deadline = self._get_deadlines(time_budget, codegen_only)
+
+        training_dataframe, validation_dataframe = self._generate_model(
+            training_data,
+            validation_data,
+            test_data,
+            save_datasets_format,
+            csv_encoding,
+            csv_delimiter,
+            ignore_columns,
+            output_dir,
+            execution_deadline,
+            racing,
+            copy_data,
+            compact_dtypes,
+            validation_level,
+            result_cache,
+            max_workers,
+            memory_limit,
+            worker_pool,
+            fork_server,
+        )
+
+        if not codegen_only:
+            with self._final_training(deadline) as timeout:
+                self.model.fit(_concat_dataframes(training_dataframe, validation_dataframe), timeout=timeout)
+
+        logger.info("Done.")
+
+        return self
+
+    async def fit_async(
+        self,
+        training_data: Union[pd.DataFrame, str],
+        validation_data: Optional[Union[pd.DataFrame, str]] = None,
+        test_data: Optional[Union[pd.DataFrame, str]] = None,
+        save_datasets_format: Optional[Literal["csv", "pickle", "feather", "parquet"]] = None,
+        csv_encoding: Literal["UTF-8", "SJIS"] = "UTF-8",
+        csv_delimiter: str = ",",
+        ignore_columns: Optional[list[str]] = None,
+        output_dir: str = DEFAULT_OUTPUT_DIR,
+        codegen_only: bool = False,
+        time_budget: Optional[float] = None,
+        racing: Union[bool, SuccessiveHalving] = False,
+        copy_data: bool = True,
+        compact_dtypes: bool = False,
+        validation_level: Literal["sampled", "exhaustive"] = "sampled",
+        result_cache: Union[bool, ResultCache] = True,
+        max_workers: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        worker_pool: Optional[WorkerPool] = None,
+        fork_server: bool = False,
+    ):
+        """
+        Coroutine version of `fit()`, which runs on the caller's event loop.
+
+        Generating and evaluating the candidate scripts is executed in another thread,
+        and the final training is executed as a coroutine.
+
+        Parameters
+        ----------
+        training_data: pandas.DataFrame or str
+            Training dataframe.
+            When str, this is regarded as a file path.
+        validation_data: pandas.DataFrame, str or None
+            Validation dataframe.
+            When str, this is regarded as file paths.
+            When None, validation data is extracted from training data by split.
+        test_data: pandas.DataFrame, str, or None
+            Test dataframes.
+            When str, they are regarded as file paths.
+            When None, test data is extracted from training data by split.
+        save_datasets_format: 'csv', 'pickle', 'feather', 'parquet' or None
+            Data format when the input dataframes are written to files,
+            which is also the format of the training and test data read by the final scripts.
+            'feather' writes uncompressed Arrow IPC files, which the generated scripts read by memory-mapping.
+            'feather' and 'parquet' require pyarrow.
+            When None, the format of `training_data` is used if it is a file path, and 'pickle' otherwise.
+        csv_encoding: 'UTF-8' or 'SJIS'
+            Encoding method when csv files are involved.
+            Ignored when only pickle files are involved.
+        csv_delimiter: str
+            Delimiter to read csv files.
+        ignore_columns: list[str]
+            Column names which must not be used and must be dropped.
+        output_dir: str
+            Output directory.
+        codegen_only: bool
+            Do not conduct fit() of GeneratedModel if True.
+        time_budget: float, optional
+            Time budget in seconds for the whole fit, i.e., generating and evaluating the candidate scripts
+            and the final training.
+            The timeouts of the candidates are decided from the remaining budget,
+            and the candidates not started before the budget runs out are skipped.
+            The best candidate completed in time is used for the final training,
+            for which `FINAL_TRAINING_BUDGET_RATIO` of the budget is reserved.
+            The final training is still run if the budget has run out before it,
+            and if it is cut off at the end of the budget, the generated scripts are kept with a warning.
+            When None, the time is not limited except for the timeouts of each script.
+        racing: bool or SuccessiveHalving
+            Race the candidate scripts on stratified subsamples of the training data by successive halving,
+            so that only the promising ones are run on the full data.
+            When True, SuccessiveHalving with the default settings is used.
+            The scores and the time of each rung are recorded in `rungs` of the results of the candidates.
+        copy_data: bool
+            Copy the input dataframes if True.
+            If False, the input dataframes are used without being copied and must not be modified during the fit.
+            Their columns are used as read-only views unless copy-on-write of pandas is enabled.
+        compact_dtypes: bool
+            Read the csv files specified as file path by chunks into compact dtypes if True.
+            The numeric columns are downcast as long as the values are kept, e.g., to int8 and float32,
+            and the candidate scripts read the files in the same dtypes.
+        validation_level: 'sampled' or 'exhaustive'
+            How thoroughly the values of the input data are validated.
+            When 'sampled', the types of the values are inspected in the rows sampled at random,
+            and only the columns found suspicious in them are inspected in all the rows.
+            When 'exhaustive', all the rows are inspected for every column.
+        result_cache: bool or ResultCache
+            Cache of the results of the candidate scripts.
+            A candidate whose script, data files and libraries are the same as in a previous fit is not executed again.
+            When True, the default ResultCache under `sapientml.cache.get_cache_dir()` is used
+            unless the environment variable SAPIENTML_DISABLE_RESULT_CACHE is set to a non-empty value.
+            When False, the results are not cached.
+        max_workers: int, optional
+            Maximum number of candidate scripts executed at the same time.
+            When None, the number of CPU cores is used.
+        memory_limit: int, optional
+            Memory budget in bytes shared by the candidate scripts running at the same time.
+            A candidate is started only when its memory estimated from the finished ones fits in the budget.
+            When None, the physical memory available when the candidates start is used.
+            0 means memory usage is not limited.
+        worker_pool: WorkerPool, optional
+            Pool of pre-warmed interpreters to execute the candidate scripts and the scripts of the model,
+            which is supported only on platforms with `os.fork()`.
+            The pool is not closed by this method.
+            When None, each script is executed in a new interpreter.
+        fork_server: bool
+            Run the candidate scripts in the fork server if True, which is supported only on platforms with `os.fork()`.
+            The statements common to all the candidates, e.g., loading the dataset, are run only once,
+            and each candidate runs the rest of its script in a forked child sharing the loaded data.
+
+        Returns
+        -------
+        self: SapientML
+            SapientML object itself.
+        """
+        deadline, execution_deadline = self._get_deadlines(time_budget, codegen_only)
+
+        training_dataframe, validation_dataframe = await asyncio.to_thread(
+            self._generate_model,
+            training_data,
+            validation_data,
+            test_data,
+            save_datasets_format,
+            csv_encoding,
+            csv_delimiter,
+            ignore_columns,
+            output_dir,
+            execution_deadline,
+            racing,
+            copy_data,
+            compact_dtypes,
+            validation_level,
+            result_cache,
+            max_workers,
+            memory_limit,
+            worker_pool,
+            fork_server,
+        )
+
+        if not codegen_only:
+            with self._final_training(deadline) as timeout:
+                await self.model.fit_async(
+                    _concat_dataframes(training_dataframe, validation_dataframe), timeout=timeout
+                )
+
+        logger.info("Done.")
+
+        return self
+
+    @staticmethod
+    def _get_deadlines(time_budget: Optional[float], codegen_only: bool) -> tuple[Optional[float], Optional[float]]:
+        """Returns the deadlines of the whole fit and of the candidate scripts."""
+        if time_budget is None:
+            return None, None
+        deadline = time.monotonic() + time_budget
+        if codegen_only:
+            return deadline, deadline
+        return deadline, deadline - time_budget * FINAL_TRAINING_BUDGET_RATIO
+
+    @contextlib.contextmanager
+    def _final_training(self, deadline: Optional[float]) -> Iterator[Optional[float]]:
+        """Yields the timeout of the final training of the best candidate within the time budget.
+
+        The best candidate is trained even if the budget has already run out, with the timeout of the model.
+        If the training is cut off at the deadline, the generated scripts are kept with a warning instead of failing,
+        and the model can be trained later by `model.fit()`.
         """
+        if deadline is None:
+            yield None
+            return
+        time_left = deadline - time.monotonic()
+        if time_left <= 0:
+            logger.warning(
+                "The time budget has run out before the final training. "
+                "Training the best candidate completed so far beyond the time budget."
+            )
+            yield None
+            return
+        if 0 < self.config.timeout_for_test < time_left:
+            yield self.config.timeout_for_test
+            return
+        try:
+            yield time_left
+        except RuntimeError as e:
+            if time.monotonic() < deadline:
+                raise
+            logger.warning(
+                f"The final training was cut off as the time budget has run out: {e} "
+                f"The generated scripts are kept in {self.output_dir}, and the model can be trained by model.fit()."
+            )
 
+    @contextlib.contextmanager
+    def _cancel_at(self, deadline: Optional[float]):
+        """Replaces `config.cancel` with a token which is triggered also at the deadline."""
+        if deadline is None:
+            yield
+            return
+
+        original_cancel = self.config.cancel
+        cancel = CancellationToken(is_triggered=original_cancel is not None and original_cancel.is_triggered)
+
+        def _trigger():
+            if not cancel.is_triggered:
+                logger.warning("The time budget has run out. Finalizing the best candidate completed so far.")
+                cancel.is_triggered = True
+
+        timer = threading.Timer(max(deadline - time.monotonic(), 0.0), _trigger)
+        timer.daemon = True
+        if original_cancel is not None:
+            original_cancel.add_callback(_trigger)
+        self.config.cancel = cancel
+        timer.start()
+        try:
+            yield
+        finally:
+            timer.cancel()
+            if original_cancel is not None:
+                original_cancel.remove_callback(_trigger)
+            self.config.cancel = original_cancel
+
+    def _generate_model(
+        self,
+        training_data: Union[pd.DataFrame, str],
+        validation_data: Optional[Union[pd.DataFrame, str]],
+        test_data: Optional[Union[pd.DataFrame, str]],
+        save_datasets_format: Optional[Literal["csv", "pickle", "feather", "parquet"]],
+        csv_encoding: Literal["UTF-8", "SJIS"],
+        csv_delimiter: str,
+        ignore_columns: Optional[list[str]],
+        output_dir: str,
+        deadline: Optional[float] = None,
+        racing: Union[bool, SuccessiveHalving] = False,
+        copy_data: bool = True,
+        compact_dtypes: bool = False,
+        validation_level: Literal["sampled", "exhaustive"] = "sampled",
+        result_cache: Union[bool, ResultCache] = True,
+        max_workers: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        worker_pool: Optional[WorkerPool] = None,
+        fork_server: bool = False,
+    ) -> tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+        """Generates the scripts and returns the training and validation dataframes for the final training.
+
+        The candidate scripts are stopped at `deadline`, a value of time.monotonic(), if specified.
+        """
         if ignore_columns is None:
             ignore_columns = []
+        if save_datasets_format is None:
+            # By default, the final scripts read the training and test data in the format of the training data file.
+            save_datasets_format = _get_datasets_format(training_data) if isinstance(training_data, str) else "pickle"
 
         logger.info("Loading dataset...")
 
@@ -280,6 +656,9 @@ class SapientML:
             save_datasets_format=save_datasets_format,
             ignore_columns=ignore_columns,
             output_dir=self.output_dir,
+            copy_data=copy_data,
+            compact_dtypes=compact_dtypes,
+            validation_level=validation_level,
         )
 
         if self.task.task_type is None:
@@ -337,9 +716,33 @@ class SapientML:
         elif self.task.task_type == "classification" and self.task.split_stratification:
             raise ValueError("Stratification for multiple target columns is not supported.")
 
-        self.generator.generate_pipeline(self.dataset, self.task)
-        self.dataset.reload()
-        self.generator.save(self.output_dir)
+        if racing is True:
+            racing = SuccessiveHalving()
+        if racing and racing.lower_is_better is None:
+            racing = copy.copy(racing)
+            racing.lower_is_better = self.task.adaptation_metric in metric_lower_is_better
+
+        # ExitStack instead of a parenthesized with statement, which requires Python 3.10
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(self._cancel_at(deadline))
+            stack.enter_context(
+                executor_options(
+                    deadline=deadline,
+                    racing=racing or None,
+                    save_datasets_format=save_datasets_format,
+                    csv_dtypes=self.dataset.csv_dtypes,
+                    csv_encoding=csv_encoding,
+                    csv_delimiter=csv_delimiter,
+                    result_cache=result_cache,
+                    max_workers=max_workers,
+                    memory_limit=memory_limit,
+                    worker_pool=worker_pool,
+                    fork_server=fork_server,
+                )
+            )
+            self.generator.generate_pipeline(self.dataset, self.task)
+            self.dataset.reload()
+            self.generator.save(self.output_dir)
 
         self.params = {"model_type": self.model_type}
         self.params.update(self.task.model_dump())
@@ -354,18 +757,15 @@ class SapientML:
             csv_delimiter=csv_delimiter,
             timeout=self.config.timeout_for_test,
             params=self.params,
+            worker_pool=worker_pool,
         )
 
-        if not codegen_only:
-            self.model.fit(pd.concat([training_dataframe, validation_dataframe]))
-
-        logger.info("Done.")
-
-        return self
+        return training_dataframe, validation_dataframe
 
     def predict(
         self,
         test_data: pd.DataFrame,
+        n_jobs: Optional[int] = None,
     ):
         """
         Predicts the output of the test_data.
@@ -374,12 +774,97 @@ class SapientML:
         ---------
         test_data: pd.DataFrame
             Dataframe used for predicting the result.
+        n_jobs: int, optional
+            Number of processes to predict in parallel. -1 means the number of CPUs.
+            The rows are split into shards, which are scored in parallel and put together in the original order.
 
         Returns
         -------
         result : pd.DataFrame
-            It returns the prediction_result.csv result in dataframe format.
+            It returns the prediction result in dataframe format.
+
+        """
+        logger.info("Predicting by built model...")
+        return self.model.predict(test_data, n_jobs)
+
+    async def predict_async(
+        self,
+        test_data: pd.DataFrame,
+        n_jobs: Optional[int] = None,
+    ):
+        """
+        Coroutine version of `predict()`, which runs on the caller's event loop.
+
+        Parameters
+        ---------
+        test_data: pd.DataFrame
+            Dataframe used for predicting the result.
+        n_jobs: int, optional
+            Number of processes to predict in parallel. -1 means the number of CPUs.
+            The rows are split into shards, which are scored in parallel and put together in the original order.
+
+        Returns
+        -------
+        result : pd.DataFrame
+            It returns the prediction result in dataframe format.
+
+        """
+        logger.info("Predicting by built model...")
+        return await self.model.predict_async(test_data, n_jobs)
+
+    def predict_iter(
+        self,
+        test_data: Union[Iterable[pd.DataFrame], str, PathLike],
+        batch_size: int = 100_000,
+        n_jobs: Optional[int] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Predicts the output of a large test data by batches of at most `batch_size` rows.
+
+        Parameters
+        ---------
+        test_data: iterable of pd.DataFrame, str or Path-like object
+            Chunks of the test data, or the path of a csv or pickle file.
+        batch_size: int
+            Maximum number of rows of a batch.
+        n_jobs: int, optional
+            Number of processes to predict each batch in parallel.
+
+        Yields
+        ------
+        result : pd.DataFrame
+            The prediction of each batch in the same format as `predict()`.
+
+        """
+        logger.info("Predicting by built model...")
+        return self.model.predict_iter(test_data, batch_size, n_jobs)
+
+    def predict_file(
+        self,
+        test_data: Union[Iterable[pd.DataFrame], str, PathLike],
+        output_path: PathLike,
+        batch_size: int = 100_000,
+        n_jobs: Optional[int] = None,
+    ) -> int:
+        """
+        Predicts the output of a large test data by batches, and writes the predictions to a csv file.
+
+        Parameters
+        ---------
+        test_data: iterable of pd.DataFrame, str or Path-like object
+            Chunks of the test data, or the path of a csv or pickle file.
+        output_path: Path-like object
+            Path of the csv file to write the predictions in the same format as prediction_result.csv.
+        batch_size: int
+            Maximum number of rows of a batch.
+        n_jobs: int, optional
+            Number of processes to predict each batch in parallel.
+
+        Returns
+        -------
+        num_rows : int
+            Number of rows of the predictions.
 
         """
         logger.info("Predicting by built model...")
-        return self.model.predict(test_data)
+        return self.model.predict_file(test_data, output_path, batch_size, n_jobs)
@@ -12,15 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import concurrent.futures
+import copyreg
+import os
+import pickle
 import tempfile
 from os import PathLike
 from pathlib import Path
-from typing import Literal, Optional, Union
+from typing import Iterable, Iterator, Literal, Optional, Union
 
+import numpy as np
 import pandas as pd
 
-from .executor import run
-from .params import save_file
+from .bundle import ModelBundle, write_bundle
+from .cache import ExtractionCache, hash_bytes
+from .executor import WorkerPool, run, run_async
+from .params import DATASETS_FORMAT_EXTENSIONS, RunningResult, _read_file_chunks, save_file
+from .predictor import InProcessPredictor, PredictionWorker, read_prediction, rewrite_prediction_output
+from .refit import MODEL_FILE, WARM_START_MARKER, DataProfile, RefitResult, rewrite_training_script
 from .util.logging import setup_logger
 
 logger = setup_logger()
@@ -30,11 +40,15 @@ class GeneratedModel:
     def __init__(
         self,
         input_dir: PathLike,
-        save_datasets_format: Literal["csv", "pickle"],
+        save_datasets_format: Literal["csv", "pickle", "feather", "parquet"],
         timeout: int,
         csv_encoding: Literal["UTF-8", "SJIS"],
         csv_delimiter: str,
         params: dict,
+        worker_pool: Optional[WorkerPool] = None,
+        prediction_mode: Literal["subprocess", "in_process", "worker"] = "subprocess",
+        prediction_worker_options: Optional[dict] = None,
+        extraction_cache: Union[ExtractionCache, bool] = False,
     ):
         """
         The constructor of GeneratedModel.
@@ -44,7 +58,7 @@ class GeneratedModel:
         ----------
         input_dir: PathLike
             Directory path containing training/prediction scripts and trained models.
-        save_datasets_format: 'csv' or 'pickle'
+        save_datasets_format: 'csv', 'pickle', 'feather' or 'parquet'
             Data format when the input dataframes are written to files.
             Ignored when all inputs are specified as file path.
         timeout: int
@@ -54,6 +68,30 @@ class GeneratedModel:
             Ignored when only pickle files are involved.
         csv_delimiter: str
             Delimiter to read csv files.
+        params: dict
+            Parameters of SapientML used to generate the model.
+        worker_pool: WorkerPool, optional
+            Pool of pre-warmed interpreters to execute training and prediction.
+            It is not pickled with the model.
+        prediction_mode: 'subprocess', 'in_process' or 'worker'
+            How `predict()` runs the prediction script.
+            'subprocess' writes the input to a temporary directory and runs the script in another process.
+            'in_process' loads the trained pipeline objects once, keeps them in memory,
+            and scores the input dataframe in the current process without touching the disk.
+            'worker' does the same in a long-lived subprocess, which receives the input through a pipe
+            and puts concurrent predictions together into micro-batches. See `PredictionWorker`.
+            'in_process' and 'worker' fall back to 'subprocess' if the script cannot be run in process.
+        prediction_worker_options: dict, optional
+            Keyword arguments of `PredictionWorker` such as `idle_timeout` and `max_batch_rows`,
+            used when `prediction_mode` is 'worker'.
+        extraction_cache: ExtractionCache or bool
+            Cache of the files of the model extracted for prediction.
+            The pickled pipeline objects are written to the cache once and hard-linked into the temporary directory
+            of each prediction, instead of being written every time, so that the prediction is not affected
+            when the cache entry is evicted. They are written as before when the cache is on another file system.
+            When True, the default ExtractionCache under `sapientml.cache.get_cache_dir()` is used unless
+            the environment variable SAPIENTML_DISABLE_EXTRACTION_CACHE is set to a non-empty value.
+            When False, which is the default, the files are written for each prediction.
         """
 
         self.files = dict()
@@ -62,6 +100,17 @@ class GeneratedModel:
         self.csv_encoding = csv_encoding
         self.csv_delimiter = csv_delimiter
         self.params = params
+        self.worker_pool = worker_pool
+        self.prediction_mode = prediction_mode
+        self.prediction_worker_options = prediction_worker_options or {}
+        self._predictor = None
+        self._shard_workers: Optional[list[PredictionWorker]] = []
+        self.extraction_cache = extraction_cache
+        # Digests of self.files, kept with the contents to detect changes
+        self._digests: dict[str, tuple[bytes, str]] = {}
+        # Distributions of the training data to detect drift in refit()
+        self.training_profile: Optional[DataProfile] = None
+        self.refit_result: Optional[RefitResult] = None
         input_dir = Path(input_dir)
         self._readfile(input_dir / "final_script.py", input_dir)
         self._readfile(input_dir / "final_train.py", input_dir)
@@ -75,7 +124,52 @@ class GeneratedModel:
                 continue
             self._readfile(filepath, input_dir)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["worker_pool"] = None
+        state["_predictor"] = None
+        state["_shard_workers"] = []
+        state["_digests"] = {}
+        return state
+
+    def __reduce_ex__(self, protocol):
+        state = self.__getstate__()
+        if protocol < 5:
+            # Memoryviews of out-of-band buffers cannot be pickled in-band, so they are copied into bytes.
+            state["files"] = {
+                name: bytes(content) if isinstance(content, memoryview) else content
+                for name, content in self.files.items()
+            }
+            return (copyreg.__newobj__, (type(self),), state)
+        # Pass the trained pipeline objects as pickle buffers, so that they are not copied into the pickle
+        # when the pickler takes them out-of-band by `buffer_callback`.
+        state["files"] = {
+            name: content if name.endswith(".py") else pickle.PickleBuffer(content)
+            for name, content in self.files.items()
+        }
+        return (copyreg.__newobj__, (type(self),), state)
+
+    def __setstate__(self, state):
+        if not isinstance(state["files"], ModelBundle):
+            # Out-of-band buffers are kept as memoryviews without copying them.
+            state["files"] = {
+                name: content if isinstance(content, (bytes, bytearray, memoryview)) else memoryview(content).cast("B")
+                for name, content in state["files"].items()
+            }
+        state.setdefault("worker_pool", None)
+        state.setdefault("prediction_mode", "subprocess")
+        state.setdefault("prediction_worker_options", {})
+        state.setdefault("extraction_cache", False)
+        state.setdefault("training_profile", None)
+        state.setdefault("refit_result", None)
+        state["_digests"] = {}
+        state["_predictor"] = None
+        state["_shard_workers"] = []
+        self.__dict__.update(state)
+
     def _readfile(self, filepath, input_dir):
+        if isinstance(self.files, ModelBundle):
+            self.files = dict(self.files)
         with open(filepath, "rb") as f:
             self.files[str(filepath.relative_to(input_dir))] = f.read()
 
@@ -100,7 +194,80 @@ class GeneratedModel:
             with open(output_dir / filename, "wb") as f:
                 f.write(content)
 
-    def fit(self, X: pd.DataFrame, y: Optional[Union[pd.DataFrame, pd.Series]] = None):
+    def save_bundle(self, path: PathLike):
+        """
+        Save the model to a single bundle file, which can be loaded lazily by `load_bundle()`.
+
+        Parameters
+        ----------
+        path: Path-like object
+            Path of the bundle file.
+
+        Returns
+        -------
+        self: GeneratedModel
+            GeneratedModel object itself
+        """
+        state = self.__getstate__()
+        del state["files"]
+        write_bundle(path, self.files, self._get_digests(), state)
+        return self
+
+    @staticmethod
+    def load_bundle(path: PathLike):
+        """
+        Load the model from a bundle file written by `save_bundle()`.
+
+        The bundle is memory-mapped, and only its index is read when it is loaded.
+        The scripts and the trained pipeline objects are read from the bundle when they are used,
+        so the bundle file must not be modified or removed while the model is used.
+
+        Parameters
+        ----------
+        path: Path-like object
+            Path of the bundle file.
+
+        Returns
+        -------
+        model: GeneratedModel
+            The model whose `files` is the ModelBundle.
+
+        Raises
+        ------
+        ValueError
+            If the file is not a model bundle.
+        """
+        bundle = ModelBundle(path)
+        model = GeneratedModel.__new__(GeneratedModel)
+        model.__setstate__({**bundle.state, "files": bundle})
+        return model
+
+    def _prepare_fit(self, X: pd.DataFrame, y: Optional[Union[pd.DataFrame, pd.Series]], temp_dir: Path) -> DataProfile:
+        if y is not None:
+            X = pd.concat([X, y], axis=1)
+        # The pickled pipeline objects are not needed since the training script creates them.
+        self._extract(temp_dir, artifacts=False)
+        filename = "training." + DATASETS_FORMAT_EXTENSIONS[self.save_datasets_format]
+        save_file(X, str(temp_dir / filename), self.csv_encoding, self.csv_delimiter)
+        return DataProfile.from_dataframe(X)
+
+    def _finish_fit(self, result: RunningResult, temp_dir: Path, profile: Optional[DataProfile] = None):
+        if result.returncode != 0:
+            raise RuntimeError(f"Training was failed due to the following Error: {result.error}")
+        for filepath in temp_dir.glob("**/*.pkl"):
+            if self.save_datasets_format == "pickle" and "training.pkl" == filepath.name:
+                continue
+            self._readfile(filepath, temp_dir)
+        self.training_profile = profile
+        # The pipeline objects kept in memory are outdated.
+        self.close()
+
+    def fit(
+        self,
+        X: pd.DataFrame,
+        y: Optional[Union[pd.DataFrame, pd.Series]] = None,
+        timeout: Optional[float] = None,
+    ):
         """
         Generate ML scripts for input data.
 
@@ -110,55 +277,439 @@ class GeneratedModel:
             Training dataframe. Contains target values if `y` is `None`.
         y: pandas.DataFrame or pandas.Series
             The target values.
+        timeout: float, optional
+            Timeout for the training in seconds, which overrides `timeout` of the model.
 
         Returns
         -------
         self: GeneratedModel
             GeneratedModel object itself
         """
-        if y is not None:
-            X = pd.concat([X, y], axis=1)
+        with tempfile.TemporaryDirectory() as temp_dir_path_str:
+            temp_dir = Path(temp_dir_path_str).absolute()
+            temp_dir.mkdir(exist_ok=True)
+            profile = self._prepare_fit(X, y, temp_dir)
+            logger.info("Building model by generated pipeline...")
+            result = run(
+                str(temp_dir / "final_train.py"),
+                self.timeout if timeout is None else timeout,
+                worker_pool=self.worker_pool,
+            )
+            self._finish_fit(result, temp_dir, profile)
+        return self
+
+    async def fit_async(
+        self,
+        X: pd.DataFrame,
+        y: Optional[Union[pd.DataFrame, pd.Series]] = None,
+        timeout: Optional[float] = None,
+    ):
+        """
+        Coroutine version of `fit()`, which runs on the caller's event loop.
+
+        Parameters
+        ----------
+        X: pandas.DataFrame
+            Training dataframe. Contains target values if `y` is `None`.
+        y: pandas.DataFrame or pandas.Series
+            The target values.
+        timeout: float, optional
+            Timeout for the training in seconds, which overrides `timeout` of the model.
 
+        Returns
+        -------
+        self: GeneratedModel
+            GeneratedModel object itself
+        """
         with tempfile.TemporaryDirectory() as temp_dir_path_str:
             temp_dir = Path(temp_dir_path_str).absolute()
             temp_dir.mkdir(exist_ok=True)
-            self.save(temp_dir)
-            filename = "training." + ("pkl" if self.save_datasets_format == "pickle" else "csv")
-            save_file(X, str(temp_dir / filename), self.csv_encoding, self.csv_delimiter)
+            profile = await asyncio.to_thread(self._prepare_fit, X, y, temp_dir)
             logger.info("Building model by generated pipeline...")
-            result = run(str(temp_dir / "final_train.py"), self.timeout)
-            if result.returncode != 0:
-                raise RuntimeError(f"Training was failed due to the following Error: {result.error}")
-            for filepath in temp_dir.glob("**/*.pkl"):
-                if self.save_datasets_format == "pickle" and "training.pkl" == filepath.name:
-                    continue
-                self._readfile(filepath, temp_dir)
+            result = await run_async(
+                str(temp_dir / "final_train.py"),
+                self.timeout if timeout is None else timeout,
+                worker_pool=self.worker_pool,
+            )
+            await asyncio.to_thread(self._finish_fit, result, temp_dir, profile)
+        return self
+
+    def refit(
+        self,
+        X: pd.DataFrame,
+        y: Optional[Union[pd.DataFrame, pd.Series]] = None,
+        timeout: Optional[float] = None,
+        drift_threshold: float = 0.2,
+        force: bool = False,
+    ):
+        """
+        Train the model again on the training data with appended rows, reusing what is still valid.
+
+        The drift of the appended rows from the training data is measured for each column.
+        If no column drifted, the model is kept as it is.
+        Otherwise, the training script is run on `X` with the fitted preprocessors whose columns did not drift,
+        and the estimator is warm-started if it supports `warm_start` and all the preprocessors are reused.
+        The decision is stored in `refit_result`.
+        The model is trained from scratch if it has no profile of its training data.
+
+        Parameters
+        ----------
+        X: pandas.DataFrame
+            The training data of the model followed by the appended rows. Contains target values if `y` is `None`.
+        y: pandas.DataFrame or pandas.Series
+            The target values.
+        timeout: float, optional
+            Timeout for the training in seconds, which overrides `timeout` of the model.
+        drift_threshold: float
+            A column drifted if its population stability index exceeds this. See `DataProfile.drift()`.
+        force: bool
+            Train the model again even if no column drifted.
+
+        Returns
+        -------
+        self: GeneratedModel
+            GeneratedModel object itself
+
+        Raises
+        ------
+        ValueError
+            If `X` has fewer rows than the training data of the model.
+        """
+        if y is not None:
+            X = pd.concat([X, y], axis=1)
+        reference = self.training_profile
+        if reference is None:
+            logger.warning("Training the model from scratch since the distributions of its training data are unknown.")
+            self.fit(X, timeout=timeout)
+            self.refit_result = RefitResult(retrained=True, drift={})
+            return self
+        if len(X) < reference.n_rows:
+            raise ValueError(f"X must contain the {reference.n_rows} rows of the training data and appended rows.")
+
+        drift = reference.drift(X.iloc[reference.n_rows :])
+        drifted = {name for name, value in drift.items() if value > drift_threshold}
+        if not drifted and not force:
+            logger.info("Skipped training since no column drifted.")
+            self.refit_result = RefitResult(retrained=False, drift=drift)
+            return self
+
+        source, reused, warm_start = rewrite_training_script(
+            self.files["final_train.py"].decode("utf-8"),
+            {name for name in self.files if not name.endswith(".py")},
+            set(drift),
+            drifted,
+            (len(X) - reference.n_rows) / max(reference.n_rows, 1),
+        )
+        with tempfile.TemporaryDirectory() as temp_dir_path_str:
+            temp_dir = Path(temp_dir_path_str).absolute()
+            profile = self._prepare_fit(X, None, temp_dir)
+            (temp_dir / "final_train.py").write_text(source, encoding="utf-8")
+            for filename in reused + ([MODEL_FILE] if warm_start else []):
+                (temp_dir / filename).write_bytes(self.files[filename])
+            logger.info(f"Building model by generated pipeline reusing {reused}...")
+            result = run(
+                str(temp_dir / "final_train.py"),
+                self.timeout if timeout is None else timeout,
+                worker_pool=self.worker_pool,
+            )
+            self._finish_fit(result, temp_dir, profile)
+        self.refit_result = RefitResult(
+            retrained=True, drift=drift, reused=reused, warm_started=WARM_START_MARKER in result.output
+        )
         return self
 
-    def predict(self, X: pd.DataFrame):
-        """Predicts the output of the test_data and store in the prediction_result.csv.
+    def _get_extraction_cache(self) -> Optional[ExtractionCache]:
+        if self.extraction_cache is True:
+            return None if os.environ.get("SAPIENTML_DISABLE_EXTRACTION_CACHE") else ExtractionCache()
+        return self.extraction_cache or None
+
+    def _get_digests(self) -> dict[str, str]:
+        if isinstance(self.files, ModelBundle):
+            return dict(self.files.digests)
+        digests = {}
+        for name, content in self.files.items():
+            cached = self._digests.get(name)
+            if cached is None or cached[0] is not content:
+                cached = (content, hash_bytes(content))
+            digests[name] = cached
+        self._digests = digests
+        return {name: digest for name, (_, digest) in digests.items()}
+
+    def _extract(self, temp_dir: Path, artifacts: bool = True):
+        """Writes the files of the model to run the scripts in temp_dir.
+
+        The scripts are written as regular files, and the other files are hard-linked to the extraction cache if any.
+        """
+        cache = self._get_extraction_cache() if artifacts else None
+        entry = None
+        if cache is not None:
+            digests = {name: digest for name, digest in self._get_digests().items() if not name.endswith(".py")}
+            entry = cache.extract(self.files, digests)
+        for filename, content in self.files.items():
+            is_script = filename.endswith(".py")
+            if not (is_script or artifacts):
+                continue
+            path = temp_dir / filename
+            path.parent.mkdir(exist_ok=True, parents=True)
+            if entry is not None and not is_script:
+                try:
+                    os.link(entry / filename, path)
+                    continue
+                except OSError:
+                    # The entry is on another file system or has been evicted.
+                    pass
+            path.write_bytes(content)
+
+    def _prepare_predict(self, X: pd.DataFrame, temp_dir: Path):
+        self._extract(temp_dir)
+        # Let the script write the prediction in the binary format if selected, to read it without parsing text.
+        source = self.files["final_predict.py"].decode("utf-8")
+        with open(temp_dir / "final_predict.py", "w", encoding="utf-8") as f:
+            f.write(rewrite_prediction_output(source, self.save_datasets_format))
+        filename = "test." + DATASETS_FORMAT_EXTENSIONS[self.save_datasets_format]
+        # Do not write through a link to the extraction cache.
+        (temp_dir / filename).unlink(missing_ok=True)
+        save_file(X, str(temp_dir / filename), self.csv_encoding, self.csv_delimiter)
+
+    def _read_prediction(self, result: RunningResult, temp_dir: Path) -> pd.DataFrame:
+        if result.returncode != 0:
+            raise RuntimeError(f"Prediction was failed due to the following Error: {result.error}")
+        return read_prediction(temp_dir, self.params.get("id_columns_for_prediction", []))
+
+    def _get_predictor(self) -> Optional[Union[InProcessPredictor, PredictionWorker]]:
+        if self.prediction_mode not in ("in_process", "worker"):
+            return None
+        if self._predictor is None:
+            id_columns_for_prediction = self.params.get("id_columns_for_prediction", [])
+            try:
+                if self.prediction_mode == "in_process":
+                    self._predictor = InProcessPredictor(self.files, self.csv_delimiter, id_columns_for_prediction)
+                else:
+                    predictor = PredictionWorker(
+                        self.files,
+                        self.csv_delimiter,
+                        id_columns_for_prediction,
+                        **{"timeout": self.timeout, **self.prediction_worker_options},
+                    )
+                    predictor.start()
+                    self._predictor = predictor
+            except (SyntaxError, ValueError) as e:
+                logger.warning(f"Prediction falls back to subprocess since it cannot be run in process: {e}")
+                self.prediction_mode = "subprocess"
+                return None
+        return self._predictor
+
+    def close(self):
+        """Releases the pipeline objects kept in memory and shuts down the prediction worker, if any.
+
+        They are loaded again by the next prediction.
+        """
+        predictor, self._predictor = self._predictor, None
+        if isinstance(predictor, PredictionWorker):
+            predictor.close()
+        shard_workers, self._shard_workers = self._shard_workers, []
+        for worker in shard_workers or []:
+            worker.close()
+
+    def _get_shard_workers(self, n_jobs: int) -> Optional[list[PredictionWorker]]:
+        if self._shard_workers is None:
+            return None
+        new_workers = [
+            PredictionWorker(
+                self.files,
+                self.csv_delimiter,
+                self.params.get("id_columns_for_prediction", []),
+                **{"timeout": self.timeout, **self.prediction_worker_options},
+            )
+            for _ in range(n_jobs - len(self._shard_workers))
+        ]
+        with concurrent.futures.ThreadPoolExecutor(max(len(new_workers), 1)) as executor:
+            futures = [executor.submit(worker.start) for worker in new_workers]
+        try:
+            for future in futures:
+                future.result()
+        except Exception as e:
+            for worker in new_workers:
+                worker.close()
+            if not isinstance(e, (SyntaxError, ValueError)):
+                raise
+            logger.warning(f"Shards are predicted by subprocesses since the script cannot be run in process: {e}")
+            self._shard_workers = None
+            return None
+        self._shard_workers.extend(new_workers)
+        return self._shard_workers[:n_jobs]
+
+    def _shift_index(self, result_df: pd.DataFrame, offset: int) -> pd.DataFrame:
+        # Without the id columns, the index of the prediction is the row numbers of the csv file
+        # written for each part of the data, so it is shifted to the row numbers in the whole data.
+        if offset and self.save_datasets_format == "csv" and not self.params.get("id_columns_for_prediction", []):
+            result_df.index = result_df.index + offset
+        return result_df
+
+    def _predict_sharded(self, X: pd.DataFrame, n_jobs: int) -> pd.DataFrame:
+        n_jobs = (os.cpu_count() or 1) if n_jobs < 0 else n_jobs
+        n_jobs = min(n_jobs, len(X))
+        if n_jobs <= 1:
+            return self.predict(X)
+        bounds = np.linspace(0, len(X), n_jobs + 1).astype(int)
+        shards = [X.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        logger.info(f"Predicting {len(X)} rows by {n_jobs} shards...")
+        workers = self._get_shard_workers(n_jobs)
+        if workers is not None:
+            futures = [worker.submit(shard) for worker, shard in zip(workers, shards)]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(n_jobs) as executor:
+                futures = [executor.submit(self._predict_by_subprocess, shard) for shard in shards]
+        return pd.concat([self._shift_index(future.result(), start) for future, start in zip(futures, bounds[:-1])])
+
+    def _predict_by_subprocess(self, X: pd.DataFrame) -> pd.DataFrame:
+        with tempfile.TemporaryDirectory() as temp_dir_path_str:
+            temp_dir = Path(temp_dir_path_str).absolute()
+            temp_dir.mkdir(exist_ok=True)
+            self._prepare_predict(X, temp_dir)
+            result = run(str(temp_dir / "final_predict.py"), self.timeout, worker_pool=self.worker_pool)
+            return self._read_prediction(result, temp_dir)
+
+    def predict(self, X: pd.DataFrame, n_jobs: Optional[int] = None):
+        """Predicts the output of the test_data.
 
         Parameters
         ---------
         X: pd.DataFrame
             Dataframe used for predicting the result.
+        n_jobs: int, optional
+            Number of processes to predict in parallel. -1 means the number of CPUs.
+            If it is more than 1, X is split into shards of rows, which are scored in parallel
+            by prediction workers loading the model once and kept for later predictions.
+            The predictions are put together in the original order and index.
 
         Returns
         -------
         result_df : pd.DataFrame
-            It returns the prediction_result.csv result in dataframe format.
+            It returns the prediction result in dataframe format.
+            The script writes it to prediction_result.pkl and its dtypes are kept
+            when `save_datasets_format` is a binary format, while it is read from prediction_result.csv
+            when 'csv'.
         """
+        if n_jobs is not None and n_jobs != 1:
+            return self._predict_sharded(X, n_jobs)
+        predictor = self._get_predictor()
+        if predictor is not None:
+            return predictor.predict(X)
+        return self._predict_by_subprocess(X)
+
+    async def predict_async(self, X: pd.DataFrame, n_jobs: Optional[int] = None):
+        """Coroutine version of `predict()`, which runs on the caller's event loop.
+
+        Parameters
+        ---------
+        X: pd.DataFrame
+            Dataframe used for predicting the result.
+        n_jobs: int, optional
+            Number of processes to predict in parallel. -1 means the number of CPUs.
+
+        Returns
+        -------
+        result_df : pd.DataFrame
+            It returns the prediction result in dataframe format.
+        """
+        if n_jobs is not None and n_jobs != 1:
+            return await asyncio.to_thread(self._predict_sharded, X, n_jobs)
+        predictor = await asyncio.to_thread(self._get_predictor)
+        if isinstance(predictor, PredictionWorker):
+            return await asyncio.wrap_future(predictor.submit(X))
+        if predictor is not None:
+            return await asyncio.to_thread(predictor.predict, X)
         with tempfile.TemporaryDirectory() as temp_dir_path_str:
             temp_dir = Path(temp_dir_path_str).absolute()
             temp_dir.mkdir(exist_ok=True)
-            self.save(temp_dir)
-            filename = "test." + ("pkl" if self.save_datasets_format == "pickle" else "csv")
-            save_file(X, str(temp_dir / filename), self.csv_encoding, self.csv_delimiter)
-            result = run(str(temp_dir / "final_predict.py"), self.timeout)
-            if result.returncode != 0:
-                raise RuntimeError(f"Prediction was failed due to the following Error: {result.error}")
-            id_columns_for_prediction = self.params.get("id_columns_for_prediction", [])
-            if not id_columns_for_prediction:
-                id_columns_for_prediction = [0]
-            result_df = pd.read_csv(temp_dir / "prediction_result.csv", index_col=id_columns_for_prediction)
-            return result_df
+            await asyncio.to_thread(self._prepare_predict, X, temp_dir)
+            result = await run_async(str(temp_dir / "final_predict.py"), self.timeout, worker_pool=self.worker_pool)
+            return await asyncio.to_thread(self._read_prediction, result, temp_dir)
+
+    def _iter_batches(self, X: Union[Iterable[pd.DataFrame], str, PathLike], batch_size: int) -> Iterator[pd.DataFrame]:
+        if isinstance(X, (str, PathLike)):
+            X = _read_file_chunks(str(X), self.csv_encoding, self.csv_delimiter, batch_size)
+        # Small chunks are put together and large chunks are split, so that every batch has at most batch_size rows.
+        pending: list[pd.DataFrame] = []
+        num_pending = 0
+        for chunk in X:
+            start = 0
+            while start < len(chunk):
+                piece = chunk.iloc[start : start + batch_size - num_pending]
+                start += len(piece)
+                pending.append(piece)
+                num_pending += len(piece)
+                if num_pending == batch_size:
+                    yield pd.concat(pending) if len(pending) > 1 else pending[0]
+                    pending = []
+                    num_pending = 0
+        if pending:
+            yield pd.concat(pending) if len(pending) > 1 else pending[0]
+
+    def predict_iter(
+        self,
+        X: Union[Iterable[pd.DataFrame], str, PathLike],
+        batch_size: int = 100_000,
+        n_jobs: Optional[int] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """Predicts the output of a large dataset by batches, yielding the predictions of each batch.
+
+        Only a batch of the input and its prediction are held in memory at a time.
+
+        Parameters
+        ---------
+        X: iterable of pd.DataFrame, str or Path-like object
+            Chunks of the dataset, or the path of a csv or pickle file.
+            Csv files are read incrementally, while pickle files are loaded at once.
+        batch_size: int
+            Maximum number of rows of a batch.
+        n_jobs: int, optional
+            Number of processes to predict each batch in parallel. See `predict()`.
+
+        Yields
+        ------
+        result_df : pd.DataFrame
+            The prediction of each batch in the same format as `predict()`.
+            Concatenating them gives the same result as `predict()` of the whole dataset.
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        offset = 0
+        for batch in self._iter_batches(X, batch_size):
+            yield self._shift_index(self.predict(batch, n_jobs), offset)
+            offset += len(batch)
+
+    def predict_file(
+        self,
+        X: Union[Iterable[pd.DataFrame], str, PathLike],
+        output_path: PathLike,
+        batch_size: int = 100_000,
+        n_jobs: Optional[int] = None,
+    ) -> int:
+        """Predicts the output of a large dataset by batches, and writes the predictions to a csv file.
+
+        The file has the same format as prediction_result.csv, and is written batch by batch.
+
+        Parameters
+        ---------
+        X: iterable of pd.DataFrame, str or Path-like object
+            Chunks of the dataset, or the path of a csv or pickle file.
+        output_path: Path-like object
+            Path of the csv file to write the predictions.
+        batch_size: int
+            Maximum number of rows of a batch.
+        n_jobs: int, optional
+            Number of processes to predict each batch in parallel. See `predict()`.
+
+        Returns
+        -------
+        num_rows : int
+            Number of rows of the predictions.
+        """
+        num_rows = 0
+        with open(output_path, "w", newline="") as f:
+            for result_df in self.predict_iter(X, batch_size, n_jobs):
+                result_df.to_csv(f, header=num_rows == 0)
+                num_rows += len(result_df)
+        return num_rows
@@ -12,13 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import ast
+import functools
+import os
 import warnings
+import weakref
 from pathlib import Path
-from typing import Annotated, List, Literal, Optional, Union
+from typing import Annotated, Callable, Iterator, List, Literal, Optional, Union
 
 import numpy as np
 import pandas as pd
-from pydantic import BaseModel, Field, StringConstraints, field_validator
+from pydantic import BaseModel, Field, PrivateAttr, StringConstraints, field_validator
 
 from .macros import Metric
 from .util.logging import setup_logger
@@ -48,17 +52,297 @@ Seed = Annotated[int, Field(strict=False, ge=0, le=MAX_SEED)]
 
 logger = setup_logger()
 
+# File extensions of the datasets written in each `save_datasets_format`
+DATASETS_FORMAT_EXTENSIONS = {"csv": "csv", "pickle": "pkl", "feather": "feather", "parquet": "parquet"}
 
-def _read_file(filepath: str, csv_encoding: str, csv_delimiter: str) -> pd.DataFrame:
+# Number of rows of csv files read at once into compact dtypes
+CSV_CHUNK_ROWS = 100000
+
+# Number of rows at the beginning of csv files from which the compact dtypes are inferred
+CSV_SAMPLE_ROWS = 10000
+
+# Ratio of the distinct values to the rows in the sample, up to which the strings of a column are kept once each
+CSV_CATEGORY_MAX_RATIO = 0.5
+
+# Number of rows sampled to validate the dataframes when `validation_level` is 'sampled'.
+# A type found in 0.05% of the values appears in the sample with a probability over 99%.
+VALIDATION_SAMPLE_ROWS = 10000
+
+# Paths of the datasets read by final_train.py and final_predict.py without their extensions
+_FINAL_DATASETS = ("./training", "./test")
+
+
+def _get_datasets_format(filepath: str) -> str:
+    """Returns `save_datasets_format` of the file by its extension."""
+    for datasets_format, extension in DATASETS_FORMAT_EXTENSIONS.items():
+        if filepath.endswith("." + extension):
+            return datasets_format
+    return "csv"
+
+
+def _prune_columns(columns: Union[pd.Index, list[str]], ignore_columns: list[str]) -> Optional[list[int]]:
+    """Returns the positions of the columns not in `ignore_columns`, or None if there are none of them.
+
+    This is the rule pruning `ignore_columns` from both the files and the dataframes given to `Dataset`,
+    so that they have the same columns in the same order.
+    """
+    ignored = set(ignore_columns)
+    kept = [i for i, column in enumerate(columns) if column not in ignored]
+    if len(kept) == len(columns):
+        return None
+    return kept
+
+
+def _read_columnar_file(filepath: str, ignore_columns: list[str]) -> pd.DataFrame:
+    """Reads parquet or feather file without reading the columns in `ignore_columns`."""
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    if filepath.endswith(".parquet"):
+        schema = pyarrow.parquet.read_schema(filepath)
+    else:
+        with pyarrow.memory_map(filepath) as source:
+            schema = pyarrow.ipc.open_file(source).schema
+    kept = _prune_columns(schema.names, ignore_columns)
+    if kept is None:
+        if filepath.endswith(".parquet"):
+            return pd.read_parquet(filepath)
+        return pd.read_feather(filepath)
+    # The columns of the index are kept, so that it is restored from the pandas metadata.
+    columns = [schema.names[i] for i in kept]
+    if filepath.endswith(".parquet"):
+        table = pyarrow.parquet.read_table(filepath, columns=columns)
+    else:
+        table = pyarrow.feather.read_table(filepath, columns=columns, memory_map=True)
+    return table.to_pandas()
+
+
+def _read_file(
+    filepath: str,
+    csv_encoding: str,
+    csv_delimiter: str,
+    ignore_columns: Optional[list[str]] = None,
+    compact_dtypes: bool = False,
+) -> pd.DataFrame:
+    """Reads pickle, feather, parquet or csv file.
+
+    The columns in `ignore_columns` are not read from feather, parquet and csv files,
+    and are dropped after reading pickle files.
+    Csv files are read into compact dtypes by `_read_csv_compact()` if `compact_dtypes` is True.
+    """
+    ignore_columns = ignore_columns or []
     if filepath.endswith(".pkl"):
         res_df = pd.read_pickle(filepath)
+        kept = _prune_columns(res_df.columns, ignore_columns)
+        if kept is not None:
+            res_df = res_df.take(kept, axis=1)
+        return res_df
+    if filepath.endswith((".feather", ".parquet")):
+        return _read_columnar_file(filepath, ignore_columns)
+    usecols = None
+    if ignore_columns:
+        header = pd.read_csv(filepath, encoding=csv_encoding, delimiter=csv_delimiter, nrows=0)
+        usecols = _prune_columns(header.columns, ignore_columns)
+    if compact_dtypes:
+        res_df = _read_csv_compact(filepath, csv_encoding, csv_delimiter, usecols)
     else:
-        res_df = pd.read_csv(filepath, encoding=csv_encoding, delimiter=csv_delimiter)
+        res_df = pd.read_csv(filepath, encoding=csv_encoding, delimiter=csv_delimiter, usecols=usecols)
     return res_df
 
 
+def _downcast(values: pd.Series) -> pd.Series:
+    """Returns the numeric values in the narrowest dtype representing all of them exactly."""
+    if pd.api.types.is_bool_dtype(values) or values.empty:
+        return values
+    if pd.api.types.is_integer_dtype(values):
+        min_value, max_value = values.min(), values.max()
+        for dtype in (np.int8, np.int16, np.int32):
+            if np.iinfo(dtype).min <= min_value and max_value <= np.iinfo(dtype).max:
+                return values.astype(dtype)
+    elif values.dtype == np.float64:
+        downcast = values.astype(np.float32)
+        if np.array_equal(downcast.to_numpy(), values.to_numpy(), equal_nan=True):
+            return downcast
+    return values
+
+
+def _promote_compact_dtypes(a: Optional[np.dtype], b: np.dtype) -> Optional[np.dtype]:
+    """Returns the dtype of a column of two chunks concatenated, or None if it is not simply promoted."""
+    if not (isinstance(a, np.dtype) and isinstance(b, np.dtype)):
+        return None
+    if a == b:
+        return a
+    if a.kind in "iuf" and b.kind in "iuf":
+        return np.promote_types(a, b)
+    return None
+
+
+class _CompactColumn:
+    """Column read from a csv file by chunks, whose values are stored compactly until `to_series()`.
+
+    A column of a numeric or bool dtype in the sample is stored in an array of the narrowest dtype found so far,
+    which is widened when the values of a chunk do not fit in it.
+    A column of strings with few distinct values in the sample is stored as the codes of the distinct values,
+    so that each distinct string is kept once. The others are stored as the chunks to be concatenated.
+    The arrays are grown in place to the number of rows expected when more rows are read.
+    """
+
+    def __init__(self, sample: pd.Series):
+        self.n_rows = 0
+        self.array: Optional[np.ndarray] = None
+        self.codes: Optional[np.ndarray] = None
+        self.categories: dict[tuple[type, object], int] = {}
+        self.chunks: Optional[list[pd.Series]] = None
+        if isinstance(sample.dtype, np.dtype) and sample.dtype.kind in "biuf":
+            self.array = np.empty(0, _downcast(sample).dtype)
+        elif sample.dtype == object and sample.nunique() <= len(sample) * CSV_CATEGORY_MAX_RATIO:
+            self.codes = np.empty(0, np.int32)
+        else:
+            self.chunks = []
+
+    @staticmethod
+    def _reserve(array: np.ndarray, size: int, capacity: int) -> np.ndarray:
+        if size > len(array):
+            # Resized in place, or moved without copying by the allocator if possible
+            array.resize(max(size, capacity), refcheck=False)
+        return array
+
+    def append(self, values: pd.Series, capacity: int):
+        """Appends the values of a chunk, growing the arrays to `capacity` rows if they are short."""
+        start, stop = self.n_rows, self.n_rows + len(values)
+        if self.array is not None:
+            dtype = None
+            if pd.api.types.is_numeric_dtype(values):
+                values = _downcast(values)
+                dtype = _promote_compact_dtypes(self.array.dtype, values.dtype)
+            if dtype is None:
+                # The values are not simply promoted, e.g., strings in a numeric column.
+                self.chunks = [pd.Series(self.array[:start], copy=False)]
+                self.array = None
+            else:
+                if dtype != self.array.dtype:
+                    self.array = self.array.astype(dtype)
+                self.array = self._reserve(self.array, stop, capacity)
+                self.array[start:stop] = values.to_numpy()
+        elif self.codes is not None:
+            codes, uniques = pd.factorize(values.to_numpy())
+            # Keyed by the types as well, since 1 and 1.0 are equal
+            mapping = np.array(
+                [self.categories.setdefault((type(value), value), len(self.categories)) for value in uniques] + [-1],
+                dtype=np.int32,
+            )
+            self.codes = self._reserve(self.codes, stop, capacity)
+            # The code of missing values, -1, is mapped to -1 by the last element.
+            self.codes[start:stop] = mapping[codes]
+        if self.chunks is not None:
+            self.chunks.append(values.reset_index(drop=True))
+        self.n_rows = stop
+
+    def to_series(self) -> pd.Series:
+        index = pd.RangeIndex(self.n_rows)
+        if self.chunks is not None:
+            return pd.concat(self.chunks, ignore_index=True) if len(self.chunks) > 1 else self.chunks[0]
+        if self.array is not None:
+            self.array.resize(self.n_rows, refcheck=False)
+            return pd.Series(self.array, index=index, copy=False)
+        categories = np.empty(len(self.categories) + 1, dtype=object)
+        for (_, value), code in self.categories.items():
+            categories[code] = value
+        categories[-1] = np.nan
+        # The values are references to the distinct objects, looked up by chunks to avoid converting all the codes.
+        values = np.empty(self.n_rows, dtype=object)
+        for start in range(0, self.n_rows, CSV_CHUNK_ROWS):
+            stop = min(start + CSV_CHUNK_ROWS, self.n_rows)
+            np.take(categories, self.codes[start:stop], out=values[start:stop])
+        self.codes = None
+        # dtype is given so that the values are not inspected to infer it.
+        return pd.Series(values, index=index, dtype=object, copy=False)
+
+
+def _read_csv_compact(
+    filepath: str, csv_encoding: str, csv_delimiter: str, usecols: Optional[list[int]] = None
+) -> pd.DataFrame:
+    """Reads csv file by chunks into compact dtypes in a single pass.
+
+    The dtypes are inferred from the first `CSV_SAMPLE_ROWS` rows: the numeric columns are downcast
+    to the narrowest dtypes representing the values exactly, e.g., int8 and float32.
+    The file is then read by chunks, whose values are copied into the columns allocated for the number of rows
+    estimated from the bytes read so far, and a column is widened when the values of a chunk do not fit in its dtype.
+    So only a chunk is held in addition to the result, instead of all the chunks and their concatenation.
+    The strings of the columns with few distinct values in the sample are kept once for each distinct value.
+    The values are the same as those read by `pd.read_csv()` with the default dtypes.
+    """
+    read_csv_args = {"encoding": csv_encoding, "delimiter": csv_delimiter, "usecols": usecols}
+    sample = pd.read_csv(filepath, nrows=CSV_SAMPLE_ROWS, **read_csv_args)
+    if len(sample) < CSV_SAMPLE_ROWS:
+        # The whole file is read.
+        for column, values in sample.items():
+            if pd.api.types.is_numeric_dtype(values):
+                sample[column] = _downcast(values)
+        return sample
+
+    names = sample.columns
+    columns = [_CompactColumn(values) for _, values in sample.items()]
+    del sample
+    file_size = os.path.getsize(filepath)
+    n_rows = 0
+    with open(filepath, "rb") as f, pd.read_csv(f, chunksize=CSV_CHUNK_ROWS, **read_csv_args) as reader:
+        for chunk in reader:
+            n_rows += len(chunk)
+            # The parser reads ahead, so the rows are rather underestimated.
+            capacity = int(n_rows * file_size / max(f.tell(), 1) * 1.05)
+            for i, column in enumerate(columns):
+                column.append(chunk.iloc[:, i], capacity)
+    dataframe = pd.DataFrame({i: column.to_series() for i, column in enumerate(columns)}, copy=False)
+    dataframe.columns = names
+    return dataframe
+
+
+def _get_compact_dtypes(*dataframes: Optional[pd.DataFrame]) -> dict[str, str]:
+    """Returns the dtypes of the numeric columns downcast by `_read_csv_compact()` in any of the dataframes.
+
+    The dtype of each column is wide enough for all the dataframes having it,
+    and the columns which are not numeric in some of them are omitted.
+    """
+    dtypes: dict[str, np.dtype] = {}
+    non_numeric_columns = set()
+    for dataframe in dataframes:
+        if dataframe is None:
+            continue
+        for column, dtype in dataframe.dtypes.items():
+            if not isinstance(dtype, np.dtype) or dtype.kind not in "iuf":
+                non_numeric_columns.add(column)
+            else:
+                dtypes[column] = np.promote_types(dtypes.get(column, dtype), dtype)
+    return {
+        column: dtype.name
+        for column, dtype in dtypes.items()
+        if column not in non_numeric_columns and dtype.name not in ("int64", "float64")
+    }
+
+
+def _read_file_chunks(filepath: str, csv_encoding: str, csv_delimiter: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Reads pickle, feather, parquet or csv file by chunks of `chunksize` rows.
+
+    Csv and parquet files are read incrementally, while pickle and feather files are loaded at once and then split.
+    """
+    if filepath.endswith(".parquet"):
+        import pyarrow.parquet
+
+        for batch in pyarrow.parquet.ParquetFile(filepath).iter_batches(batch_size=chunksize, use_pandas_metadata=True):
+            yield batch.to_pandas()
+    elif filepath.endswith((".pkl", ".feather")):
+        res_df = _read_file(filepath, csv_encoding, csv_delimiter)
+        for start in range(0, len(res_df), chunksize):
+            yield res_df.iloc[start : start + chunksize]
+    else:
+        with pd.read_csv(filepath, encoding=csv_encoding, delimiter=csv_delimiter, chunksize=chunksize) as reader:
+            yield from reader
+
+
 def save_file(dataframe: pd.DataFrame, filepath: str, csv_encoding: str, csv_delimiter: str) -> None:
-    """Saving dataframe to pickle or csv files
+    """Saving dataframe to pickle, feather, parquet or csv files
 
     Parameters
     ----------
@@ -74,36 +358,228 @@ def save_file(dataframe: pd.DataFrame, filepath: str, csv_encoding: str, csv_del
     """
     if filepath.endswith(".pkl"):
         dataframe.to_pickle(filepath)
+    elif filepath.endswith(".feather"):
+        _to_feather(dataframe, filepath)
+    elif filepath.endswith(".parquet"):
+        _to_parquet(dataframe, filepath)
     else:
         dataframe.to_csv(filepath, encoding=csv_encoding, sep=csv_delimiter, index=False)
 
 
-def _is_strnum_column(c):
+def _to_arrow_compatible(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """Returns dataframe whose object columns mixing strings and numbers are converted to strings.
+
+    Arrow cannot store such columns, so their values are written as strings as they are in csv files,
+    keeping the missing values.
+    """
+    mixed_columns = [
+        column
+        for column, dtype in dataframe.dtypes.items()
+        if dtype == object and pd.api.types.infer_dtype(dataframe[column], skipna=True).startswith("mixed")
+    ]
+    if mixed_columns:
+        # Only the converted columns are newly allocated.
+        dataframe = dataframe.copy(deep=False)
+        for column in mixed_columns:
+            values = dataframe[column]
+            dataframe[column] = values.where(values.isna(), values.astype(str))
+    return dataframe
+
+
+def _to_feather(dataframe: pd.DataFrame, path) -> None:
+    """Writes dataframe as an uncompressed Arrow IPC (Feather V2) file, which can be memory-mapped."""
+    _to_arrow_compatible(dataframe).to_feather(path, compression="uncompressed")
+
+
+def _to_parquet(dataframe: pd.DataFrame, path) -> None:
+    """Writes dataframe as a parquet file."""
+    _to_arrow_compatible(dataframe).to_parquet(path)
+
+
+def _view_dataframe(dataframe: pd.DataFrame, kept: Optional[list[int]] = None) -> pd.DataFrame:
+    """Returns a dataframe sharing the data of the given dataframe instead of copying it.
+
+    When copy-on-write of pandas is enabled, this is a shallow copy.
+    Otherwise, the columns backed by numpy arrays become read-only views, so that writing to their values
+    raises ValueError instead of modifying the given dataframe, while replacing or adding columns is allowed.
+    The other columns are copied except for the ones backed by pyarrow, which are immutable.
+    Only the columns at the positions in `kept` are included if it is given.
+    """
+    if kept is None:
+        kept = list(range(dataframe.shape[1]))
+    if pd.options.mode.copy_on_write is True:
+        return dataframe.iloc[:, kept].copy(deep=False)
+    columns = {}
+    for i in kept:
+        values = dataframe.iloc[:, i].array
+        if isinstance(values, pd.arrays.NumpyExtensionArray):
+            values = values.to_numpy().view()
+            values.flags.writeable = False
+        elif not isinstance(values, pd.arrays.ArrowExtensionArray):
+            values = values.copy()
+        # Series with the explicit dtype does not infer the type of object columns, which scans all the values.
+        columns[i] = pd.Series(values, index=dataframe.index, dtype=values.dtype, copy=False)
+    view = pd.DataFrame(columns, index=dataframe.index, copy=False)
+    view.columns = dataframe.columns[kept]
+    return view
+
+
+def _ingest_dataframe(dataframe: pd.DataFrame, ignore_columns: list[str], copy_data: bool) -> pd.DataFrame:
+    """Returns the copy or the view of the dataframe without the columns in `ignore_columns`.
+
+    The columns are pruned by `_prune_columns()` as in `_read_file()`, before copying or viewing,
+    so that the ignored columns are neither copied nor referred to.
+    """
+    kept = _prune_columns(dataframe.columns, ignore_columns)
+    if not copy_data:
+        return _view_dataframe(dataframe, kept)
+    if kept is None:
+        return dataframe.copy()
+    return dataframe.take(kept, axis=1)
+
+
+def _get_read_function(node: ast.AST) -> Optional[str]:
+    """Returns "read_csv" or "read_pickle" if the node calls it of pandas with a string literal as the path."""
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr in ("read_csv", "read_pickle")
+        and isinstance(node.func.value, ast.Name)
+        and node.func.value.id == "pd"
+        and len(node.args) >= 1
+        and isinstance(node.args[0], ast.Constant)
+        and isinstance(node.args[0].value, str)
+    ):
+        return node.func.attr
+    return None
+
+
+def rewrite_datasets_loading(
+    source: str,
+    save_datasets_format: Optional[str],
+    csv_dtypes: Optional[dict[str, str]] = None,
+    csv_encoding: str = "UTF-8",
+    csv_delimiter: str = ",",
+) -> str:
+    """Rewrites the generated script to read the datasets in `save_datasets_format`.
+
+    The templates of the generated scripts read .pkl files by read_pickle and all the others by read_csv.
+    The read_csv of .feather files is replaced by reading memory-mapped Arrow IPC files,
+    so that the scripts running in parallel share the pages of the files in the page cache,
+    and that of .parquet files is replaced by read_parquet.
+    "./training.*" and "./test.*" read by final_train.py and final_predict.py are replaced by the files
+    in `save_datasets_format`, if any, which GeneratedModel writes. The templates choose their format
+    by the extension of the training data file, which may differ from `save_datasets_format`.
+    The read_csv of the other .csv files is given `csv_dtypes` as `dtype`, if any, e.g., `Dataset.csv_dtypes`,
+    which are not given to "./training.csv" and "./test.csv" since the data given to the final scripts may not fit.
+
+    The calls are found in the syntax tree of the script, and only their source is replaced,
+    so that the rest of the script is kept as it is. The script is returned as it is if it cannot be parsed.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return source
+    # The offsets of the nodes are those in the UTF-8 encoded lines.
+    data = source.encode("utf-8")
+    lines = data.splitlines(keepends=True)
+    line_starts = [0]
+    for line in lines:
+        line_starts.append(line_starts[-1] + len(line))
+
+    def _span(node: ast.AST) -> tuple[int, int]:
+        return line_starts[node.lineno - 1] + node.col_offset, line_starts[node.end_lineno - 1] + node.end_col_offset
+
+    def _segment(node: ast.AST) -> str:
+        start, end = _span(node)
+        return data[start:end].decode("utf-8")
+
+    replacements: list[tuple[int, int, str]] = []
+    for stmt in tree.body:
+        needs_pyarrow = False
+        for node in ast.walk(stmt):
+            function = _get_read_function(node)
+            if function is None:
+                continue
+            path_node = node.args[0]
+            stem, _, extension = path_node.value.rpartition(".")
+            path = _segment(path_node)
+            if stem in _FINAL_DATASETS:
+                if save_datasets_format is None or extension == DATASETS_FORMAT_EXTENSIONS[save_datasets_format]:
+                    continue
+                extension = DATASETS_FORMAT_EXTENSIONS[save_datasets_format]
+                path = f'"{stem}.{extension}"'
+            elif function == "read_pickle" or extension not in ("csv", "feather", "parquet"):
+                continue
+            elif extension == "csv":
+                if csv_dtypes and not any(keyword.arg == "dtype" for keyword in node.keywords):
+                    call = _segment(node)
+                    replacements.append((*_span(node), f"{call[:-1].rstrip().rstrip(',')}, dtype={csv_dtypes!r})"))
+                continue
+            if extension == "pkl":
+                replacements.append((*_span(node), f"pd.read_pickle({path})"))
+            elif extension == "parquet":
+                replacements.append((*_span(node), f"pd.read_parquet({path})"))
+            elif extension == "feather":
+                replacements.append((*_span(node), f"pyarrow.feather.read_table({path}, memory_map=True).to_pandas()"))
+                needs_pyarrow = True
+            else:
+                read_csv = f"pd.read_csv({path}, encoding={csv_encoding!r}, delimiter={csv_delimiter!r})"
+                replacements.append((*_span(node), read_csv))
+        if needs_pyarrow:
+            # Inserted before the decorators, if any, which precede the line of the statement.
+            lineno = min([stmt.lineno] + [decorator.lineno for decorator in getattr(stmt, "decorator_list", [])])
+            start = line_starts[lineno - 1]
+            replacements.append((start, start, "import pyarrow.feather\n"))
+
+    # Replaced from the end, and the import is inserted after the call replaced at the same offset.
+    for start, end, text in sorted(replacements, key=lambda r: (r[0], r[1]), reverse=True):
+        data = data[:start] + text.encode("utf-8") + data[end:]
+    return data.decode("utf-8")
+
+
+def _is_strnum_column(c, threshold: float = 0.9):
     c2 = c.loc[c.notnull()]
     c2 = pd.to_numeric(c2, errors="coerce")
     ratio = c2.notnull().sum() / c2.shape[0]
-    return ratio > 0.9
+    return ratio > threshold
+
+
+def _is_mixed_type_column(c: pd.Series, strnum_threshold: float = 0.9) -> bool:
+    c = c.replace([-np.inf, np.inf], np.nan)
+    types_per_col = pd.api.types.infer_dtype(c[c.notnull()])
+    if types_per_col in ("mixed", "mixed-integer"):
+        return True
+    return types_per_col == "string" and _is_strnum_column(c, strnum_threshold)
 
 
-def _confirm_mixed_type(df: pd.DataFrame) -> list[str]:
-    mixed_df_cols = []
-    for df_col in df.columns:
-        df_per_col = df[df_col].replace([-np.inf, np.inf], np.nan)
-        df_per_col2 = df_per_col[df_per_col.notnull()]
-        types_per_col = pd.api.types.infer_dtype(df_per_col2)
+def _sample_rows(df: pd.DataFrame, sample_rows: Optional[int]) -> pd.DataFrame:
+    """Returns `sample_rows` rows of `df` sampled at random, or `df` itself if it has no more rows."""
+    if sample_rows is None or df.shape[0] <= sample_rows:
+        return df
+    return df.sample(sample_rows, random_state=17)
 
-        is_strnum = _is_strnum_column(df[df_col])
 
-        if types_per_col == "mixed" or types_per_col == "mixed-integer" or (types_per_col == "string" and is_strnum):
-            mixed_df_cols.append(df_col)
+def _confirm_mixed_type(df: pd.DataFrame, sample_rows: Optional[int] = None) -> list[str]:
+    """Returns the columns having values of mixed types, or numeric strings in more than 90% of them.
 
-    return mixed_df_cols
+    Only the columns of object and string dtypes are inspected since the others hold values of a single type.
+    If `sample_rows` is given, the columns are inspected in `sample_rows` rows sampled at random,
+    and only the columns flagged in the sample are confirmed in all the rows.
+    """
+    df_cols = df.select_dtypes(include=["object", "string"]).columns
+    sample = _sample_rows(df, sample_rows)
+    if sample is not df:
+        # The ratio of numeric strings is flagged at 0.8 in the sample, which is far below 0.9
+        # compared to its standard error (0.005 at most in VALIDATION_SAMPLE_ROWS rows).
+        df_cols = [df_col for df_col in df_cols if _is_mixed_type_column(sample[df_col], strnum_threshold=0.8)]
+    return [df_col for df_col in df_cols if _is_mixed_type_column(df[df_col])]
 
 
-def _is_date_column(c):
+def _is_date_column(c, sample_rows: Optional[int] = 1000):
     c2 = c.loc[c.notnull()]
-    if c2.shape[0] > 1000:
-        c2 = c2.sample(1000, random_state=17)
+    if sample_rows is not None and c2.shape[0] > sample_rows:
+        c2 = c2.sample(sample_rows, random_state=17)
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
         c2 = pd.to_datetime(c2, errors="coerce")
@@ -118,9 +594,25 @@ class CancellationToken(BaseModel):
     ----------
     is_triggered : bool
 
+    Callbacks registered by `add_callback` are called when `is_triggered` is set to True.
+
     """
 
     is_triggered: bool = False
+    _callbacks: list[Callable[[], None]] = PrivateAttr(default_factory=list)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name == "is_triggered" and value:
+            for callback in list(self._callbacks):
+                callback()
+
+    def add_callback(self, callback: Callable[[], None]):
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable[[], None]):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
 
 
 class Code(BaseModel):
@@ -149,6 +641,27 @@ class Code(BaseModel):
         )
 
 
+class RungResult(BaseModel):
+    """Result of a candidate script on a rung of racing.
+
+    Attributes
+    ----------
+    fraction : float
+        Fraction of the training rows used.
+    score : float, optional
+        Score printed by the script, or None when it failed.
+    returncode : int
+    time : float
+        Wall-clock time in seconds.
+
+    """
+
+    fraction: Fraction
+    score: Optional[float] = None
+    returncode: int
+    time: NonNegativeFloat
+
+
 class RunningResult(BaseModel):
     """RunningResult class.
 
@@ -157,14 +670,64 @@ class RunningResult(BaseModel):
     output : str
     error : str
     returncode : int
-    time : int
+    time : float
+        Wall-clock time in seconds.
+    user_time : float, optional
+        CPU time spent in user mode in seconds.
+    system_time : float, optional
+        CPU time spent in system mode in seconds.
+    max_rss : int, optional
+        Peak resident set size of the process in bytes.
+    output_bytes : int
+        Number of bytes written to stdout.
+    error_bytes : int
+        Number of bytes written to stderr.
+    rungs : list[RungResult]
+        Results on the subsamples of the training data when the candidates are raced.
+    eliminated : bool
+        Whether the script was not run on the full data because it lost the race.
+
+    The resource usage of the process is None when it is not available on the platform.
 
     """
 
     output: str
     error: str
     returncode: int
-    time: NonNegativeInt
+    time: NonNegativeFloat
+    user_time: Optional[NonNegativeFloat] = None
+    system_time: Optional[NonNegativeFloat] = None
+    max_rss: Optional[int] = None
+    output_bytes: int = 0
+    error_bytes: int = 0
+    rungs: list[RungResult] = []
+    eliminated: bool = False
+
+
+class TimeoutReport(BaseModel):
+    """Report of the candidate scripts executed under a time budget.
+
+    Attributes
+    ----------
+    time_budget : float
+        Time budget in seconds for executing all the candidates.
+    elapsed : float
+        Wall-clock time in seconds actually spent.
+    saved : float
+        Part of the time budget left unused in seconds.
+    timeouts : list[Optional[float]]
+        Timeout in seconds given to each candidate, in the order of the candidates.
+        None for candidates which were not executed on the full data, e.g., restored from the result cache.
+    cut_off : list[int]
+        1-based indices of the candidates stopped by the timeout or skipped because the budget ran out.
+
+    """
+
+    time_budget: NonNegativeFloat
+    elapsed: NonNegativeFloat
+    saved: NonNegativeFloat
+    timeouts: list[Optional[NonNegativeFloat]]
+    cut_off: list[int]
 
 
 class PipelineResult(BaseModel):
@@ -323,9 +886,12 @@ class Dataset:
         test_data: Optional[Union[pd.DataFrame, str]] = None,
         csv_encoding: Literal["UTF-8", "SJIS"] = "UTF-8",
         csv_delimiter: str = ",",
-        save_datasets_format: Literal["csv", "pickle"] = "pickle",
+        save_datasets_format: Literal["csv", "pickle", "feather", "parquet"] = "pickle",
         ignore_columns: Optional[List[str]] = None,
         output_dir: Path = Path(DEFAULT_OUTPUT_DIR),
+        copy_data: bool = True,
+        compact_dtypes: bool = False,
+        validation_level: Literal["sampled", "exhaustive"] = "sampled",
     ):
         """
         Checking/Preparing the dataset.
@@ -348,27 +914,51 @@ class Dataset:
             Ignored when only pickle files are involved.
         csv_delimiter: str
             Delimiter to read csv files
-        save_datasets_format: 'csv' or 'pickle'
+        save_datasets_format: 'csv', 'pickle', 'feather' or 'parquet'
             Data format when the input dataframes are written to files.
+            'feather' writes uncompressed Arrow IPC files, which the generated scripts read by memory-mapping.
+            'feather' and 'parquet' require pyarrow.
             Ignored when all inputs are specified as file path.
         ignore_columns: list[str]
             Column names which must not be used and must be dropped.
+            They are not read from the feather, parquet and csv files specified as file path,
+            and are not copied from the input dataframes (see `_prune_columns()`).
         output_dir: str
             Output dir
+        copy_data: bool
+            Copy the input dataframes if True.
+            If False, the dataframes share the data of the input dataframes without copying them.
+            Their columns are read-only unless copy-on-write of pandas is enabled (see `_view_dataframe()`).
+        compact_dtypes: bool
+            Read the csv files specified as file path by chunks into compact dtypes if True.
+            The numeric columns are downcast as long as the values are kept, e.g., to int8 and float32
+            (see `_read_csv_compact()`).
+            The dtypes are kept in `csv_dtypes`, so that the generated scripts read the files in the same dtypes.
+        validation_level: 'sampled' or 'exhaustive'
+            How thoroughly the values of the dataframes are validated by `check_dataframes()`.
+            When 'sampled', the types of the values are inspected in `VALIDATION_SAMPLE_ROWS` rows sampled at random,
+            and only the columns found suspicious in them are inspected in all the rows.
+            When 'exhaustive', all the rows are inspected for every column.
 
         """
+        # Dataframes or functions reading them on first access, keyed by "training", "validation" and "test"
+        self._dataframes: dict[str, Union[pd.DataFrame, Callable[[], pd.DataFrame], None]] = {}
         self.ignore_columns = [] if ignore_columns is None else ignore_columns
         self.csv_encoding = csv_encoding
         self.csv_delimiter = csv_delimiter
+        self.compact_dtypes = compact_dtypes
+        self.validation_level = validation_level
         self.save_datasets_format = save_datasets_format
         self.output_dir = output_dir
 
         if isinstance(training_data, str):
-            self.training_dataframe = _read_file(training_data, csv_encoding, csv_delimiter)
+            self.training_dataframe = _read_file(
+                training_data, csv_encoding, csv_delimiter, self.ignore_columns, compact_dtypes
+            )
             self.training_data_path = training_data
         elif isinstance(training_data, pd.DataFrame):
-            self.training_dataframe = training_data.copy()
-            filename = "training." + ("pkl" if save_datasets_format == "pickle" else "csv")
+            self.training_dataframe = _ingest_dataframe(training_data, self.ignore_columns, copy_data)
+            filename = "training." + DATASETS_FORMAT_EXTENSIONS[save_datasets_format]
             self.training_data_path = str(self.output_dir / filename)
             save_file(self.training_dataframe, self.training_data_path, csv_encoding, csv_delimiter)
 
@@ -378,11 +968,13 @@ class Dataset:
                 "test_data must not be None when validation_data is specified. test_data should be specified instead of validation_data."
             )
         if isinstance(validation_data, str):
-            self.validation_dataframe = _read_file(validation_data, csv_encoding, csv_delimiter)
+            self.validation_dataframe = _read_file(
+                validation_data, csv_encoding, csv_delimiter, self.ignore_columns, compact_dtypes
+            )
             self.validation_data_path = validation_data
         elif isinstance(validation_data, pd.DataFrame):
-            self.validation_dataframe = validation_data.copy()
-            filename = "validation." + ("pkl" if save_datasets_format == "pickle" else "csv")
+            self.validation_dataframe = _ingest_dataframe(validation_data, self.ignore_columns, copy_data)
+            filename = "validation." + DATASETS_FORMAT_EXTENSIONS[save_datasets_format]
             self.validation_data_path = str(self.output_dir / filename)
             save_file(self.validation_dataframe, self.validation_data_path, csv_encoding, csv_delimiter)
         else:
@@ -390,23 +982,117 @@ class Dataset:
             self.validation_data_path = None
 
         if isinstance(test_data, str):
-            self.test_dataframe = _read_file(test_data, csv_encoding, csv_delimiter)
+            self.test_dataframe = _read_file(
+                test_data, csv_encoding, csv_delimiter, self.ignore_columns, compact_dtypes
+            )
             self.test_data_path = test_data
         elif isinstance(test_data, pd.DataFrame):
-            self.test_dataframe = test_data.copy()
-            filename = "test." + ("pkl" if save_datasets_format == "pickle" else "csv")
+            self.test_dataframe = _ingest_dataframe(test_data, self.ignore_columns, copy_data)
+            filename = "test." + DATASETS_FORMAT_EXTENSIONS[save_datasets_format]
             self.test_data_path = str(self.output_dir / filename)
             save_file(self.test_dataframe, self.test_data_path, csv_encoding, csv_delimiter)
         else:
             self.test_dataframe = None
             self.test_data_path = None
 
+        # dtypes of the columns passed to read_csv of the generated scripts
+        self.csv_dtypes = _get_compact_dtypes(*self.get_dataframes()) if compact_dtypes else {}
+
+        # The loaded dataframes are referred weakly, so that they are kept in memory only while used elsewhere.
+        self._loaded_dataframes = {
+            name: weakref.ref(dataframe) for name, dataframe in self._dataframes.items() if dataframe is not None
+        }
+
+    def _get_dataframe(self, name: str) -> Optional[pd.DataFrame]:
+        dataframe = self._dataframes.get(name)
+        if callable(dataframe):
+            dataframe = self._dataframes[name] = dataframe()
+        return dataframe
+
+    @property
+    def training_dataframe(self) -> pd.DataFrame:
+        return self._get_dataframe("training")
+
+    @training_dataframe.setter
+    def training_dataframe(self, dataframe: pd.DataFrame):
+        self._dataframes["training"] = dataframe
+
+    @property
+    def validation_dataframe(self) -> Optional[pd.DataFrame]:
+        return self._get_dataframe("validation")
+
+    @validation_dataframe.setter
+    def validation_dataframe(self, dataframe: Optional[pd.DataFrame]):
+        self._dataframes["validation"] = dataframe
+
+    @property
+    def test_dataframe(self) -> Optional[pd.DataFrame]:
+        return self._get_dataframe("test")
+
+    @test_dataframe.setter
+    def test_dataframe(self, dataframe: Optional[pd.DataFrame]):
+        self._dataframes["test"] = dataframe
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Weak references cannot be pickled.
+        state["_loaded_dataframes"] = {}
+        return state
+
+    def __setstate__(self, state):
+        # Datasets pickled by older versions have the dataframes as attributes.
+        dataframes = {
+            name: state.pop(f"{name}_dataframe")
+            for name in ("training", "validation", "test")
+            if f"{name}_dataframe" in state
+        }
+        state.setdefault("_dataframes", {}).update(dataframes)
+        state.setdefault("_loaded_dataframes", {})
+        state.setdefault("compact_dtypes", False)
+        state.setdefault("csv_dtypes", {})
+        state.setdefault("validation_level", "sampled")
+        self.__dict__.update(state)
+
+    def get_changed_dataframes(self) -> list[str]:
+        """Returns the names of the dataframes replaced after loading, e.g., by the pipeline generator.
+
+        Returns
+        -------
+        names : list[str]
+            Some of "training", "validation" and "test".
+        """
+        return [
+            name
+            for name, loaded in self._loaded_dataframes.items()
+            if self._dataframes.get(name) is not loaded() or loaded() is None
+        ]
+
     def reload(self):
-        self.training_dataframe = _read_file(self.training_data_path, self.csv_encoding, self.csv_delimiter)
-        if self.validation_data_path:
-            self.validation_dataframe = _read_file(self.validation_data_path, self.csv_encoding, self.csv_delimiter)
-        if self.test_data_path:
-            self.test_dataframe = _read_file(self.test_data_path, self.csv_encoding, self.csv_delimiter)
+        """Restores the dataframes changed after loading.
+
+        The dataframes not changed are kept as they are.
+        A changed dataframe is restored without reading the file if the loaded one is still in memory
+        and has none of `ignore_columns`.
+        Otherwise, it is read from the file on first access.
+        """
+        paths = {
+            "training": self.training_data_path,
+            "validation": self.validation_data_path,
+            "test": self.test_data_path,
+        }
+        for name in self.get_changed_dataframes():
+            loaded = self._loaded_dataframes[name]()
+            if loaded is not None and not set(self.ignore_columns) & set(loaded.columns):
+                self._dataframes[name] = loaded
+            else:
+                self._dataframes[name] = functools.partial(
+                    _read_file,
+                    paths[name],
+                    self.csv_encoding,
+                    self.csv_delimiter,
+                    self.ignore_columns,
+                    self.compact_dtypes,
+                )
 
     def check_dataframes(
         self,
@@ -419,6 +1105,13 @@ class Dataset:
         target_columns : List[str]
             Names of target columns.
 
+        Notes
+        -----
+        The values of the dataframes are inspected in the rows sampled at random
+        unless `validation_level` is 'exhaustive'.
+        The warnings are given only for the issues confirmed in all the rows,
+        while the issues only in the rows out of the samples can be overlooked.
+
         """
         # 1. Check status of each dataframe
         self._check_single_dataframe(self.training_dataframe, target_columns, "train")
@@ -494,7 +1187,7 @@ class Dataset:
             logger.warning(f"Column names of {target_data_name} dataframe are not unique.")
 
         # 4. Check strnum mixed type
-        mixed_df_cols = _confirm_mixed_type(df)
+        mixed_df_cols = _confirm_mixed_type(df, self._get_validation_sample_rows())
         for mixed_df_col in mixed_df_cols:
             logger.warning(f"{mixed_df_col} would have mixed type in {target_data_name} dataframe.")
 
@@ -527,12 +1220,22 @@ class Dataset:
             return True
         return False
 
+    def _get_validation_sample_rows(self) -> Optional[int]:
+        return None if self.validation_level == "exhaustive" else VALIDATION_SAMPLE_ROWS
+
     def _confirm_consistent_type(self, df1: pd.DataFrame, df2: pd.DataFrame) -> list[str]:
         inconsistent_df_cols = []
+        sample1 = _sample_rows(df1, self._get_validation_sample_rows())
+        sample2 = _sample_rows(df2, self._get_validation_sample_rows())
         for df1_col in df1.columns:
-            df1_col_type = pd.api.types.infer_dtype(df1[df1_col], skipna=True)
             if df1_col not in df2:
                 continue
+            if sample1 is not df1 or sample2 is not df2:
+                # Only the columns of different types in the samples are confirmed in all the rows.
+                sample1_col_type = pd.api.types.infer_dtype(sample1[df1_col], skipna=True)
+                if sample1_col_type == pd.api.types.infer_dtype(sample2[df1_col], skipna=True):
+                    continue
+            df1_col_type = pd.api.types.infer_dtype(df1[df1_col], skipna=True)
             df2_col_type = pd.api.types.infer_dtype(df2[df1_col], skipna=True)
 
             if df1_col_type != df2_col_type:
@@ -544,7 +1247,8 @@ class Dataset:
         incorrect_info = {}
         # If only _is_date_column, all integer columns can be date columns.
         object_columns = df.select_dtypes("object").columns
-        date_col = [col for col in object_columns if _is_date_column(df[col])]
+        sample_rows = 1000 if self.validation_level == "sampled" else None
+        date_col = [col for col in object_columns if _is_date_column(df[col], sample_rows)]
         for col in date_col:
             org_column = df.loc[df[col].notnull(), col]
             dt_column = pd.to_datetime(org_column, errors="coerce")
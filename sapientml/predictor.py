@@ -0,0 +1,650 @@
+# Copyright 2023-2024 The SapientML Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import ast
+import builtins
+import concurrent.futures
+import io
+import os
+import pickle
+import posixpath
+import queue
+import re
+import select
+import struct
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Mapping, Optional
+
+import pandas as pd
+
+from .params import _to_feather, _to_parquet
+from .util.logging import setup_logger
+
+logger = setup_logger()
+
+_INPUT = "__sapientml_input__"
+_OUTPUT = "__sapientml_output__"
+_ARTIFACTS = "__sapientml_artifacts__"
+
+_TEST_DATA_FILES = {"test.pkl", "test.csv", "test.feather", "test.parquet"}
+_PREDICTION_FILE = "prediction_result.csv"
+# Statements writing the prediction in a binary format, which replace `prediction.to_csv("./prediction_result.csv")`
+# Pickle is used for 'feather' and 'parquet' as well, since Arrow does not keep non-string column labels
+# such as class labels.
+_BINARY_PREDICTION_WRITERS = {
+    "pickle": '{frame}.to_pickle("./prediction_result.pkl")',
+    "feather": '{frame}.to_pickle("./prediction_result.pkl")',
+    "parquet": '{frame}.to_pickle("./prediction_result.pkl")',
+}
+_PREDICTION_OUTPUT_PATTERN = re.compile(
+    r"^(?P<indent>[ \t]*)(?P<frame>\w+)\.to_csv\((?P<quote>[\"'])\./prediction_result\.csv(?P=quote)\)[ \t]*$",
+    re.MULTILINE,
+)
+# Functions which access files, and are not allowed to remain in the script run in process
+_FILE_FUNCTIONS = {
+    "open",
+    "read_pickle",
+    "read_csv",
+    "read_parquet",
+    "read_feather",
+    "read_table",
+    "to_pickle",
+    "to_csv",
+    "to_parquet",
+    "to_feather",
+    "load",
+    "dump",
+}
+
+
+def _normalize_path(path: str) -> str:
+    return posixpath.normpath(path.replace("\\", "/"))
+
+
+def _constant_str(node: ast.AST):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def _function_name(node: ast.Call):
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return None
+
+
+def rewrite_prediction_output(source: str, save_datasets_format: str) -> str:
+    """Rewrites the prediction script to write the prediction in `save_datasets_format` if it is a binary format.
+
+    The prediction is then read without parsing text, keeping the dtypes as they are in the script.
+    The script is returned as it is if the format is 'csv' or the output statement is not found.
+    """
+    writer = _BINARY_PREDICTION_WRITERS.get(save_datasets_format)
+    if writer is None:
+        return source
+    return _PREDICTION_OUTPUT_PATTERN.sub(
+        lambda m: m.group("indent") + writer.format(frame=m.group("frame")), source, count=1
+    )
+
+
+def read_prediction(directory: Path, id_columns_for_prediction: list) -> pd.DataFrame:
+    """Reads the prediction written by the prediction script in `directory`."""
+    if (directory / "prediction_result.pkl").exists():
+        return pd.read_pickle(directory / "prediction_result.pkl")
+    return pd.read_csv(directory / _PREDICTION_FILE, index_col=id_columns_for_prediction or [0])
+
+
+def _reads_input(node: ast.Call) -> bool:
+    return bool(node.args) and isinstance(node.args[0], ast.Name) and node.args[0].id == _INPUT
+
+
+class _ScriptTransformer(ast.NodeTransformer):
+    """Replaces the file accesses of the prediction script by the variables in its namespace.
+
+    - `pd.read_pickle("./test.pkl")` becomes the input dataframe,
+      and the path of `pd.read_csv("./test.csv", ...)`, `pyarrow.feather.read_table("./test.feather", ...)`
+      or `pd.read_parquet("./test.parquet")` becomes an in-memory buffer.
+    - `with open("<file>", "rb") as f: x = pickle.load(f)` becomes `x = __sapientml_artifacts__["<file>"]`.
+    - `prediction.to_csv("./prediction_result.csv")` becomes `__sapientml_output__ = prediction`.
+    """
+
+    def __init__(self):
+        self.input_format = None
+        self.has_output = False
+
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+        name = _function_name(node)
+        path = _constant_str(node.args[0]) if node.args else None
+        if name in ("read_pickle", "read_csv") and posixpath.basename(_normalize_path(path or "")) in _TEST_DATA_FILES:
+            if name == "read_pickle":
+                self.input_format = "pickle"
+                return ast.copy_location(ast.Name(id=_INPUT, ctx=ast.Load()), node)
+            self.input_format = "csv"
+            node.args[0] = ast.copy_location(ast.Name(id=_INPUT, ctx=ast.Load()), node.args[0])
+        elif name == "read_table" and posixpath.basename(_normalize_path(path or "")) == "test.feather":
+            # pyarrow.feather.read_table("./test.feather", memory_map=True).to_pandas()
+            self.input_format = "feather"
+            node.args[0] = ast.copy_location(ast.Name(id=_INPUT, ctx=ast.Load()), node.args[0])
+        elif name == "read_parquet" and posixpath.basename(_normalize_path(path or "")) == "test.parquet":
+            self.input_format = "parquet"
+            node.args[0] = ast.copy_location(ast.Name(id=_INPUT, ctx=ast.Load()), node.args[0])
+        return node
+
+    def visit_Expr(self, node: ast.Expr):
+        self.generic_visit(node)
+        call = node.value
+        if (
+            isinstance(call, ast.Call)
+            and isinstance(call.func, ast.Attribute)
+            and call.func.attr == "to_csv"
+            and len(call.args) == 1
+            and not call.keywords
+            and _normalize_path(_constant_str(call.args[0]) or "") == _PREDICTION_FILE
+        ):
+            self.has_output = True
+            return ast.copy_location(
+                ast.Assign(targets=[ast.Name(id=_OUTPUT, ctx=ast.Store())], value=call.func.value), node
+            )
+        return node
+
+    def visit_With(self, node: ast.With):
+        self.generic_visit(node)
+        if len(node.items) != 1:
+            return node
+        item = node.items[0]
+        call = item.context_expr
+        if not (
+            isinstance(call, ast.Call)
+            and _function_name(call) == "open"
+            and isinstance(item.optional_vars, ast.Name)
+            and len(call.args) == 2
+            and _constant_str(call.args[0])
+            and _constant_str(call.args[1]) == "rb"
+        ):
+            return node
+        path = _normalize_path(_constant_str(call.args[0]))
+        file_var = item.optional_vars.id
+
+        class _ReplaceLoad(ast.NodeTransformer):
+            def visit_Call(self, call: ast.Call):
+                self.generic_visit(call)
+                if (
+                    _function_name(call) == "load"
+                    and len(call.args) == 1
+                    and isinstance(call.args[0], ast.Name)
+                    and call.args[0].id == file_var
+                ):
+                    return ast.copy_location(
+                        ast.Subscript(
+                            value=ast.Name(id=_ARTIFACTS, ctx=ast.Load()),
+                            slice=ast.Constant(value=path),
+                            ctx=ast.Load(),
+                        ),
+                        call,
+                    )
+                return call
+
+        body = [_ReplaceLoad().visit(stmt) for stmt in node.body]
+        if any(isinstance(n, ast.Name) and n.id == file_var for stmt in body for n in ast.walk(stmt)):
+            # The file object is used other than by pickle.load()
+            return node
+        return body
+
+
+class _Artifacts(dict):
+    """Objects unpickled from the files of the model on first use."""
+
+    def __init__(self, files: Mapping[str, bytes]):
+        super().__init__()
+        self.files = files
+        self.names = {_normalize_path(name): name for name in files}
+        self._lock = threading.Lock()
+
+    def __missing__(self, path: str):
+        with self._lock:
+            if path not in self:
+                self[path] = pickle.loads(self.files[self.names[path]])
+            return dict.__getitem__(self, path)
+
+
+class InProcessPredictor:
+    """Runs the prediction script of a GeneratedModel in the current process.
+
+    The script is rewritten so that it takes the input dataframe from memory, uses the pipeline objects
+    unpickled only once and kept in memory, and returns the prediction instead of writing it to a file.
+    It neither touches the disk nor starts a process, and returns the same dataframe as the script run
+    in a subprocess.
+
+    Parameters
+    ----------
+    files : Mapping[str, bytes]
+        Files of the model, i.e., `GeneratedModel.files`.
+    csv_delimiter : str
+        Delimiter of the csv files.
+    id_columns_for_prediction : list[str]
+        Columns used as the index of the prediction.
+        The first column is used when empty.
+    script_name : str
+        Name of the prediction script in `files`.
+
+    Raises
+    ------
+    ValueError
+        If the script accesses files other than the supported ones and cannot be run in process.
+
+    """
+
+    def __init__(
+        self,
+        files: Mapping[str, bytes],
+        csv_delimiter: str,
+        id_columns_for_prediction: list,
+        script_name: str = "final_predict.py",
+    ):
+        self.csv_delimiter = csv_delimiter
+        self.id_columns_for_prediction = id_columns_for_prediction or [0]
+
+        if script_name not in files:
+            raise ValueError(f"{script_name} is not found in the model")
+        tree = ast.parse(files[script_name].decode("utf-8"), filename=script_name)
+        transformer = _ScriptTransformer()
+        tree = ast.fix_missing_locations(transformer.visit(tree))
+        if transformer.input_format is None or not transformer.has_output:
+            raise ValueError(f"{script_name} does not read the test data or write the prediction as expected")
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call) and _function_name(node) in _FILE_FUNCTIONS and not _reads_input(node):
+                raise ValueError(f"{script_name} accesses files by '{_function_name(node)}' at line {node.lineno}")
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                modules = [alias.name for alias in node.names] if isinstance(node, ast.Import) else [node.module]
+                if any(module and module.split(".")[0] == "lib" for module in modules):
+                    raise ValueError(f"{script_name} imports the modules in lib at line {node.lineno}")
+        self.input_format = transformer.input_format
+        self.code = compile(tree, script_name, "exec")
+        self.artifacts = _Artifacts(files)
+
+    def _to_input(self, X: pd.DataFrame):
+        if self.input_format == "pickle":
+            return X.copy()
+        if self.input_format in ("feather", "parquet"):
+            buffer = io.BytesIO()
+            (_to_feather if self.input_format == "feather" else _to_parquet)(X, buffer)
+            buffer.seek(0)
+            return buffer
+        buffer = io.StringIO()
+        X.to_csv(buffer, sep=self.csv_delimiter, index=False)
+        buffer.seek(0)
+        return buffer
+
+    def _run(self, X: pd.DataFrame) -> pd.DataFrame:
+        namespace = {
+            "__name__": "__main__",
+            "__builtins__": builtins,
+            # Outputs of the script are discarded as they are when it runs in a subprocess.
+            "print": lambda *args, **kwargs: None,
+            _INPUT: self._to_input(X),
+            _ARTIFACTS: self.artifacts,
+        }
+        exec(self.code, namespace)
+        return namespace[_OUTPUT]
+
+    def _read_output(self, output: pd.DataFrame) -> pd.DataFrame:
+        if self.input_format in _BINARY_PREDICTION_WRITERS:
+            # The prediction is written in the binary format as it is.
+            return output
+        # Convert the result as it is written to and read from prediction_result.csv.
+        buffer = io.StringIO()
+        output.to_csv(buffer)
+        buffer.seek(0)
+        return pd.read_csv(buffer, index_col=self.id_columns_for_prediction)
+
+    def predict(self, X: pd.DataFrame) -> pd.DataFrame:
+        """Returns the prediction of X in the same format as `GeneratedModel.predict`."""
+        return self._read_output(self._run(X))
+
+    def predict_batch(self, frames: list[pd.DataFrame]) -> list[pd.DataFrame]:
+        """Returns the predictions of the frames by running the script once for all of them.
+
+        The result is the same as `[self.predict(X) for X in frames]`.
+        """
+        if len(frames) == 1:
+            return [self.predict(frames[0])]
+        lengths = [len(X) for X in frames]
+        by_id = self.id_columns_for_prediction != [0]
+        # Without id columns, the index of the prediction is the one of the input (binary formats)
+        # or the row numbers (csv), so the rows are numbered through and the index is restored afterwards.
+        output = self._run(pd.concat(frames, ignore_index=not by_id))
+        if len(output) != sum(lengths):
+            return [self.predict(X) for X in frames]
+        results = []
+        start = 0
+        for X, length in zip(frames, lengths):
+            piece = output.iloc[start : start + length]
+            start += length
+            if not by_id:
+                piece = piece.set_axis(X.index if self.input_format != "csv" else pd.RangeIndex(length))
+            results.append(self._read_output(piece))
+        return results
+
+
+def _write_message(stream, message, deadline: Optional[float] = None):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    if deadline is None:
+        stream.write(struct.pack("<Q", len(data)))
+        stream.write(data)
+        stream.flush()
+        return
+    stream.flush()
+    fd = stream.fileno()
+    # Written without blocking, so that a reader which stopped reading cannot block the writer past the deadline.
+    os.set_blocking(fd, False)
+    try:
+        for buffer in (struct.pack("<Q", len(data)), data):
+            view = memoryview(buffer)
+            while view:
+                _, ready, _ = select.select([], [fd], [], max(0.0, deadline - time.monotonic()))
+                if not ready:
+                    raise TimeoutError
+                try:
+                    view = view[os.write(fd, view[: 2**20]) :]
+                except BlockingIOError:
+                    pass
+    finally:
+        os.set_blocking(fd, True)
+
+
+def _read_exactly(fd: int, size: int, deadline: Optional[float]) -> bytes:
+    chunks = []
+    while size > 0:
+        if deadline is not None:
+            ready, _, _ = select.select([fd], [], [], max(0.0, deadline - time.monotonic()))
+            if not ready:
+                raise TimeoutError
+        chunk = os.read(fd, min(size, 2**20))
+        if not chunk:
+            raise EOFError
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _read_message(fd: int, deadline: Optional[float] = None):
+    (size,) = struct.unpack("<Q", _read_exactly(fd, 8, deadline))
+    return pickle.loads(_read_exactly(fd, size, deadline))
+
+
+# Put into the queue of PredictionWorker to stop the worker thread.
+_STOP = object()
+
+
+class _Request:
+    def __init__(self, X: pd.DataFrame):
+        self.X = X
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+
+
+class PredictionWorker:
+    """Long-lived subprocess which loads the model once and serves predictions.
+
+    Unlike InProcessPredictor, the prediction script runs isolated from the current process.
+    The input dataframes and the predictions are sent through pipes, and the pipeline objects
+    are kept in memory of the worker between predictions.
+    Concurrent calls of `predict()` are put together into a micro-batch, which the worker scores
+    by running the script once. The worker shuts down after being idle for `idle_timeout` seconds,
+    and is restarted on the next prediction or when it has crashed.
+
+    Parameters
+    ----------
+    files : Mapping[str, bytes]
+        Files of the model, i.e., `GeneratedModel.files`.
+    csv_delimiter : str
+        Delimiter of the csv files.
+    id_columns_for_prediction : list[str]
+        Columns used as the index of the prediction.
+    timeout : float, optional
+        Timeout for a micro-batch in seconds. The worker is restarted on timeout.
+        No timeout if 0 or None.
+    idle_timeout : float, optional
+        The worker shuts down after being idle for this number of seconds.
+        It is kept alive if None.
+    max_batch_rows : int
+        Maximum number of rows of a micro-batch.
+        A dataframe larger than this is not split, but makes a micro-batch by itself.
+    python : str
+        Python interpreter to run the worker.
+
+    """
+
+    def __init__(
+        self,
+        files: Mapping[str, bytes],
+        csv_delimiter: str,
+        id_columns_for_prediction: list,
+        timeout: Optional[float] = None,
+        idle_timeout: Optional[float] = 300.0,
+        max_batch_rows: int = 100_000,
+        python: str = sys.executable,
+    ):
+        self.files = files
+        self.csv_delimiter = csv_delimiter
+        self.id_columns_for_prediction = id_columns_for_prediction
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_batch_rows = max_batch_rows
+        self.python = python
+        self.restarts = 0
+        self._process: Optional[subprocess.Popen] = None
+        self._queue: queue.Queue = queue.Queue()
+        # A request or _STOP taken from the queue and served by the next batch
+        self._carry: Optional[object] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self):
+        """Starts the worker if it is not running.
+
+        Raises
+        ------
+        ValueError
+            If the prediction script cannot be served by the worker.
+        RuntimeError
+            If the worker fails to start.
+
+        """
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return
+            self._stop_process()
+            process = subprocess.Popen(
+                [self.python, "-m", "sapientml.predictor"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                # The files may be memoryviews of out-of-band buffers, which are pickled by PickleBuffer.
+                files = {name: pickle.PickleBuffer(content) for name, content in self.files.items()}
+                _write_message(process.stdin, (files, self.csv_delimiter, self.id_columns_for_prediction))
+                status, message = _read_message(process.stdout.fileno())
+            except (OSError, EOFError) as e:
+                process.kill()
+                process.wait()
+                raise RuntimeError(f"Prediction worker failed to start: exit code {process.returncode}") from e
+            if status != "ready":
+                process.stdin.close()
+                process.wait()
+                raise (ValueError if status == "unsupported" else RuntimeError)(message)
+            self._process = process
+
+    def _stop_process(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+    def _restart(self):
+        with self._lock:
+            process = self._process
+            if process is not None:
+                process.kill()
+                process.wait()
+        self.restarts += 1
+        logger.warning(f"Prediction worker is restarted (exit code {process and process.returncode}).")
+        self.start()
+
+    def _request(self, frames: list[pd.DataFrame]) -> list[pd.DataFrame]:
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        # The input and the output share the timeout, since the worker may stop reading when it hangs.
+        _write_message(self._process.stdin, frames, deadline)
+        status, message = _read_message(self._process.stdout.fileno(), deadline)
+        if status != "ok":
+            raise RuntimeError(f"Prediction was failed due to the following Error: {message}")
+        return message
+
+    def _next_batch(self) -> list:
+        if self._carry is not None:
+            batch, self._carry = [self._carry], None
+        else:
+            try:
+                batch = [self._queue.get(timeout=self.idle_timeout)]
+            except queue.Empty:
+                return []
+        if batch[0] is _STOP:
+            return batch
+        rows = len(batch[0].X)
+        while rows < self.max_batch_rows:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is _STOP or rows + len(request.X) > self.max_batch_rows:
+                # Served by the next batch
+                self._carry = request
+                break
+            batch.append(request)
+            rows += len(request.X)
+        return batch
+
+    def _serve(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                with self._lock:
+                    if self._queue.empty() and self._carry is None:
+                        # Idle shutdown. The thread is started again by the next prediction.
+                        self._stop_process()
+                        self._thread = None
+                        return
+                continue
+            if batch[0] is _STOP:
+                with self._lock:
+                    self._stop_process()
+                    self._thread = None
+                return
+            frames = [request.X for request in batch]
+            try:
+                self.start()
+                try:
+                    results = self._request(frames)
+                except (OSError, EOFError):
+                    # The worker has crashed or hung. Retry the batch once with a new worker.
+                    self._restart()
+                    results = self._request(frames)
+            except TimeoutError:
+                # Caught before OSError, which is the base class of TimeoutError.
+                with self._lock:
+                    self._process.kill()
+                for request in batch:
+                    request.future.set_exception(RuntimeError("Prediction was timed out"))
+            except (OSError, EOFError) as e:
+                error = RuntimeError("Prediction worker exited unexpectedly")
+                error.__cause__ = e
+                for request in batch:
+                    request.future.set_exception(error)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+            else:
+                for request, result in zip(batch, results):
+                    request.future.set_result(result)
+
+    def submit(self, X: pd.DataFrame) -> concurrent.futures.Future:
+        """Schedules the prediction of X and returns the future of its result."""
+        request = _Request(X)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Prediction worker is closed")
+            self._queue.put(request)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._serve, daemon=True)
+                self._thread.start()
+        return request.future
+
+    def predict(self, X: pd.DataFrame) -> pd.DataFrame:
+        """Returns the prediction of X in the same format as `GeneratedModel.predict`."""
+        return self.submit(X).result()
+
+    def close(self):
+        """Waits for the scheduled predictions and shuts down the worker."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+            if thread is None:
+                self._stop_process()
+                return
+            self._queue.put(_STOP)
+        thread.join()
+
+
+def _serve_predictions():
+    # Keep outputs of the prediction script away from the protocol stream.
+    protocol = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    try:
+        files, csv_delimiter, id_columns_for_prediction = _read_message(0)
+    except EOFError:
+        return
+    try:
+        predictor = InProcessPredictor(files, csv_delimiter, id_columns_for_prediction)
+    except (SyntaxError, ValueError) as e:
+        _write_message(protocol, ("unsupported", str(e)))
+        return
+    _write_message(protocol, ("ready", None))
+    while True:
+        try:
+            frames = _read_message(0)
+        except EOFError:
+            return
+        try:
+            _write_message(protocol, ("ok", predictor.predict_batch(frames)))
+        except Exception:
+            _write_message(protocol, ("error", traceback.format_exc()))
+
+
+if __name__ == "__main__":
+    _serve_predictions()
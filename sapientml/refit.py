@@ -0,0 +1,388 @@
+# Copyright 2023-2024 The SapientML Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import ast
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+
+MODEL_FILE = "model.pkl"
+WARM_START_MARKER = "WARM START:"
+
+_EPSILON = 1e-4
+# Rows sampled from the training data to compute its distributions
+_MAX_SAMPLES = 10_000
+_FIT_METHODS = ("fit", "fit_transform")
+# Suffixes of the columns split by the mixed type handling in the scripts
+_DERIVED_COLUMN_SUFFIXES = ("__str", "__num")
+
+_LOAD_TEMPLATE = """
+import pickle
+with open({path!r}, 'rb') as f:
+    {name} = pickle.load(f)
+"""
+
+_WARM_START_TEMPLATE = """
+import math
+import pickle
+with open({path!r}, 'rb') as f:
+    previous_model = pickle.load(f)
+if (
+    type(previous_model) is type({name})
+    and hasattr({name}, 'get_params')
+    and 'warm_start' in {name}.get_params(deep=False)
+):
+    previous_model.set_params(warm_start=True)
+    if 'n_estimators' in {name}.get_params(deep=False):
+        n_estimators = previous_model.n_estimators
+        previous_model.set_params(n_estimators=n_estimators + max(1, math.ceil(n_estimators * {growth!r})))
+    {name} = previous_model
+    print({marker!r}, {path!r})
+"""
+
+
+class ColumnProfile(BaseModel):
+    """Distribution of a column summarized into buckets.
+
+    Attributes
+    ----------
+    edges : list[float], optional
+        Bucket boundaries of a numeric column, i.e., the quantiles of the values.
+    categories : list[str], optional
+        Most frequent values of a non-numeric column. The other values fall into one bucket.
+    proportions : list[float]
+        Proportions of the buckets. The last bucket is for the missing values.
+
+    """
+
+    edges: Optional[list[float]] = None
+    categories: Optional[list[str]] = None
+    proportions: list[float]
+
+    def count(self, column: pd.Series) -> np.ndarray:
+        """Returns the number of values of the column in each bucket."""
+        missing = column.isna().to_numpy()
+        n_missing = int(missing.sum())
+        values = column[~missing]
+        if self.edges is not None:
+            values = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+            n_missing += int(np.isnan(values).sum())
+            values = values[~np.isnan(values)]
+            counts = np.bincount(np.searchsorted(self.edges, values, side="right"), minlength=len(self.edges) + 1)
+        else:
+            frequencies = values.astype(str).value_counts()
+            counts = frequencies.reindex(self.categories, fill_value=0).to_numpy()
+            counts = np.append(counts, len(values) - counts.sum())
+        return np.append(counts, n_missing)
+
+    @staticmethod
+    def from_column(column: pd.Series, n_bins: int = 10, max_categories: int = 20) -> "ColumnProfile":
+        if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+            values = column.dropna().to_numpy(dtype=float)
+            edges = np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1])) if len(values) else []
+            profile = ColumnProfile(edges=list(edges), proportions=[])
+        else:
+            frequencies = column.dropna().astype(str).value_counts()
+            profile = ColumnProfile(categories=list(frequencies.index[:max_categories]), proportions=[])
+        counts = profile.count(column)
+        profile.proportions = list(counts / max(counts.sum(), 1))
+        return profile
+
+
+class DataProfile(BaseModel):
+    """Distributions of the columns of the training data, used to detect drift of new data.
+
+    Attributes
+    ----------
+    n_rows : int
+        Number of rows of the training data.
+    n_samples : int, optional
+        Number of rows from which the distributions were computed. The same as `n_rows` if None.
+    columns : dict[str, ColumnProfile]
+        Distributions keyed by column name.
+
+    """
+
+    n_rows: int
+    n_samples: Optional[int] = None
+    columns: dict[str, ColumnProfile]
+
+    @staticmethod
+    def from_dataframe(
+        df: pd.DataFrame, n_bins: int = 10, max_categories: int = 20, max_samples: Optional[int] = _MAX_SAMPLES
+    ) -> "DataProfile":
+        """Summarizes the distributions of the columns of `df`.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            Training data.
+        n_bins : int
+            Number of buckets of a numeric column.
+        max_categories : int
+            Number of the most frequent values of a non-numeric column kept as buckets.
+        max_samples : int, optional
+            The distributions are computed from this number of rows sampled from `df` if it is larger.
+            All the rows are used if None.
+
+        Returns
+        -------
+        profile : DataProfile
+        """
+        n_rows = len(df)
+        if max_samples is not None and n_rows > max_samples:
+            df = df.sample(n=max_samples, random_state=0)
+        return DataProfile(
+            n_rows=n_rows,
+            n_samples=len(df),
+            columns={
+                str(name): ColumnProfile.from_column(df[name], n_bins, max_categories)
+                for name in df.columns
+                if isinstance(df[name], pd.Series)
+            },
+        )
+
+    def drift(self, df: pd.DataFrame) -> dict[str, float]:
+        """Returns the drift of the columns of `df` from the training data.
+
+        The drift is the population stability index, from which its expected value for two samples
+        of the same distribution is subtracted, so that small samples are not reported as drifted.
+        The columns not in the training data are ignored.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            New data.
+
+        Returns
+        -------
+        drift : dict[str, float]
+            Drift keyed by column name. It is 0 when the distributions are indistinguishable,
+            and is commonly regarded as significant when above 0.2.
+        """
+        drift = {}
+        if len(df) == 0:
+            return drift
+        for name in df.columns:
+            profile = self.columns.get(str(name))
+            if profile is None or not isinstance(df[name], pd.Series):
+                continue
+            counts = profile.count(df[name])
+            expected = np.clip(np.asarray(profile.proportions), _EPSILON, None)
+            actual = np.clip(counts / counts.sum(), _EPSILON, None)
+            psi = float(np.sum((actual - expected) * np.log(actual / expected)))
+            n_samples = self.n_samples or self.n_rows
+            bias = (np.count_nonzero(np.asarray(profile.proportions) + counts) - 1) * (1 / len(df) + 1 / n_samples)
+            drift[str(name)] = max(0.0, psi - bias)
+        return drift
+
+
+class RefitResult(BaseModel):
+    """Result of `GeneratedModel.refit()`.
+
+    Attributes
+    ----------
+    retrained : bool
+        Whether the model was trained again. False when no column drifted.
+    drift : dict[str, float]
+        Drift of the appended rows from the training data keyed by column name. See `DataProfile.drift()`.
+    reused : list[str]
+        Files of the fitted preprocessors that were reused instead of being fitted again.
+    warm_started : bool
+        Whether the estimator was trained from the previous one.
+
+    """
+
+    retrained: bool
+    drift: dict[str, float]
+    reused: list[str] = []
+    warm_started: bool = False
+
+
+def _original_column(name: str) -> str:
+    for suffix in _DERIVED_COLUMN_SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def _dumped_object(stmt: ast.stmt) -> Optional[tuple[str, str]]:
+    """Returns the path and the variable of `with open(path, 'wb') as f: pickle.dump(variable, f)`."""
+    if not (isinstance(stmt, ast.With) and len(stmt.items) == 1 and len(stmt.body) == 1):
+        return None
+    item, expr = stmt.items[0], stmt.body[0]
+    call = item.context_expr
+    if not (
+        isinstance(call, ast.Call)
+        and isinstance(call.func, ast.Name)
+        and call.func.id == "open"
+        and len(call.args) == 2
+        and all(isinstance(arg, ast.Constant) and isinstance(arg.value, str) for arg in call.args)
+        and call.args[1].value == "wb"
+        and isinstance(item.optional_vars, ast.Name)
+    ):
+        return None
+    if not (
+        isinstance(expr, ast.Expr)
+        and isinstance(expr.value, ast.Call)
+        and ast.unparse(expr.value.func) == "pickle.dump"
+        and len(expr.value.args) == 2
+        and isinstance(expr.value.args[0], ast.Name)
+        and isinstance(expr.value.args[1], ast.Name)
+        and expr.value.args[1].id == item.optional_vars.id
+    ):
+        return None
+    return call.args[0].value, expr.value.args[0].id
+
+
+def _fit_calls(stmt: ast.stmt, name: str) -> list[ast.Call]:
+    return [
+        node
+        for node in ast.walk(stmt)
+        if isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr in _FIT_METHODS
+        and isinstance(node.func.value, ast.Name)
+        and node.func.value.id == name
+    ]
+
+
+def _assigns(stmt: ast.stmt, name: str) -> bool:
+    return isinstance(stmt, ast.Assign) and any(
+        isinstance(target, ast.Name) and target.id == name for target in stmt.targets
+    )
+
+
+def _fitted_columns(call: ast.Call, constants: dict[str, list[str]]) -> Optional[list[str]]:
+    """Returns the columns given to the fit method as `dataset[COLUMNS]`, or None if unknown."""
+    if len(call.args) != 1 or not isinstance(call.args[0], ast.Subscript):
+        return None
+    columns = call.args[0].slice
+    if isinstance(columns, ast.Name):
+        return constants.get(columns.id)
+    try:
+        columns = ast.literal_eval(columns)
+    except ValueError:
+        return None
+    return columns if isinstance(columns, list) and all(isinstance(c, str) for c in columns) else None
+
+
+class _ReuseFitted(ast.NodeTransformer):
+    def __init__(self, name: str, calls: list[ast.Call]):
+        self.name = name
+        self.calls = calls
+
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+        if node in self.calls:
+            if node.func.attr == "fit":
+                return ast.Name(id=self.name, ctx=ast.Load())
+            node.func.attr = "transform"
+        return node
+
+
+def rewrite_training_script(
+    source: str,
+    artifacts: set[str],
+    columns: set[str],
+    drifted: set[str],
+    growth: float,
+) -> tuple[str, list[str], bool]:
+    """Rewrites the training script to reuse the fitted objects for refitting.
+
+    A preprocessor pickled by the script is loaded from its file and used by `transform()` instead of
+    `fit_transform()`, if it is fitted on known columns none of which drifted, or on the whole dataset
+    when no column drifted. The estimator in `model.pkl` is loaded and trained with `warm_start`,
+    if all the preprocessors are reused so that the features are unchanged, and if it supports `warm_start`.
+    Ensembles get new estimators in proportion to `growth`.
+
+    Parameters
+    ----------
+    source : str
+        The training script.
+    artifacts : set[str]
+        Files of the fitted objects which are available.
+    columns : set[str]
+        Columns whose drift is known.
+    drifted : set[str]
+        Columns that drifted.
+    growth : float
+        Ratio of the number of appended rows to that of the training data.
+
+    Returns
+    -------
+    source : str
+        The rewritten script, which prints `WARM_START_MARKER` when the estimator is warm-started.
+    reused : list[str]
+        Files of the reused preprocessors.
+    warm_start : bool
+        Whether the estimator may be warm-started.
+    """
+    tree = ast.parse(source)
+    body = tree.body
+    constants: dict[str, list[str]] = {}
+    constants_at: list[dict[str, list[str]]] = []
+    for stmt in body:
+        constants_at.append(dict(constants))
+        if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name):
+            try:
+                value = ast.literal_eval(stmt.value)
+            except ValueError:
+                constants.pop(stmt.targets[0].id, None)
+                continue
+            if isinstance(value, list) and all(isinstance(v, str) for v in value):
+                constants[stmt.targets[0].id] = value
+
+    insertions: dict[int, list[ast.stmt]] = {}
+    reused, all_reused, model_fit = [], True, None
+    for index, stmt in enumerate(body):
+        dumped = _dumped_object(stmt)
+        if dumped is None:
+            continue
+        path, name = dumped
+        fit_index = next((i for i in range(index - 1, -1, -1) if _fit_calls(body[i], name)), None)
+        if fit_index is None or path not in artifacts:
+            all_reused = all_reused and path == MODEL_FILE
+            continue
+        assign_index = next((i for i in range(fit_index - 1, -1, -1) if _assigns(body[i], name)), None)
+        if assign_index is None or any(_assigns(body[i], name) for i in range(fit_index, index)):
+            all_reused = all_reused and path == MODEL_FILE
+            continue
+        if path == MODEL_FILE:
+            model_fit = (assign_index, name)
+            continue
+        calls = _fit_calls(body[fit_index], name)
+        fitted = _fitted_columns(calls[0], constants_at[fit_index]) if len(calls) == 1 else None
+        if fitted is None:
+            reusable = not drifted
+        else:
+            fitted = {_original_column(column) for column in fitted}
+            reusable = fitted <= columns and not fitted & drifted
+        if not reusable:
+            all_reused = False
+            continue
+        body[fit_index] = _ReuseFitted(name, calls).visit(body[fit_index])
+        insertions.setdefault(assign_index, []).extend(ast.parse(_LOAD_TEMPLATE.format(path=path, name=name)).body)
+        reused.append(path)
+
+    warm_start = all_reused and model_fit is not None
+    if warm_start:
+        assign_index, name = model_fit
+        code = _WARM_START_TEMPLATE.format(path=MODEL_FILE, name=name, growth=growth, marker=WARM_START_MARKER)
+        insertions.setdefault(assign_index, []).extend(ast.parse(code).body)
+
+    tree.body = [s for i, stmt in enumerate(body) for s in [stmt, *insertions.get(i, [])]]
+    return ast.unparse(ast.fix_missing_locations(tree)), reused, warm_start
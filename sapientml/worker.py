@@ -0,0 +1,292 @@
+# Copyright 2023-2024 The SapientML Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pre-warmed interpreter used by sapientml.executor.WorkerPool and the fork server of PipelineExecutor.
+
+The worker imports the modules given as command line arguments and then reads requests from stdin,
+one JSON object per line. For each request, it forks a child which runs the script as `__main__`
+with stdout and stderr redirected to the requested files, so that every script starts from the same
+clean state with the heavy modules already imported.
+The worker writes `{"pid": ...}` when the child is started,
+and `{"returncode": ..., "resource_usage": ...}` when it exits.
+
+With `--fork-server` as the first argument, the first request is `{"prefix": ..., "file_path": ..., "cwd": ...}`.
+The worker runs the prefix, i.e., the part common to all the scripts such as loading and splitting the dataset,
+and writes `{"ready": true}` or `{"ready": false, "error": ...}`.
+After that, requests have `id` and are served concurrently. The child forked for each script runs only the rest
+of the script in the namespace of the prefix, sharing the loaded data with the worker copy-on-write.
+The responses have the `id` of the request.
+"""
+
+import builtins
+import contextlib
+import importlib
+import json
+import os
+import runpy
+import select
+import signal
+import sys
+import tempfile
+import traceback
+from typing import Optional
+
+# Environment variables read by the native thread pools when they are loaded
+_THREAD_LIMIT_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def _compile_rest(file_path: str, prefix: str):
+    """Compiles the part of the script after `prefix` keeping the line numbers, or returns None if it does not match."""
+    with open(file_path, encoding="utf-8") as f:
+        source = f.read()
+    if not source.startswith(prefix):
+        return None
+    return compile("\n" * prefix.count("\n") + source[len(prefix) :], file_path, "exec")
+
+
+def _print_exception(e: BaseException, file_path: str):
+    # Hide the frames of this module and runpy as the interpreter does for scripts.
+    tb = e.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename != file_path:
+        tb = tb.tb_next
+    traceback.print_exception(type(e), e, tb or e.__traceback__)
+
+
+def _run_script(file_path: str, prefix: str = "", namespace: Optional[dict] = None) -> int:
+    sys.argv = [file_path]
+    sys.path[0] = os.path.dirname(file_path)
+    try:
+        code = None if namespace is None else _compile_rest(file_path, prefix)
+        if code is None:
+            runpy.run_path(file_path, run_name="__main__")
+        else:
+            namespace["__file__"] = file_path
+            exec(code, namespace)
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except Exception as e:
+        _print_exception(e, file_path)
+        return 1
+    return 0
+
+
+def _start_child(
+    request: dict, prefix: str = "", namespace: Optional[dict] = None, outputs=(b"", b""), close_fds=()
+) -> int:
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid != 0:
+        return pid
+
+    returncode = 1
+    try:
+        # The script handles its own children as a new interpreter does.
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        for fd in close_fds:
+            os.close(fd)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        stdout = os.open(request["stdout"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        stderr = os.open(request["stderr"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        os.dup2(devnull, 0)
+        os.dup2(stdout, 1)
+        os.dup2(stderr, 2)
+        for fd in (devnull, stdout, stderr):
+            os.close(fd)
+        # Outputs of the prefix
+        os.write(1, outputs[0])
+        os.write(2, outputs[1])
+        sys.stdout = sys.__stdout__
+        os.chdir(request["cwd"])
+        returncode = _run_script(request["file_path"], prefix, namespace)
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(returncode)
+
+
+def _send(protocol, message: dict):
+    protocol.write(json.dumps(message) + "\n")
+    protocol.flush()
+
+
+def _exit_message(status: int, rusage) -> dict:
+    return {
+        "returncode": os.waitstatus_to_exitcode(status),
+        "resource_usage": {
+            "user_time": rusage.ru_utime,
+            "system_time": rusage.ru_stime,
+            # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+            "max_rss": rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+        },
+    }
+
+
+@contextlib.contextmanager
+def _single_threaded():
+    """Limits the native thread pools to one thread while the context is active.
+
+    libgomp is not fork-safe: once its worker threads have started, an OpenMP region in a forked child hangs.
+    The prefix is run in this context so that the fork server starts no worker threads before forking the children.
+    The limits of the libraries loaded already are restored afterwards, and the children inherit them.
+    The libraries loaded by the prefix read the environment variables and keep one thread.
+    """
+    saved_environ = {name: os.environ.get(name) for name in _THREAD_LIMIT_VARIABLES}
+    os.environ.update({name: "1" for name in _THREAD_LIMIT_VARIABLES})
+    try:
+        from threadpoolctl import threadpool_limits
+
+        limits = threadpool_limits(limits=1)
+    except ImportError:
+        limits = contextlib.nullcontext()
+    try:
+        with limits:
+            yield
+    finally:
+        for name, value in saved_environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _run_prefix(request: dict) -> tuple[dict, tuple[bytes, bytes]]:
+    """Runs the prefix as `__main__` and returns its namespace and outputs."""
+    file_path = request["file_path"]
+    namespace = {"__name__": "__main__", "__file__": file_path, "__builtins__": builtins}
+    os.chdir(request["cwd"])
+    sys.argv = [file_path]
+    sys.path[0] = os.path.dirname(file_path)
+
+    saved_fds = (os.dup(1), os.dup(2))
+    saved_stdout = sys.stdout
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        os.dup2(stdout.fileno(), 1)
+        os.dup2(stderr.fileno(), 2)
+        sys.stdout = sys.__stdout__
+        try:
+            with _single_threaded():
+                exec(compile(request["prefix"], file_path, "exec"), namespace)
+        except BaseException as e:
+            _print_exception(e, file_path)
+            raise
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            sys.stdout = saved_stdout
+            os.dup2(saved_fds[0], 1)
+            os.dup2(saved_fds[1], 2)
+            for fd in saved_fds:
+                os.close(fd)
+            stdout.seek(0)
+            stderr.seek(0)
+            outputs = (stdout.read(), stderr.read())
+    return namespace, outputs
+
+
+def _read_lines(fd: int, buffer: bytearray, timeout: Optional[float]) -> Optional[list[bytes]]:
+    """Returns the complete lines read from `fd` within `timeout`, or None at EOF."""
+    ready, _, _ = select.select([fd], [], [], timeout)
+    if not ready:
+        return []
+    data = os.read(fd, 2**16)
+    if not data:
+        return None
+    buffer.extend(data)
+    *lines, rest = bytes(buffer).split(b"\n")
+    buffer[:] = rest
+    return lines
+
+
+def _serve_forks(protocol):
+    # stdin is read without buffering since select() is used on it.
+    buffer = bytearray()
+    lines: Optional[list[bytes]] = []
+    while lines is not None and not lines:
+        lines = _read_lines(0, buffer, None)
+    if not lines:
+        return
+    request = json.loads(lines.pop(0))
+    prefix = request["prefix"]
+    try:
+        namespace, outputs = _run_prefix(request)
+    except (Exception, SystemExit):
+        _send(protocol, {"ready": False, "error": traceback.format_exc()})
+        return
+    _send(protocol, {"ready": True})
+
+    # SIGCHLD wakes up select() through the self-pipe, so that the children are reaped as soon as they exit.
+    wakeup_fds = os.pipe()
+    for fd in wakeup_fds:
+        os.set_blocking(fd, False)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    signal.set_wakeup_fd(wakeup_fds[1], warn_on_full_buffer=False)
+
+    children: dict[int, int] = {}
+    while lines is not None or children:
+        if lines is not None:
+            for line in lines:
+                request = json.loads(line)
+                pid = _start_child(request, prefix, namespace, outputs, wakeup_fds)
+                children[pid] = request["id"]
+                _send(protocol, {"id": request["id"], "pid": pid})
+            ready, _, _ = select.select([0, wakeup_fds[0]], [], [])
+            if wakeup_fds[0] in ready:
+                with contextlib.suppress(BlockingIOError):
+                    while os.read(wakeup_fds[0], 2**10):
+                        pass
+            lines = _read_lines(0, buffer, 0) if 0 in ready else []
+        while children:
+            # After stdin is closed, nothing but the children is waited for.
+            pid, status, rusage = os.wait4(-1, 0 if lines is None else os.WNOHANG)
+            if pid == 0:
+                break
+            if pid in children:
+                _send(protocol, {"id": children.pop(pid), **_exit_message(status, rusage)})
+
+
+def main():
+    fork_server = sys.argv[1:2] == ["--fork-server"]
+    for module in sys.argv[2 if fork_server else 1 :]:
+        try:
+            importlib.import_module(module)
+        except Exception:
+            pass
+
+    protocol = sys.stdout
+    # Keep outputs of this process away from the protocol stream.
+    sys.stdout = sys.stderr
+    if fork_server:
+        _serve_forks(protocol)
+        return
+    _send(protocol, {"ready": True})
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        pid = _start_child(request)
+        _send(protocol, {"pid": pid})
+        _, status, rusage = os.wait4(pid, 0)
+        _send(protocol, _exit_message(status, rusage))
+
+
+if __name__ == "__main__":
+    main()
@@ -24,3 +24,9 @@ def reset_sapientml_logger():
 def path_home(tmp_path):
     with mock.patch.object(Path, "home"):
         yield Path(tmp_path)
+
+
+@pytest.fixture(scope="function", autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("SAPIENTML_CACHE_DIR", str(tmp_path / "cache"))
+    yield tmp_path / "cache"
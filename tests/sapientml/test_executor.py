@@ -0,0 +1,624 @@
+# Copyright 2023-2024 The SapientML Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from unittest import mock
+
+import pytest
+from sapientml import cache
+from sapientml.cache import ExtractionCache, ResultCache, hash_bytes, hash_data_file
+from sapientml.executor import (
+    AdaptiveTimeout,
+    PipelineExecutor,
+    SuccessiveHalving,
+    WorkerPool,
+    _MemoryBudget,
+    executor_options,
+    run,
+    run_async,
+)
+from sapientml.params import CancellationToken, Code, RunningResult, rewrite_datasets_loading
+
+
+def _sleep_and_print(seconds, message):
+    return Code(validation=f"import time\ntime.sleep({seconds})\nprint('{message}')\n")
+
+
+def test_run_returns_output(tmp_path):
+    script_path = tmp_path / "script.py"
+    script_path.write_text("import sys\nprint('hello')\nprint('world', file=sys.stderr)\n")
+    result = run(str(script_path), 0)
+    assert result.returncode == 0
+    assert result.output == "hello\n"
+    assert result.error == "world\n"
+
+
+def test_run_timeout(tmp_path):
+    script_path = tmp_path / "script.py"
+    script_path.write_text("import time\ntime.sleep(60)\n")
+    result = run(str(script_path), 1)
+    assert result.returncode == -9
+    assert result.error == "Timeout"
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_executor_keeps_order(tmp_path, max_workers):
+    pipelines = [_sleep_and_print(1.5 - 0.5 * i, f"RESULT: {i}") for i in range(3)]
+    results = PipelineExecutor(max_workers=max_workers).execute(pipelines, 0, tmp_path, None)
+    assert [code for code, _ in results] == pipelines
+    assert [result.output for _, result in results] == [f"RESULT: {i}\n" for i in range(3)]
+    for i in range(3):
+        assert (tmp_path / f"{i + 1}_script.py").exists()
+
+
+def test_executor_runs_in_parallel(tmp_path):
+    pipelines = [_sleep_and_print(2, "done") for _ in range(4)]
+    start_time = time.time()
+    results = PipelineExecutor(max_workers=4).execute(pipelines, 0, tmp_path, None)
+    assert time.time() - start_time < 6
+    assert all(result.returncode == 0 for _, result in results)
+
+
+def _allocate_and_print_interval(size, seconds):
+    return Code(
+        validation=(
+            "import time\n"
+            "start = time.time()\n"
+            f"data = b'x' * {size}\n"
+            f"time.sleep({seconds})\n"
+            "print(start, time.time())\n"
+        )
+    )
+
+
+def _get_intervals(results):
+    return sorted(tuple(float(t) for t in result.output.split()) for _, result in results)
+
+
+def test_executor_with_memory_limit(tmp_path):
+    # Only one pipeline can run at a time because each of them uses more memory than the budget.
+    pipelines = [_allocate_and_print_interval(50 * 2**20, 0.5) for _ in range(4)]
+    results = PipelineExecutor(max_workers=4, memory_limit=10 * 2**20).execute(pipelines, 0, tmp_path, None)
+    assert all(result.returncode == 0 for _, result in results)
+    intervals = _get_intervals(results)
+    assert all(end <= next_start for (_, end), (next_start, _) in zip(intervals, intervals[1:]))
+
+
+def test_executor_with_memory_limit_estimated_by_finished_pipeline(tmp_path):
+    # The first pipeline runs alone, and the others run at the same time once its peak fits in the budget.
+    pipelines = [_allocate_and_print_interval(2**20, 1) for _ in range(3)]
+    results = PipelineExecutor(max_workers=3, memory_limit=2**40).execute(pipelines, 0, tmp_path, None)
+    intervals = _get_intervals(results)
+    assert intervals[0][1] <= intervals[1][0]
+    assert intervals[2][0] < intervals[1][1]
+
+
+def test_executor_limits_memory_to_available_memory_by_default(tmp_path):
+    pipelines = [_allocate_and_print_interval(2**20, 0.5) for _ in range(2)]
+    with mock.patch("sapientml.executor._MemoryBudget", wraps=_MemoryBudget) as memory_budget:
+        with mock.patch("sapientml.executor._get_available_memory", return_value=2**40):
+            PipelineExecutor(max_workers=2).execute(pipelines, 0, tmp_path, None)
+        memory_budget.assert_called_once_with(2**40)
+        memory_budget.reset_mock()
+        with executor_options(max_workers=1, memory_limit=0):
+            executor = PipelineExecutor()
+            assert executor.max_workers == 1
+            executor.execute(pipelines, 0, tmp_path, None)
+        memory_budget.assert_not_called()
+
+
+def test_executor_cancelled(tmp_path):
+    pipelines = [_sleep_and_print(0, "done") for _ in range(2)]
+    results = PipelineExecutor().execute(pipelines, 0, tmp_path, CancellationToken(is_triggered=True))
+    assert all(result.returncode == -9 for _, result in results)
+    assert all(result.error == "Cancelled by user" for _, result in results)
+
+
+def test_run_cancelled_while_running(tmp_path):
+    script_path = tmp_path / "script.py"
+    script_path.write_text("import time\ntime.sleep(60)\n")
+    cancel = CancellationToken()
+    timer = threading.Timer(0.5, lambda: setattr(cancel, "is_triggered", True))
+    timer.start()
+    start_time = time.time()
+    result = run(str(script_path), 0, cancel)
+    timer.join()
+    assert time.time() - start_time < 10
+    assert result.returncode == -9
+    assert result.error == "Cancelled by user"
+
+
+def test_run_reads_large_output(tmp_path):
+    script_path = tmp_path / "script.py"
+    script_path.write_text("for i in range(100000):\n    print(i)\nprint('x' * 200000)\n")
+    result = run(str(script_path), 0)
+    assert result.returncode == 0
+    lines = result.output.splitlines()
+    assert len(lines) == 100001
+    assert lines[-1] == "x" * 200000
+
+
+def test_run_with_worker_pool(tmp_path):
+    script_path = tmp_path / "script.py"
+    script_path.write_text(
+        "import os, sys\n"
+        "assert 'leaked' not in globals()\n"
+        "leaked = True\n"
+        "sys.modules['json'].leaked = True\n"
+        "print(os.getcwd())\n"
+        "print('world', file=sys.stderr)\n"
+    )
+    with WorkerPool(size=1, preload=["json"]) as pool:
+        for _ in range(2):
+            result = run(str(script_path), 0, worker_pool=pool)
+            assert result.returncode == 0
+            assert result.output == f"{tmp_path}\n"
+            assert result.error == "world\n"
+
+
+def test_run_with_worker_pool_error(tmp_path):
+    script_path = tmp_path / "script.py"
+    script_path.write_text("raise ValueError('failed')\n")
+    with WorkerPool(size=1, preload=[]) as pool:
+        result = run(str(script_path), 0, worker_pool=pool)
+        assert result.returncode == 1
+        assert result.error.strip().split("\n")[-1] == "ValueError: failed"
+
+        script_path.write_text("import sys\nsys.exit(3)\n")
+        result = run(str(script_path), 0, worker_pool=pool)
+        assert result.returncode == 3
+
+
+def test_run_with_worker_pool_timeout_and_cancel(tmp_path):
+    script_path = tmp_path / "script.py"
+    script_path.write_text("import time\ntime.sleep(60)\n")
+    with WorkerPool(size=1, preload=[]) as pool:
+        result = run(str(script_path), 1, worker_pool=pool)
+        assert result.returncode == -9
+        assert result.error == "Timeout"
+
+        result = run(str(script_path), 0, CancellationToken(is_triggered=True), worker_pool=pool)
+        assert result.returncode == -9
+        assert result.error == "Cancelled by user"
+
+
+def test_executor_with_worker_pool(tmp_path):
+    pipelines = [_sleep_and_print(1 - 0.5 * i, f"RESULT: {i}") for i in range(3)]
+    with WorkerPool(size=2, preload=[]) as pool:
+        results = PipelineExecutor(max_workers=3, worker_pool=pool).execute(pipelines, 0, tmp_path, None)
+    assert [result.output for _, result in results] == [f"RESULT: {i}\n" for i in range(3)]
+
+
+def test_executor_uses_result_cache(tmp_path, cache_dir):
+    (tmp_path / "training.csv").write_text("a\n1\n")
+    pipeline = Code(
+        validation=(
+            "import pandas as pd\n"
+            f"df = pd.read_csv(r'{tmp_path / 'training.csv'}')\n"
+            f"open(r'{tmp_path / 'count.txt'}', 'a').write('x')\n"
+            "open('artifact.txt', 'w').write('artifact')\n"
+            "print('RESULT:', df['a'].sum())\n"
+        )
+    )
+    result_cache = ResultCache(max_size=10**6)
+    executor = PipelineExecutor(result_cache=result_cache)
+    first = executor.execute([pipeline], 0, tmp_path, None)[0][1]
+    assert first.output == "RESULT: 1\n"
+    assert (tmp_path / "count.txt").read_text() == "x"
+    assert str(result_cache.cache_dir).startswith(str(cache_dir))
+
+    # Cache hit: the script is not executed, and its artifacts are restored.
+    (tmp_path / "artifact.txt").unlink()
+    second = executor.execute([pipeline], 0, tmp_path, None)[0][1]
+    assert second == first
+    assert (tmp_path / "count.txt").read_text() == "x"
+    assert (tmp_path / "artifact.txt").read_text() == "artifact"
+
+    # Cache miss: the data file is changed.
+    (tmp_path / "training.csv").write_text("a\n2\n")
+    third = executor.execute([pipeline], 0, tmp_path, None)[0][1]
+    assert third.output == "RESULT: 2\n"
+    assert (tmp_path / "count.txt").read_text() == "xx"
+
+    # Opt-out
+    PipelineExecutor(result_cache=False).execute([pipeline], 0, tmp_path, None)
+    assert (tmp_path / "count.txt").read_text() == "xxx"
+
+
+def test_executor_runs_scripts_in_order_of_candidates_with_result_cache(tmp_path, cache_dir):
+    pipelines = [Code(validation=f"open(r'{tmp_path / 'order.txt'}', 'a').write('{i}')\n") for i in range(3)]
+    result_cache = ResultCache(max_size=10**6)
+    get_key = result_cache.get_key
+
+    def _get_key(script, output_dir):
+        # The lookup of the first candidate completes last.
+        if "'0'" in script:
+            time.sleep(0.5)
+        return get_key(script, output_dir)
+
+    with mock.patch.object(result_cache, "get_key", side_effect=_get_key):
+        PipelineExecutor(max_workers=1, result_cache=result_cache).execute(pipelines, 0, tmp_path, None)
+    assert (tmp_path / "order.txt").read_text() == "012"
+
+
+def test_executor_caches_artifacts_of_each_script(tmp_path):
+    pipelines = [
+        Code(validation=f"import time\nopen('{name}_artifact.txt', 'w').write('{name}')\ntime.sleep(1)\n")
+        for name in ("a", "b")
+    ]
+    result_cache = ResultCache(max_size=10**6)
+    PipelineExecutor(max_workers=2, result_cache=result_cache).execute(pipelines, 0, tmp_path, None)
+    assert (tmp_path / "a_artifact.txt").read_text() == "a"
+    assert (tmp_path / "b_artifact.txt").read_text() == "b"
+    # Each entry has only the file created by its script, though the scripts ran at the same time.
+    entries = sorted(sorted(p.name for p in (entry / "artifacts").iterdir()) for entry in result_cache.entries())
+    assert entries == [["a_artifact.txt"], ["b_artifact.txt"]]
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".")] == []
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    result_cache = ResultCache(tmp_path / "cache", max_size=2500)
+    result = RunningResult(output="x" * 1000, error="", returncode=0, time=0)
+    for key in ["aa1", "bb2", "cc3"]:
+        result_cache.put(key, result, tmp_path)
+        time.sleep(0.01)
+    assert result_cache.get("aa1", tmp_path) is None
+    assert result_cache.get("bb2", tmp_path) == result
+    time.sleep(0.01)
+    result_cache.put("dd4", result, tmp_path)
+    assert result_cache.get("cc3", tmp_path) is None
+    assert result_cache.get("bb2", tmp_path) == result
+    result_cache.clear()
+    assert result_cache.entries() == []
+
+
+def test_result_cache_is_enabled_by_default(tmp_path, cache_dir, monkeypatch):
+    assert PipelineExecutor().result_cache.cache_dir == cache_dir / "results"
+    with executor_options(result_cache=False):
+        assert PipelineExecutor().result_cache is None
+        assert PipelineExecutor(result_cache=True).result_cache is not None
+    result_cache = ResultCache(tmp_path / "cache")
+    with executor_options(result_cache=result_cache):
+        assert PipelineExecutor().result_cache is result_cache
+
+    monkeypatch.setenv("SAPIENTML_DISABLE_RESULT_CACHE", "1")
+    assert PipelineExecutor().result_cache is None
+    assert PipelineExecutor(result_cache=True).result_cache is None
+
+
+def test_hash_data_file_notices_any_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_data_file_hashes", OrderedDict())
+    monkeypatch.setattr(cache, "_MAX_DATA_FILE_HASHES", 2)
+    path = tmp_path / "data.bin"
+    content = bytearray(b"a" * 10 * 2**20)
+    path.write_bytes(content)
+    digest = hash_data_file(path)
+    # A change of the same size in the middle of a large file
+    changed = content.copy()
+    changed[len(content) // 3] = ord("b")
+    path.write_bytes(changed)
+    assert hash_data_file(path) != digest
+
+    # The file is hashed once for each version, and only the latest hashes are kept.
+    with mock.patch("sapientml.cache.hash_file", wraps=cache.hash_file) as hash_file:
+        assert hash_data_file(path) == hash_data_file(path)
+        hash_file.assert_not_called()
+        other = tmp_path / "other.bin"
+        other.write_bytes(b"x")
+        hash_data_file(other)
+        assert hash_file.call_count == 1
+    assert len(cache._data_file_hashes) == 2
+
+
+def test_extraction_cache_extracts_files_once(tmp_path):
+    extraction_cache = ExtractionCache(tmp_path / "cache", max_size=2500)
+    files = {"model.pkl": b"x" * 1000, "lib/util.py": b"y"}
+    digests = {name: hash_bytes(content) for name, content in files.items()}
+    path = extraction_cache.extract(files, digests)
+    assert (path / "model.pkl").read_bytes() == files["model.pkl"]
+    assert (path / "lib" / "util.py").read_bytes() == files["lib/util.py"]
+    mtime = (path / "model.pkl").stat().st_mtime_ns
+    assert extraction_cache.extract(files, digests) == path
+    assert (path / "model.pkl").stat().st_mtime_ns == mtime
+
+    # Other contents are stored in another entry, and the least recently used one is removed.
+    other_files = {"model.pkl": b"z" * 1000}
+    other_path = extraction_cache.extract(other_files, {"model.pkl": hash_bytes(other_files["model.pkl"])})
+    assert other_path != path
+    third_files = {"model.pkl": b"w" * 1000}
+    extraction_cache.extract(third_files, {"model.pkl": hash_bytes(third_files["model.pkl"])})
+    assert not path.exists()
+    assert other_path.exists()
+
+    # Files larger than the limit are not cached.
+    large_files = {"model.pkl": b"x" * 3000}
+    assert extraction_cache.extract(large_files, {"model.pkl": hash_bytes(large_files["model.pkl"])}) is None
+    extraction_cache.clear()
+    assert extraction_cache.entries() == []
+
+
+@pytest.mark.parametrize("use_worker_pool", [False, True])
+def test_run_records_resource_usage(tmp_path, use_worker_pool):
+    script_path = tmp_path / "script.py"
+    script_path.write_text(
+        "import sys, time\n"
+        "data = bytearray(200 * 1024 * 1024)\n"
+        "end = time.process_time() + 0.3\n"
+        "while time.process_time() < end:\n"
+        "    pass\n"
+        "print('x' * 99)\n"
+        "print('y' * 9, file=sys.stderr)\n"
+    )
+    if use_worker_pool:
+        with WorkerPool(size=1, preload=[]) as pool:
+            result = run(str(script_path), 0, worker_pool=pool)
+    else:
+        result = run(str(script_path), 0)
+    assert result.returncode == 0
+    assert isinstance(result.time, float)
+    assert result.time >= result.user_time + result.system_time >= 0.25
+    assert result.max_rss >= 200 * 1024 * 1024
+    assert result.output_bytes == 100
+    assert result.error_bytes == 10
+
+
+def test_executor_logs_resource_usage(tmp_path, caplog):
+    logger = logging.getLogger("sapientml")
+    logger.propagate = True
+    with caplog.at_level(logging.INFO, logger="sapientml"):
+        PipelineExecutor(result_cache=False).execute([_sleep_and_print(0, "done")] * 2, 0, tmp_path, None)
+    summaries = [record.message for record in caplog.records if "Resource usage" in record.message]
+    assert len(summaries) == 1
+    lines = summaries[0].splitlines()
+    assert lines[1].split()[:2] == ["script", "returncode"]
+    assert [line.split()[0] for line in lines[2:]] == ["1_script.py", "2_script.py"]
+
+
+def test_run_async_on_callers_loop(tmp_path):
+    script_path = tmp_path / "script.py"
+    script_path.write_text("import time\ntime.sleep(1)\nprint('done')\n")
+
+    async def _main():
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*[run_async(str(script_path), 0) for _ in range(4)])
+        assert asyncio.get_running_loop() is loop
+        candidate_scripts = await PipelineExecutor(result_cache=False).execute_async(
+            [_sleep_and_print(0, "RESULT: 1")], 0, tmp_path, None
+        )
+        return results, candidate_scripts
+
+    start_time = time.time()
+    results, candidate_scripts = asyncio.run(_main())
+    assert time.time() - start_time < 4
+    assert all(result.output == "done\n" for result in results)
+    assert candidate_scripts[0][1].output == "RESULT: 1\n"
+
+
+def test_adaptive_timeout_shares_budget():
+    policy = AdaptiveTimeout(100, slack=3)
+    policy.start(num_candidates=4, num_lanes=1)
+    assert policy.next_timeout() == pytest.approx(25, abs=0.1)
+    policy.record(RunningResult(output="", error="", returncode=0, time=10))
+    # At least 3 times the median runtime
+    assert policy.next_timeout() == pytest.approx(33.3, abs=0.1)
+    policy.record(RunningResult(output="", error="", returncode=0, time=30))
+    assert policy.next_timeout() == pytest.approx(90, abs=0.1)
+    assert AdaptiveTimeout(100, max_timeout=5).next_timeout() == 5
+    assert AdaptiveTimeout(0).next_timeout() == 0
+
+
+def test_executor_with_time_budget(tmp_path):
+    pipelines = [_sleep_and_print(0.1, "fast"), _sleep_and_print(60, "hung"), _sleep_and_print(0.1, "fast")]
+    executor = PipelineExecutor(max_workers=1, result_cache=False, time_budget=6)
+    start_time = time.time()
+    results = executor.execute(pipelines, 0, tmp_path, None)
+    assert time.time() - start_time < 10
+    assert [result.output for _, result in results] == ["fast\n", "", "fast\n"]
+    assert results[1][1].error == "Timeout"
+
+    report = executor.timeout_report
+    assert report.cut_off == [2]
+    assert report.timeouts[1] < 6
+    assert report.saved == pytest.approx(report.time_budget - report.elapsed)
+
+
+def test_executor_options_set_deadline(tmp_path):
+    pipelines = [_sleep_and_print(0, "fast"), _sleep_and_print(60, "hung")]
+    with executor_options(deadline=time.monotonic() + 3):
+        executor = PipelineExecutor(max_workers=1, result_cache=False)
+    assert PipelineExecutor().deadline is None
+    results = executor.execute(pipelines, 0, tmp_path, None)
+    assert [result.output for _, result in results] == ["fast\n", ""]
+    assert executor.timeout_report.cut_off == [2]
+    assert executor.timeout_report.time_budget <= 3
+
+
+def test_executor_rewrites_feather_loading(tmp_path):
+    load = '{} = pd.read_csv({}, encoding="UTF-8", delimiter=",")\n'
+    pipeline = Code(
+        validation="import pandas as pd\n" + load.format("train_dataset", 'r"/data/training.feather"'),
+        train="import pandas as pd\n" + load.format("train_dataset", '"./training.csv"'),
+        predict="import pandas as pd\n" + load.format("test_dataset", '"./test.csv"'),
+    )
+    original = pipeline.model_copy()
+    with executor_options(save_datasets_format="feather"):
+        [(rewritten, _)] = PipelineExecutor(result_cache=False).execute([pipeline], 10, tmp_path, None)
+    # The given code is kept as it is.
+    assert pipeline == original
+    assert 'pyarrow.feather.read_table(r"/data/training.feather", memory_map=True).to_pandas()' in rewritten.validation
+    assert 'pyarrow.feather.read_table("./training.feather", memory_map=True).to_pandas()' in rewritten.train
+    assert 'pyarrow.feather.read_table("./test.feather", memory_map=True).to_pandas()' in rewritten.predict
+    assert "pd.read_csv" not in rewritten.validation + rewritten.train + rewritten.predict
+    assert (tmp_path / "1_script.py").read_text() == rewritten.validation
+
+    # csv files are read as they are.
+    pipeline = Code(train="import pandas as pd\n" + load.format("train_dataset", '"./training.csv"'))
+    [(rewritten, _)] = PipelineExecutor(result_cache=False).execute([pipeline], 10, tmp_path, None)
+    assert rewritten.train == pipeline.train
+
+    pipeline = Code(
+        validation="import pandas as pd\n" + load.format("train_dataset", 'r"/data/training.parquet"'),
+        train="import pandas as pd\n" + load.format("train_dataset", '"./training.csv"'),
+        predict="import pandas as pd\n" + load.format("test_dataset", '"./test.csv"'),
+    )
+    with executor_options(save_datasets_format="parquet"):
+        [(rewritten, _)] = PipelineExecutor(result_cache=False).execute([pipeline], 10, tmp_path, None)
+    assert 'train_dataset = pd.read_parquet(r"/data/training.parquet")' in rewritten.validation
+    assert 'train_dataset = pd.read_parquet("./training.parquet")' in rewritten.train
+    assert 'test_dataset = pd.read_parquet("./test.parquet")' in rewritten.predict
+
+    # The dtypes are given to the csv files except for those of the final scripts.
+    pipeline = Code(
+        validation="import pandas as pd\n" + load.format("train_dataset", 'r"/data/training.csv"'),
+        predict="import pandas as pd\n" + load.format("test_dataset", '"./test.csv"'),
+    )
+    with executor_options(save_datasets_format="csv", csv_dtypes={"a": "int8"}):
+        [(rewritten, _)] = PipelineExecutor(result_cache=False).execute([pipeline], 10, tmp_path, None)
+    assert (
+        'train_dataset = pd.read_csv(r"/data/training.csv", encoding="UTF-8", delimiter=",", dtype={\'a\': \'int8\'})'
+        in rewritten.validation
+    )
+    assert rewritten.predict == pipeline.predict
+
+
+def test_rewrite_datasets_loading_finds_calls_in_syntax_tree():
+    source = (
+        "import pandas as pd\n"
+        "# pd.read_csv('/data/comment.feather') is not rewritten\n"
+        "def load(path='/data/default.feather'):\n"
+        "    return pd.read_csv(\n"
+        "        '/data/ｄａｔａ.feather',\n"
+        "        encoding='UTF-8',\n"
+        "    )\n"
+        "frames = [pd.read_csv('/data/a.csv', delimiter=','), pd.read_csv('/data/b.csv', dtype=str)]\n"
+    )
+    rewritten = rewrite_datasets_loading(source, "feather", {"a": "int8"})
+    assert rewritten == (
+        "import pandas as pd\n"
+        "# pd.read_csv('/data/comment.feather') is not rewritten\n"
+        "import pyarrow.feather\n"
+        "def load(path='/data/default.feather'):\n"
+        "    return pyarrow.feather.read_table('/data/ｄａｔａ.feather', memory_map=True).to_pandas()\n"
+        "frames = [pd.read_csv('/data/a.csv', delimiter=',', dtype={'a': 'int8'}), pd.read_csv('/data/b.csv', dtype=str)]\n"
+    )
+    # The final scripts read the training and test data in the format written by GeneratedModel.
+    source = 'import pandas as pd\ntrain_dataset = pd.read_pickle("./training.pkl")\n'
+    assert rewrite_datasets_loading(source, "pickle") == source
+    assert rewrite_datasets_loading(source, None) == source
+    assert rewrite_datasets_loading(source, "csv", csv_encoding="SJIS", csv_delimiter="\t") == (
+        "import pandas as pd\ntrain_dataset = pd.read_csv(\"./training.csv\", encoding='SJIS', delimiter='\\t')\n"
+    )
+    source = 'import pandas as pd\ntest_dataset = pd.read_csv("./test.csv", encoding="UTF-8", delimiter=",")\n'
+    assert (
+        rewrite_datasets_loading(source, "pickle")
+        == 'import pandas as pd\ntest_dataset = pd.read_pickle("./test.pkl")\n'
+    )
+    source = 'import pandas as pd\ntrain_dataset = pd.read_pickle("/data/training.pkl")\n'
+    assert rewrite_datasets_loading(source, "csv") == source
+
+    # The script which cannot be parsed is kept as it is.
+    assert rewrite_datasets_loading("pd.read_csv('/data/a.feather'", "feather") == "pd.read_csv('/data/a.feather'"
+
+
+def _racing_pipeline(score):
+    return Code(
+        validation=(
+            "import pandas as pd\n"
+            "def sample_dataset(dataframe, sample_size, target_columns, task_type):\n"
+            "    return dataframe.head(sample_size)\n"
+            "train_dataset = pd.DataFrame({'a': range(1000)})\n"
+            "train_dataset = sample_dataset(\n"
+            "    dataframe=train_dataset,\n"
+            "    sample_size=100000,\n"
+            "    target_columns=['a'],\n"
+            "    task_type='regression'\n"
+            ")\n"
+            "print('ROWS:', len(train_dataset))\n"
+            f"print('RESULT: R2 Score:', {score})\n"
+        )
+    )
+
+
+def test_executor_with_racing(tmp_path):
+    pipelines = [_racing_pipeline(score) for score in [0.1, 0.4, 0.3, 0.2]]
+    pipelines.append(_sleep_and_print(0, "RESULT: R2 Score: 0.0"))
+    racing = SuccessiveHalving(fractions=[0.1, 0.3], keep=0.5, min_rows=10)
+    results = [
+        result
+        for _, result in PipelineExecutor(result_cache=False, racing=racing).execute(pipelines, 0, tmp_path, None)
+    ]
+
+    assert [result.eliminated for result in results] == [True, False, True, True, False]
+    assert results[1].output.splitlines() == ["ROWS: 1000", "RESULT: R2 Score: 0.4"]
+    assert [(rung.fraction, rung.score) for rung in results[1].rungs] == [(0.1, 0.4), (0.3, 0.4)]
+    assert [len(result.rungs) for result in results] == [1, 2, 2, 1, 0]
+    assert results[0].returncode == -9
+    assert results[0].time == results[0].rungs[0].time
+    # The pipeline without SUBSAMPLE block is not raced.
+    assert results[4].output == "RESULT: R2 Score: 0.0\n"
+    assert not list(tmp_path.glob("*_rung*.py"))
+
+    lower_is_better = SuccessiveHalving(keep=0.25, lower_is_better=True)
+    assert lower_is_better.select({0: 0.1, 1: 0.4, 2: 0.3, 3: 0.2}) == [0]
+    with pytest.raises(ValueError):
+        SuccessiveHalving(fractions=[0.5, 0.1])
+
+
+def test_executor_with_fork_server(tmp_path):
+    prefix = "import os\nopen('loaded.txt', 'a').write('x')\ndata = list(range(10))\nprint('loaded', os.getpid())\n"
+    pipelines = [Code(validation=prefix + f"print('RESULT:', sum(data) + {i})\n") for i in range(3)]
+    pipelines.append(Code(validation=prefix + "\n\nraise ValueError('failed')\n"))
+    results = [
+        result
+        for _, result in PipelineExecutor(max_workers=2, result_cache=False, fork_server=True).execute(
+            pipelines, 0, tmp_path, None
+        )
+    ]
+    assert (tmp_path / "loaded.txt").read_text() == "x"
+    outputs = [result.output.splitlines() for result in results]
+    # The prefix runs only once in the fork server.
+    assert len({lines[0] for lines in outputs}) == 1
+    assert [lines[1] for lines in outputs[:3]] == ["RESULT: 45", "RESULT: 46", "RESULT: 47"]
+    assert results[3].returncode == 1
+    assert "line 7" in results[3].error
+    assert results[3].error.strip().split("\n")[-1] == "ValueError: failed"
+
+
+def test_fork_server_runs_prefix_single_threaded(tmp_path, monkeypatch):
+    monkeypatch.delenv("OMP_NUM_THREADS", raising=False)
+    prefix = (
+        "import os\n"
+        "from threadpoolctl import threadpool_info\n"
+        "prefix_env = os.environ.get('OMP_NUM_THREADS')\n"
+        "prefix_threads = {info['num_threads'] for info in threadpool_info()}\n"
+    )
+    pipelines = [
+        Code(validation=prefix + f"print({i}, prefix_env, prefix_threads, os.environ.get('OMP_NUM_THREADS'))\n")
+        for i in range(2)
+    ]
+    results = PipelineExecutor(result_cache=False, fork_server=True).execute(pipelines, 0, tmp_path, None)
+    # The children get the environment of the server back.
+    assert [result.output.strip() for _, result in results] == ["0 1 {1} None", "1 1 {1} None"]
+
+
+def test_executor_with_fork_server_falls_back(tmp_path):
+    prefix = "open('loaded.txt', 'a').write('x')\nraise ValueError('failed')\n"
+    pipelines = [Code(validation=prefix + f"print({i})\n") for i in range(2)]
+    results = PipelineExecutor(result_cache=False, fork_server=True).execute(pipelines, 0, tmp_path, None)
+    assert (tmp_path / "loaded.txt").read_text() == "xxx"
+    assert all(result.error.strip().split("\n")[-1] == "ValueError: failed" for _, result in results)
@@ -12,15 +12,32 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import concurrent.futures
+import copy
 import logging
+import os
 import pickle
+import subprocess
+import sys
+import time
+import tracemalloc
+from multiprocessing import shared_memory
 from pathlib import Path
 from unittest import mock
 
 import numpy as np
 import pandas as pd
 import pytest
-from sapientml.main import SapientML
+from sapientml import params
+from sapientml.bundle import ModelBundle
+from sapientml.cache import ExtractionCache
+from sapientml.executor import PipelineExecutor, WorkerPool
+from sapientml.main import FINAL_TRAINING_BUDGET_RATIO, SapientML
+from sapientml.model import GeneratedModel
+from sapientml.params import Dataset, RunningResult, save_file
+from sapientml.predictor import _STOP, PredictionWorker, _Request
+from sapientml.refit import DataProfile
 from sapientml.util.logging import setup_logger
 
 fxdir = Path("tests/fixtures").absolute()
@@ -88,6 +105,661 @@ def test_sapientml_works_with_generated_model(testdata_df_light):
     model.predict(X)
 
 
+def test_sapientml_works_with_async_api(testdata_df_light):
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+
+    async def _fit_and_predict():
+        await cls_.fit_async(testdata_df_light)
+        X = testdata_df_light.drop(["target_number"], axis=1)
+        return await asyncio.gather(cls_.predict_async(X), cls_.model.predict_async(X))
+
+    results = asyncio.run(_fit_and_predict())
+    assert results[0].equals(results[1])
+    assert results[0].equals(cls_.predict(testdata_df_light.drop(["target_number"], axis=1)))
+
+
+def test_sapientml_works_with_time_budget(testdata_df_light):
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+    )
+    start_time = time.monotonic()
+    cls_.fit(testdata_df_light, time_budget=90)
+    assert time.monotonic() - start_time < 90
+    assert cls_.config.cancel is None
+    cls_.predict(testdata_df_light.drop(["target_number"], axis=1))
+
+
+def test_sapientml_finalizes_best_candidate_when_time_budget_runs_out(testdata_df_light, caplog, monkeypatch):
+    from sapientml import executor
+
+    # The budget is long enough for preprocessing even on a busy machine, so that the first candidate starts in it.
+    time_budget = 60
+    run = executor._run
+
+    async def _run(file_path, timeout, cancel=None, *args, **kwargs):
+        if not file_path.endswith("_script.py"):
+            return await run(file_path, timeout, cancel, *args, **kwargs)
+        if os.path.basename(file_path) == "1_script.py":
+            # The first candidate completes however long it takes, so that there is always the best one.
+            return await run(file_path, 0, None, *args, **kwargs)
+        # The other candidates hang until the budget of the whole fit has run out.
+        while not cancel.is_triggered:
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(time_budget * FINAL_TRAINING_BUDGET_RATIO + 1)
+        return RunningResult(output="", error="Cancelled by user", returncode=-9, time=0)
+
+    monkeypatch.setattr(logging.getLogger("sapientml"), "propagate", True)
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+    )
+    with mock.patch("sapientml.executor._run", new=_run):
+        with caplog.at_level(logging.WARNING, logger="sapientml"):
+            cls_.fit(testdata_df_light, time_budget=time_budget)
+    assert any("run out before the final training" in record.message for record in caplog.records)
+    assert cls_.config.cancel is None
+    assert "final_train.py" in cls_.model.files
+    X = testdata_df_light.drop(["target_number"], axis=1)
+    assert len(cls_.predict(X)) == len(testdata_df_light)
+
+
+def test_sapientml_caches_results_of_candidates(testdata_df_light, tmp_path):
+    from sapientml import executor
+
+    def _fit(result_cache):
+        cls_ = SapientML(["target_number"], task_type="regression")
+        run = mock.AsyncMock(side_effect=executor._run)
+        with mock.patch("sapientml.executor._run", new=run):
+            cls_.fit(testdata_df_light, output_dir=str(tmp_path), codegen_only=True, result_cache=result_cache)
+        assert (tmp_path / "final_train.py").exists()
+        return run.call_count
+
+    assert _fit(True) > 0
+    # The candidates are not executed again for the same data.
+    assert _fit(True) == 0
+    assert _fit(False) > 0
+
+
+def test_sapientml_passes_executor_options(testdata_df_light, tmp_path):
+    cls_ = SapientML(["target_number"], task_type="regression")
+    with WorkerPool(size=1) as worker_pool:
+        with mock.patch.object(
+            PipelineExecutor, "execute", autospec=True, side_effect=PipelineExecutor.execute
+        ) as execute:
+            cls_.fit(
+                testdata_df_light,
+                output_dir=str(tmp_path),
+                max_workers=1,
+                memory_limit=0,
+                worker_pool=worker_pool,
+            )
+        executor = execute.call_args.args[0]
+        assert executor.max_workers == 1
+        assert executor.memory_limit == 0
+        assert executor.worker_pool is worker_pool
+        assert cls_.model.worker_pool is worker_pool
+        assert len(cls_.predict(testdata_df_light.drop(["target_number"], axis=1))) == len(testdata_df_light)
+
+
+def test_sapientml_works_with_racing(testdata_df_light):
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(testdata_df_light, racing=True)
+    execution_results = [result for _, result in cls_.generator.execution_results]
+    assert any(result.rungs for result in execution_results)
+    assert any(result.returncode == 0 and not result.eliminated for result in execution_results)
+    cls_.predict(testdata_df_light.drop(["target_number"], axis=1))
+
+
+def test_sapientml_works_with_fork_server(testdata_df_light):
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(testdata_df_light, fork_server=True, result_cache=False)
+    execution_results = [result for _, result in cls_.generator.execution_results]
+    assert all(result.returncode == 0 for result in execution_results)
+    cls_.predict(testdata_df_light.drop(["target_number"], axis=1))
+
+
+@pytest.mark.parametrize("save_datasets_format", ["pickle", "csv"])
+def test_sapientml_works_with_in_process_prediction(testdata_df_light, save_datasets_format):
+    cls_ = SapientML(
+        ["target_category_multi_nonnum"],
+        task_type="classification",
+        id_columns_for_prediction=["id"],
+        initial_timeout=60,
+    )
+    test_df = testdata_df_light.copy()
+    test_df["id"] = np.arange(test_df.shape[0])
+    cls_.fit(test_df, save_datasets_format=save_datasets_format)
+    X = test_df.drop(["target_category_multi_nonnum"], axis=1)
+    expected = cls_.predict(X)
+
+    cls_.model.prediction_mode = "in_process"
+    with mock.patch("sapientml.model.run", side_effect=AssertionError("a process is started")):
+        result = cls_.predict(X)
+        pd.testing.assert_frame_equal(result, expected)
+        assert cls_.model._predictor is not None
+        pd.testing.assert_frame_equal(asyncio.run(cls_.model.predict_async(X)), expected)
+    # The input is not modified.
+    pd.testing.assert_frame_equal(X, test_df.drop(["target_category_multi_nonnum"], axis=1))
+
+    model = pickle.loads(pickle.dumps(cls_.model))
+    assert model.prediction_mode == "in_process"
+    assert model._predictor is None
+    pd.testing.assert_frame_equal(model.predict(X), expected)
+
+
+def test_sapientml_in_process_prediction_falls_back_to_subprocess(testdata_df_light):
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(testdata_df_light)
+    X = testdata_df_light.drop(["target_number"], axis=1)
+    expected = cls_.predict(X)
+
+    cls_.model.files["final_predict.py"] += b'\nopen("./unknown.txt", "w")\n'
+    cls_.model.prediction_mode = "in_process"
+    pd.testing.assert_frame_equal(cls_.predict(X), expected)
+    assert cls_.model.prediction_mode == "subprocess"
+
+
+def test_sapientml_works_with_prediction_worker(testdata_df_light):
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(testdata_df_light)
+    X = testdata_df_light.drop(["target_number"], axis=1)
+    expected = cls_.predict(X)
+
+    cls_.model.prediction_mode = "worker"
+    cls_.model.prediction_worker_options = {"idle_timeout": 1}
+    pd.testing.assert_frame_equal(cls_.predict(X), expected)
+    worker = cls_.model._predictor
+
+    # Concurrent predictions are put together into micro-batches.
+    chunks = [X.iloc[i : i + 10] for i in range(0, len(X), 10)]
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(cls_.predict, chunks))
+    pd.testing.assert_frame_equal(pd.concat(results), expected)
+
+    async def predict_concurrently():
+        return await asyncio.gather(*[cls_.model.predict_async(chunk) for chunk in chunks])
+
+    pd.testing.assert_frame_equal(pd.concat(asyncio.run(predict_concurrently())), expected)
+
+    # The worker is restarted when it has crashed.
+    worker._process.kill()
+    pd.testing.assert_frame_equal(cls_.predict(X), expected)
+    assert worker.restarts == 1
+
+    # The worker shuts down when it is idle.
+    time.sleep(2)
+    assert worker._process is None
+    pd.testing.assert_frame_equal(cls_.predict(X), expected)
+
+    cls_.model.close()
+    assert cls_.model._predictor is None
+    assert worker._process is None
+
+
+def test_prediction_worker_keeps_stop_after_request():
+    worker = PredictionWorker({}, ",", [], idle_timeout=None)
+    request = _Request(pd.DataFrame({"a": [1, 2]}))
+    worker._queue.put(request)
+    worker._queue.put(_STOP)
+
+    # The stop is carried over to the next batch instead of being lost.
+    assert worker._next_batch() == [request]
+    assert worker._next_batch() == [_STOP]
+    assert worker._queue.empty()
+
+
+def test_prediction_worker_times_out_writing_to_hung_worker():
+    worker = PredictionWorker({}, ",", [], timeout=0.5, idle_timeout=None)
+    # A worker which hangs without reading the input, which is larger than the buffer of the pipe
+    process = subprocess.Popen(
+        [sys.executable, "-c", "import time; time.sleep(60)"], stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    )
+    worker._process = process
+    X = pd.DataFrame({"a": np.arange(10**6)})
+    start_time = time.monotonic()
+    with mock.patch.object(worker, "_restart"):
+        with pytest.raises(RuntimeError, match="timed out"):
+            worker.predict(X)
+    assert time.monotonic() - start_time < 10
+    # The hung worker is killed.
+    assert process.wait(timeout=5) != 0
+    worker.close()
+
+
+@pytest.mark.parametrize("save_datasets_format", ["pickle", "csv"])
+def test_sapientml_works_with_chunked_prediction(testdata_df_light, save_datasets_format, tmp_path):
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(testdata_df_light, save_datasets_format=save_datasets_format)
+    X = testdata_df_light.drop(["target_number"], axis=1)
+    expected = cls_.predict(X)
+    cls_.model.prediction_mode = "in_process"
+
+    chunks = [X.iloc[:7], X.iloc[7:8], X.iloc[8:]]
+    results = list(cls_.predict_iter(iter(chunks), batch_size=30))
+    assert [len(result) for result in results] == [30] * (len(X) // 30) + ([len(X) % 30] if len(X) % 30 else [])
+    pd.testing.assert_frame_equal(pd.concat(results), expected)
+
+    X.to_csv(tmp_path / "test.csv", index=False)
+    assert cls_.predict_file(tmp_path / "test.csv", tmp_path / "prediction.csv", batch_size=33) == len(X)
+    expected.to_csv(tmp_path / "expected.csv")
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "prediction.csv", index_col=[0]), pd.read_csv(tmp_path / "expected.csv", index_col=[0])
+    )
+
+
+@pytest.mark.parametrize("save_datasets_format", ["pickle", "csv"])
+def test_sapientml_works_with_sharded_prediction(testdata_df_light, save_datasets_format):
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(testdata_df_light, save_datasets_format=save_datasets_format)
+    X = testdata_df_light.drop(["target_number"], axis=1)
+    X.index = X.index * 2 + 1
+    expected = cls_.predict(X)
+
+    pd.testing.assert_frame_equal(cls_.predict(X, n_jobs=3), expected)
+    workers = list(cls_.model._shard_workers)
+    assert len(workers) == 3
+    # The workers are reused.
+    pd.testing.assert_frame_equal(asyncio.run(cls_.predict_async(X, n_jobs=2)), expected)
+    assert cls_.model._shard_workers == workers
+
+    cls_.model.close()
+    assert all(worker._process is None for worker in workers)
+
+
+def test_sapientml_reads_prediction_in_binary_format(testdata_df_light):
+    cls_ = SapientML(
+        ["target_category_multi_nonnum"],
+        task_type="classification",
+        initial_timeout=60,
+    )
+    cls_.fit(testdata_df_light, save_datasets_format="pickle")
+    X = testdata_df_light.drop(["target_category_multi_nonnum"], axis=1)
+    X.index = X.index + 1000
+    with mock.patch("sapientml.predictor.pd.read_csv", side_effect=AssertionError("csv is read")):
+        result = cls_.predict(X)
+    # The prediction is read without converting it to text.
+    assert result.index.equals(X.index)
+    assert result["target_category_multi_nonnum"].isin(testdata_df_light["target_category_multi_nonnum"]).all()
+
+
+def test_sapientml_reuses_extracted_model_files(testdata_df_light, cache_dir, monkeypatch, tmp_path):
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(testdata_df_light, save_datasets_format="pickle")
+    X = testdata_df_light.drop(["target_number"], axis=1)
+    extraction_cache = ExtractionCache()
+    # The cache is opt-in.
+    first = cls_.predict(X)
+    assert extraction_cache.entries() == []
+
+    cls_.model.extraction_cache = True
+    pd.testing.assert_frame_equal(cls_.predict(X), first)
+    entries = extraction_cache.entries()
+    assert len(entries) == 1
+    assert str(entries[0]).startswith(str(cache_dir))
+    artifacts = [name for name in cls_.model.files if not name.endswith(".py")]
+    assert artifacts
+    assert all((entries[0] / name).exists() for name in artifacts)
+    assert not any(name.endswith(".py") for name in os.listdir(entries[0]))
+
+    # The pickled objects are not written again.
+    with mock.patch.object(Path, "write_bytes", autospec=True, side_effect=Path.write_bytes) as write_bytes:
+        second = cls_.predict(X)
+    assert all(path.suffix == ".py" for (path, _), _ in write_bytes.call_args_list)
+    pd.testing.assert_frame_equal(second, first)
+    assert extraction_cache.entries() == entries
+
+    # The extracted files are hard links, which are kept when the entry is evicted during the prediction.
+    extracted = tmp_path / "extracted"
+    cls_.model._extract(extracted)
+    assert not any((extracted / name).is_symlink() for name in artifacts)
+    extraction_cache.clear()
+    assert all((extracted / name).read_bytes() == cls_.model.files[name] for name in artifacts)
+
+    # The files are written for each prediction if the cache is disabled.
+    monkeypatch.setenv("SAPIENTML_DISABLE_EXTRACTION_CACHE", "1")
+    pd.testing.assert_frame_equal(cls_.predict(X), first)
+    assert extraction_cache.entries() == []
+    cls_.model.extraction_cache = False
+    monkeypatch.delenv("SAPIENTML_DISABLE_EXTRACTION_CACHE")
+    pd.testing.assert_frame_equal(cls_.predict(X), first)
+    assert extraction_cache.entries() == []
+
+
+def test_sapientml_works_with_feather_format(testdata_df_light):
+    pytest.importorskip("pyarrow")
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(testdata_df_light, save_datasets_format="feather")
+    assert (cls_.output_dir / "training.feather").exists()
+    execution_results = [result for _, result in cls_.generator.execution_results]
+    assert all(result.returncode == 0 for result in execution_results)
+    assert "memory_map=True" in cls_.model.files["final_predict.py"].decode()
+
+    X = testdata_df_light.drop(["target_number"], axis=1)
+    expected = cls_.predict(X)
+    cls_.model.prediction_mode = "in_process"
+    pd.testing.assert_frame_equal(cls_.predict(X), expected)
+
+
+def test_sapientml_works_with_parquet_format(testdata_df_light, tmp_path):
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(testdata_df_light, save_datasets_format="parquet")
+    assert (cls_.output_dir / "training.parquet").exists()
+    execution_results = [result for _, result in cls_.generator.execution_results]
+    assert all(result.returncode == 0 for result in execution_results)
+    assert "pd.read_parquet" in cls_.model.files["final_predict.py"].decode()
+
+    X = testdata_df_light.drop(["target_number"], axis=1)
+    expected = cls_.predict(X)
+    cls_.model.prediction_mode = "in_process"
+    pd.testing.assert_frame_equal(cls_.predict(X), expected)
+
+    # The ignored columns are not read from the files specified as file path.
+    ignore_columns = ["explanatory_str_other", "explanatory_mixed_type"]
+    for extension in ["parquet", "feather", "csv"]:
+        path = str(tmp_path / f"training.{extension}")
+        save_file(testdata_df_light, path, "UTF-8", ",")
+        with mock.patch("pyarrow.parquet.read_table", wraps=pyarrow_parquet.read_table) as read_table:
+            dataset = Dataset(path, ignore_columns=ignore_columns, output_dir=tmp_path)
+        if extension == "parquet":
+            assert not set(ignore_columns) & set(read_table.call_args.kwargs["columns"])
+        assert list(dataset.training_dataframe.columns) == list(testdata_df_light.columns.drop(ignore_columns))
+        assert len(dataset.training_dataframe) == len(testdata_df_light)
+
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(str(tmp_path / "training.parquet"), ignore_columns=ignore_columns)
+    assert cls_.model.save_datasets_format == "parquet"
+    assert len(cls_.predict(X)) == len(X)
+
+    # The format given explicitly is used instead of that of the training data file.
+    cls_.fit(str(tmp_path / "training.parquet"), save_datasets_format="pickle", ignore_columns=ignore_columns)
+    assert cls_.model.save_datasets_format == "pickle"
+    assert 'pd.read_pickle("./training.pkl")' in cls_.model.files["final_train.py"].decode()
+    assert 'pd.read_pickle("./test.pkl")' in cls_.model.files["final_predict.py"].decode()
+    assert len(cls_.predict(X)) == len(X)
+
+
+def test_dataset_ingests_dataframes_without_copying(tmp_path):
+    pytest.importorskip("pyarrow")
+    n_rows = 200000
+    df = pd.DataFrame(
+        {
+            "x1": np.arange(n_rows, dtype=float),
+            "x2": np.arange(n_rows),
+            "x3": pd.Categorical(np.arange(n_rows) % 3),
+            "target": np.arange(n_rows, dtype=float),
+        }
+    )
+    data_size = df.memory_usage(index=False).sum()
+
+    def _get_peak_memory(copy_data):
+        tracemalloc.start()
+        try:
+            dataset = Dataset(df, save_datasets_format="feather", output_dir=tmp_path, copy_data=copy_data)
+            return dataset, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    dataset, peak = _get_peak_memory(True)
+    assert peak > data_size
+    assert not np.shares_memory(dataset.training_dataframe["x1"].to_numpy(), df["x1"].to_numpy())
+
+    dataset, peak = _get_peak_memory(False)
+    assert peak < data_size * 0.1
+    view = dataset.training_dataframe
+    assert np.shares_memory(view["x1"].to_numpy(), df["x1"].to_numpy())
+    pd.testing.assert_frame_equal(view, df)
+    pd.testing.assert_frame_equal(pd.read_feather(tmp_path / "training.feather"), df)
+
+    # The input dataframe is not modified through the view.
+    with pytest.raises(ValueError, match="read-only"):
+        view.loc[0, "x1"] = -1.0
+    view["x2"] = 0
+    view = view.drop(["target"], axis=1)
+    assert df.loc[0, "x1"] == 0.0
+    assert df["x2"].iloc[-1] == n_rows - 1
+
+
+def test_dataset_prunes_ignore_columns_of_files_and_dataframes(testdata_df_light, tmp_path):
+    ignore_columns = ["explanatory_str_other", "explanatory_mixed_type", "not_existing"]
+    expected_columns = list(testdata_df_light.columns.drop(ignore_columns, errors="ignore"))
+    for extension in ["csv", "pkl"]:
+        path = str(tmp_path / f"input.{extension}")
+        save_file(testdata_df_light, path, "UTF-8", ",")
+        df = pd.read_csv(path) if extension == "csv" else pd.read_pickle(path)
+        from_path = Dataset(path, ignore_columns=ignore_columns, output_dir=tmp_path).training_dataframe
+        for copy_data in [True, False]:
+            from_df = Dataset(
+                df, ignore_columns=ignore_columns, output_dir=tmp_path, copy_data=copy_data
+            ).training_dataframe
+            assert list(from_df.columns) == expected_columns
+            pd.testing.assert_frame_equal(from_df, from_path)
+        assert list(df.columns) == list(testdata_df_light.columns)
+
+    # The ignored columns are not copied from the input dataframe.
+    n_rows = 200000
+    df = pd.DataFrame({"ignored": np.arange(n_rows, dtype=float), "target": np.arange(n_rows, dtype=np.int8)})
+    tracemalloc.start()
+    try:
+        dataset = Dataset(df, ignore_columns=["ignored"], output_dir=tmp_path)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < df["ignored"].nbytes
+    assert list(dataset.training_dataframe.columns) == ["target"]
+
+
+def test_dataset_reloads_only_changed_dataframes(testdata_df_light, tmp_path):
+    training_df = testdata_df_light.iloc[:100]
+    test_df = testdata_df_light.iloc[100:]
+    dataset = Dataset(training_df, training_df, test_df, output_dir=tmp_path)
+    loaded_training_df, loaded_test_df = dataset.training_dataframe, dataset.test_dataframe
+    assert dataset.get_changed_dataframes() == []
+
+    dataset.training_dataframe = dataset.training_dataframe.iloc[:10]
+    dataset.validation_dataframe = None
+    assert dataset.get_changed_dataframes() == ["training", "validation"]
+    with mock.patch("sapientml.params._read_file", wraps=params._read_file) as read_file:
+        dataset.reload()
+        # The loaded dataframe still in memory is restored as it is.
+        assert dataset.training_dataframe is loaded_training_df
+        assert dataset.test_dataframe is loaded_test_df
+        read_file.assert_not_called()
+        # The dataframe no longer in memory is read from the file on first access.
+        validation_df = dataset.validation_dataframe
+        read_file.assert_called_once_with(str(tmp_path / "validation.pkl"), "UTF-8", ",", [], False)
+        pd.testing.assert_frame_equal(validation_df, training_df)
+        assert dataset.validation_dataframe is validation_df
+        assert read_file.call_count == 1
+    assert dataset.get_changed_dataframes() == ["validation"]
+
+    # The ignored columns are neither in the dataframe restored nor in that read from the file.
+    dataset = Dataset(training_df, output_dir=tmp_path, ignore_columns=["explanatory_str_other"])
+    dataset.training_dataframe = dataset.training_dataframe.drop(["explanatory_number"], axis=1)
+    dataset.reload()
+    assert "explanatory_str_other" in training_df.columns
+    assert "explanatory_number" in dataset.training_dataframe.columns
+    assert "explanatory_str_other" not in dataset.training_dataframe.columns
+    assert "explanatory_str_other" not in pd.read_pickle(tmp_path / "training.pkl").columns
+
+
+def test_dataset_validates_sampled_rows(tmp_path, caplog, monkeypatch):
+    n_rows = 20000
+    df = pd.DataFrame(
+        {
+            "target": np.arange(n_rows, dtype=float),
+            "strnum": [str(i) for i in range(n_rows)],
+            "mixed": [i if i % 2 else str(i) for i in range(n_rows)],
+            "string": ["a"] * n_rows,
+        }
+    )
+    # A value of the other type in a row which is out of the sample
+    sampled_index = df.sample(1000, random_state=17).index
+    rare_index = df.index.difference(sampled_index)[0]
+    df["rare_mixed"] = "a"
+    df.loc[rare_index, "rare_mixed"] = 1
+
+    with mock.patch("sapientml.params._is_mixed_type_column", wraps=params._is_mixed_type_column) as is_mixed:
+        assert params._confirm_mixed_type(df, 1000) == ["strnum", "mixed"]
+        # Only the columns flagged in the sample are inspected in all the rows.
+        fully_inspected = [call.args[0].name for call in is_mixed.call_args_list if len(call.args[0]) == n_rows]
+        assert fully_inspected == ["strnum", "mixed"]
+    assert params._confirm_mixed_type(df) == ["strnum", "mixed", "rare_mixed"]
+
+    monkeypatch.setattr(params, "VALIDATION_SAMPLE_ROWS", 1000)
+    logger = logging.getLogger("sapientml")
+    logger.propagate = True
+    for validation_level, expected in [
+        ("sampled", {"strnum", "mixed"}),
+        ("exhaustive", {"strnum", "mixed", "rare_mixed"}),
+    ]:
+        caplog.clear()
+        dataset = Dataset(df, output_dir=tmp_path, validation_level=validation_level)
+        with caplog.at_level(logging.WARNING, logger="sapientml"):
+            dataset.check_dataframes(["target"])
+        warned = {record.message.split()[0] for record in caplog.records if "mixed type" in record.message}
+        assert warned == expected
+
+
+def test_sapientml_works_with_compact_dtypes(testdata_df_light, tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    n_rows = 5000
+    df = pd.DataFrame(
+        {
+            "small_int": rng.integers(0, 100, n_rows),
+            "large_int": np.arange(n_rows) * 1000,
+            "exact_float": rng.integers(0, 8, n_rows) / 2,
+            "float": rng.random(n_rows),
+            "bool": rng.random(n_rows) < 0.5,
+            "str": rng.choice(["a", "b", "c"], n_rows),
+            "bool_with_missing": (rng.random(n_rows) < 0.5).astype(object),
+        }
+    )
+    # Values not fitting in the dtypes of the other chunks
+    df.loc[4000, "small_int"] = 100000
+    df.loc[4600, "exact_float"] = np.nan
+    df.loc[4200, "bool_with_missing"] = np.nan
+    df.to_csv(tmp_path / "compact.csv", index=False)
+    monkeypatch.setattr(params, "CSV_SAMPLE_ROWS", 1000)
+    monkeypatch.setattr(params, "CSV_CHUNK_ROWS", 700)
+
+    # The dtypes are inferred from the sample, and the file is read by chunks only once.
+    with mock.patch("sapientml.params.pd.read_csv", wraps=pd.read_csv) as read_csv:
+        dataset = Dataset(str(tmp_path / "compact.csv"), output_dir=tmp_path, compact_dtypes=True)
+    assert [call.kwargs.get("nrows") for call in read_csv.call_args_list] == [1000, None]
+    compact_df = dataset.training_dataframe
+    assert compact_df.dtypes.astype(str).to_dict() == {
+        "small_int": "int32",
+        "large_int": "int32",
+        "exact_float": "float32",
+        "float": "float64",
+        "bool": "bool",
+        "str": "object",
+        "bool_with_missing": "object",
+    }
+    assert dataset.csv_dtypes == {"small_int": "int32", "large_int": "int32", "exact_float": "float32"}
+    expected = pd.read_csv(tmp_path / "compact.csv")
+    pd.testing.assert_frame_equal(compact_df, expected, check_dtype=False)
+    assert compact_df.memory_usage().sum() < expected.memory_usage().sum() * 0.8
+    # Each distinct string is kept once.
+    assert len({id(value) for value in compact_df["str"]}) == 3
+
+    # Only a chunk is held in addition to the result, while the chunks and their concatenation took twice the result.
+    n_rows = 1000000
+    pd.DataFrame({"a": np.arange(n_rows) % 100, "b": np.arange(n_rows)}).to_csv(tmp_path / "large.csv", index=False)
+    monkeypatch.setattr(params, "CSV_SAMPLE_ROWS", 10000)
+    monkeypatch.setattr(params, "CSV_CHUNK_ROWS", 20000)
+    tracemalloc.start()
+    try:
+        compact_df = params._read_csv_compact(str(tmp_path / "large.csv"), "UTF-8", ",")
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert compact_df.dtypes.astype(str).to_dict() == {"a": "int8", "b": "int32"}
+    assert peak < compact_df.memory_usage().sum() * 1.6
+
+    path = str(tmp_path / "training.csv")
+    testdata_df_light.to_csv(path, index=False)
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(path, compact_dtypes=True)
+    assert cls_.dataset.csv_dtypes
+    execution_results = [result for _, result in cls_.generator.execution_results]
+    assert all(result.returncode == 0 for result in execution_results)
+    # The candidate scripts read the file in the same dtypes, while the final scripts read the data in any dtypes.
+    assert f"dtype={cls_.dataset.csv_dtypes!r}" in (cls_.output_dir / "1_script.py").read_text()
+    assert "dtype=" not in cls_.model.files["final_predict.py"].decode()
+    assert len(cls_.predict(testdata_df_light.drop(["target_number"], axis=1))) == len(testdata_df_light)
+
+
+def test_sapientml_works_without_copying_input_data(testdata_df_light):
+    expected = testdata_df_light.copy()
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    with mock.patch.object(GeneratedModel, "fit", autospec=True, side_effect=GeneratedModel.fit) as fit:
+        with mock.patch("sapientml.params._read_file", wraps=params._read_file) as read_file:
+            cls_.fit(testdata_df_light, copy_data=False)
+    # Only the view of the input dataframe is used for the final training without validation data.
+    X = fit.call_args.args[1]
+    # The dataframe changed by the generator is restored without reading the file.
+    read_file.assert_not_called()
+    assert cls_.dataset.training_dataframe is X
+    assert np.shares_memory(X["target_number"].to_numpy(), testdata_df_light["target_number"].to_numpy())
+    pd.testing.assert_frame_equal(testdata_df_light, expected)
+    assert len(cls_.predict(testdata_df_light.drop(["target_number"], axis=1))) == len(testdata_df_light)
+
+
 def test_sapientml_works_with_pickled_model_bytes_like_object(testdata_df_light):
     cls_ = SapientML(
         ["target_number"],
@@ -140,6 +812,187 @@ def test_sapientml_works_with_pickled_model(testdata_df_light):
     )
 
 
+def test_sapientml_refits_model_on_appended_rows(testdata_df_light):
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(testdata_df_light)
+    model = cls_.model
+    files = dict(model.files)
+
+    # The appended rows are distributed as the training data.
+    appended = testdata_df_light.sample(frac=0.5, random_state=0)
+    model.refit(pd.concat([testdata_df_light, appended], ignore_index=True))
+    assert not model.refit_result.retrained
+    assert model.files == files
+
+    # The target drifted.
+    appended = appended.assign(target_number=appended["target_number"] * 10 + 1000)
+    model.refit(pd.concat([testdata_df_light, appended], ignore_index=True))
+    assert model.refit_result.retrained
+    assert max(model.refit_result.drift, key=model.refit_result.drift.get) == "target_number"
+    assert model.refit_result.reused
+    assert all(name in files for name in model.refit_result.reused)
+    assert model.files["model.pkl"] != files["model.pkl"]
+    assert model.training_profile.n_rows == len(testdata_df_light) + len(appended)
+    X = testdata_df_light.drop(["target_number"], axis=1)
+    assert len(cls_.predict(X)) == len(X)
+
+    with pytest.raises(ValueError):
+        model.refit(testdata_df_light.iloc[:10])
+
+
+def test_data_profile_is_computed_from_sampled_rows():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=50_000), "b": rng.choice(["x", "y", "z"], size=50_000)})
+    profile = DataProfile.from_dataframe(df, max_samples=1000)
+    assert profile.n_rows == len(df)
+    assert profile.n_samples == 1000
+
+    # Rows of the same distribution do not drift, and shifted ones do.
+    drift = profile.drift(pd.DataFrame({"a": rng.normal(size=1000), "b": rng.choice(["x", "y", "z"], size=1000)}))
+    assert max(drift.values()) < 0.05
+    drift = profile.drift(pd.DataFrame({"a": rng.normal(size=1000) + 3, "b": ["x"] * 1000}))
+    assert min(drift.values()) > 0.2
+
+
+def test_generated_model_warm_starts_estimator_in_refit(tmp_path):
+    (tmp_path / "final_script.py").write_text("")
+    (tmp_path / "final_predict.py").write_text("")
+    (tmp_path / "final_train.py").write_text(
+        "import pickle\n"
+        "import numpy as np\n"
+        "import pandas as pd\n"
+        "from sklearn.ensemble import RandomForestRegressor\n"
+        "from sklearn.impute import SimpleImputer\n"
+        "train_dataset = pd.read_pickle('./training.pkl')\n"
+        "NUMERIC_COLS_WITH_MISSING_VALUES = ['a']\n"
+        "simple_imputer = SimpleImputer(missing_values=np.nan, strategy='mean')\n"
+        "train_dataset[NUMERIC_COLS_WITH_MISSING_VALUES] = "
+        "simple_imputer.fit_transform(train_dataset[NUMERIC_COLS_WITH_MISSING_VALUES])\n"
+        "with open('simpleimputer-numeric.pkl', 'wb') as f:\n"
+        "    pickle.dump(simple_imputer, f)\n"
+        "model = RandomForestRegressor(n_estimators=10, random_state=0)\n"
+        "model.fit(train_dataset[['a', 'b']], train_dataset['y'])\n"
+        "with open('model.pkl', 'wb') as f:\n"
+        "    pickle.dump(model, f)\n"
+    )
+    model = GeneratedModel(tmp_path, "pickle", 60, "UTF-8", ",", {})
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=1000), "b": rng.normal(size=1000)})
+    df.loc[::10, "a"] = np.nan
+    df["y"] = df["a"].fillna(0) + df["b"]
+    model.fit(df)
+    imputer = pickle.loads(model.files["simpleimputer-numeric.pkl"])
+
+    # 'b' drifted, so the imputer of 'a' is reused and the forest gets new trees.
+    appended = pd.DataFrame({"a": rng.normal(size=100), "b": rng.normal(size=100) + 10})
+    appended.loc[::10, "a"] = np.nan
+    appended["y"] = appended["a"].fillna(0) + appended["b"]
+    df = pd.concat([df, appended], ignore_index=True)
+    model.refit(df)
+    assert model.refit_result.retrained
+    assert set(model.refit_result.drift) == {"a", "b", "y"}
+    assert model.refit_result.reused == ["simpleimputer-numeric.pkl"]
+    assert model.refit_result.warm_started
+    assert pickle.loads(model.files["simpleimputer-numeric.pkl"]).statistics_ == imputer.statistics_
+    assert pickle.loads(model.files["model.pkl"]).n_estimators == 11
+
+    # 'a' drifted, so all are fitted again.
+    appended = pd.DataFrame({"a": rng.normal(size=100) + 10, "b": rng.normal(size=100) + 10})
+    appended["y"] = appended["a"] + appended["b"]
+    model.refit(pd.concat([df, appended], ignore_index=True))
+    assert model.refit_result.retrained
+    assert model.refit_result.reused == []
+    assert not model.refit_result.warm_started
+    assert pickle.loads(model.files["simpleimputer-numeric.pkl"]).statistics_ != imputer.statistics_
+    assert pickle.loads(model.files["model.pkl"]).n_estimators == 10
+
+
+def test_sapientml_works_with_model_bundle(testdata_df_light, tmp_path):
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(testdata_df_light)
+    X = testdata_df_light.drop(["target_number"], axis=1)
+    expected = cls_.predict(X)
+    cls_.model.save_bundle(tmp_path / "model.zip")
+
+    # Only the index is read when the bundle is opened.
+    with mock.patch.object(ModelBundle, "__getitem__", side_effect=AssertionError("file is read")):
+        loaded = SapientML.from_pretrained(str(tmp_path / "model.zip"))
+    assert isinstance(loaded.model.files, ModelBundle)
+    assert sorted(loaded.model.files) == sorted(cls_.model.files)
+    assert all(loaded.model.files[name] == content for name, content in cls_.model.files.items())
+    pd.testing.assert_frame_equal(loaded.predict(X), expected)
+    loaded.model.prediction_mode = "in_process"
+    pd.testing.assert_frame_equal(loaded.predict(X), expected)
+
+    # A pickled model holds the files in memory.
+    model = pickle.loads(pickle.dumps(loaded.model))
+    assert model.files == cls_.model.files
+    loaded.model.close()
+    loaded.model.files.close()
+    pd.testing.assert_frame_equal(SapientML.from_pretrained(model).predict(X), expected)
+
+
+@pytest.mark.parametrize("prediction_mode", ["subprocess", "in_process", "worker"])
+def test_sapientml_works_with_out_of_band_pickled_model(testdata_df_light, prediction_mode):
+    cls_ = SapientML(
+        ["target_number"],
+        task_type="regression",
+        initial_timeout=60,
+    )
+    cls_.fit(testdata_df_light)
+    X = testdata_df_light.drop(["target_number"], axis=1)
+    expected = cls_.predict(X)
+
+    buffers = []
+    data = pickle.dumps(cls_.model, protocol=5, buffer_callback=buffers.append)
+    artifacts = [name for name in cls_.model.files if not name.endswith(".py")]
+    assert len(buffers) == len(artifacts)
+    in_band = pickle.dumps(cls_.model, protocol=5)
+    assert len(in_band) - len(data) >= sum(len(cls_.model.files[name]) for name in artifacts)
+
+    # The buffers are sent through shared memory and used without copying them.
+    shm = shared_memory.SharedMemory(create=True, size=sum(len(buffer.raw()) for buffer in buffers))
+    try:
+        views, offset = [], 0
+        for buffer in buffers:
+            size = len(buffer.raw())
+            shm.buf[offset : offset + size] = buffer.raw()
+            views.append(shm.buf[offset : offset + size])
+            offset += size
+        model = pickle.loads(data, buffers=views)
+        assert all(isinstance(model.files[name], memoryview) for name in artifacts)
+        assert all(model.files[name] == content for name, content in cls_.model.files.items())
+        model.prediction_mode = prediction_mode
+        pd.testing.assert_frame_equal(SapientML.from_pretrained(model).predict(X), expected)
+        model.close()
+
+        # The model loaded with out-of-band buffers can be pickled in-band and copied again.
+        for copied in [
+            pickle.loads(pickle.dumps(model, protocol=4)),
+            pickle.loads(pickle.dumps(model)),
+            copy.deepcopy(model),
+        ]:
+            assert all(isinstance(copied.files[name], bytes) for name in artifacts)
+            assert copied.files == cls_.model.files
+        del model, copied, views
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # Protocols without out-of-band buffers still work.
+    for protocol in [4, 5]:
+        model = pickle.loads(pickle.dumps(cls_.model, protocol=protocol))
+        assert model.files == cls_.model.files
+
+
 def test_sapientml_works_with_probability_prediction_for_multiclass_with_id(testdata_df_light):
     cls_ = SapientML(
         ["target_category_multi_nonnum"],
@@ -232,15 +1085,8 @@ def test_sapientml_raises_error_if_all_candidates_failed_to_run(testdata_df_ligh
         time_split_num=4,
         time_split_index=0,
     )
-    with mock.patch("asyncio.create_subprocess_exec") as process:
-        attrs = {
-            "return_value.stdout.readline.return_value": (b""),
-            "return_value.stderr.readline.return_value": (b""),
-            "return_value.stdout.at_eof.return_value": True,
-            "return_value.stderr.at_eof.return_value": True,
-            "return_value.returncode": 1,
-        }
-        process.configure_mock(**attrs)
+    failed_result = RunningResult(output="", error="", returncode=1, time=0)
+    with mock.patch("sapientml.executor._run", new=mock.AsyncMock(return_value=failed_result)):
         with pytest.raises(RuntimeError):
             cls_.fit(
                 testdata_df_light,